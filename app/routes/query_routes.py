@@ -3,12 +3,18 @@
 处理自然语言查询请求 - 支持 Supabase 和本地数据库
 集成 Schema Annotation 元数据以改进 SQL 生成质量
 """
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from app.services.nl2sql import NL2SQLConverter
 from app.services.nl2sql_enhanced import get_enhanced_nl2sql_converter
 from app.services.query_executor import QueryExecutor
 from app.services.intent_recognizer import get_intent_recognizer
+from app.services.llm_cache import get_llm_cache
+from app.services.llm_provider import get_llm_single_flight
+from app.services.result_stream import iter_ndjson, NDJSON_MIMETYPE
+from app.services.result_cache import get_query_result_cache
 import logging
+import os
+import time
 
 bp = Blueprint('query', __name__, url_prefix='/api/query')
 logger = logging.getLogger(__name__)
@@ -190,9 +196,17 @@ def get_schema_metadata():
 
 @bp.route('/schema-metadata/refresh', methods=['POST'])
 def refresh_schema_metadata():
-    """刷新 Schema 元数据（从 Schema Annotation API 重新加载）"""
+    """
+    刷新 Schema 元数据（重新读取已批准的标注）
+    
+    请求体（可选）:
+        {
+            "full": false  // 为 true 时全量同步，默认只合并上次同步后更新的标注
+        }
+    """
     try:
-        enhanced_converter.refresh_metadata()
+        data = request.get_json(silent=True) or {}
+        enhanced_converter.refresh_metadata(full=bool(data.get('full', False)))
         metadata_summary = enhanced_converter.get_metadata_summary()
         
         return jsonify({
@@ -209,6 +223,84 @@ def refresh_schema_metadata():
         }), 500
 
 
+@bp.route('/llm-cache/stats', methods=['GET'])
+def get_llm_cache_stats():
+    """获取 LLM 响应缓存统计（命中/未命中、条目数、合并的并发请求数等）"""
+    try:
+        return jsonify({
+            'success': True,
+            'stats': get_llm_cache().get_stats(),
+            'single_flight': get_llm_single_flight().get_stats()
+        }), 200
+    except Exception as e:
+        logger.error(f"Error in get_llm_cache_stats: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@bp.route('/llm-cache/clear', methods=['POST'])
+def clear_llm_cache():
+    """清空 LLM 响应缓存"""
+    try:
+        removed = get_llm_cache().invalidate()
+        return jsonify({
+            'success': True,
+            'removed': removed,
+            'message': 'LLM cache cleared'
+        }), 200
+    except Exception as e:
+        logger.error(f"Error in clear_llm_cache: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@bp.route('/result-cache/stats', methods=['GET'])
+def result_cache_stats():
+    """获取查询结果缓存统计"""
+    try:
+        return jsonify({
+            'success': True,
+            'stats': get_query_result_cache().get_stats()
+        }), 200
+    except Exception as e:
+        logger.error(f"Error in result_cache_stats: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@bp.route('/result-cache/invalidate', methods=['POST'])
+def invalidate_result_cache():
+    """
+    失效查询结果缓存
+    
+    请求体:
+        {
+            "tables": ["oee_records"]  // 可选，不提供时清空全部
+        }
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        tables = data.get('tables')
+        cache = get_query_result_cache()
+        removed = cache.invalidate_tables(tables) if tables else cache.invalidate()
+        return jsonify({
+            'success': True,
+            'removed': removed
+        }), 200
+    except Exception as e:
+        logger.error(f"Error in invalidate_result_cache: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
 @bp.route('/execute', methods=['POST'])
 def execute_query():
     """
@@ -216,7 +308,10 @@ def execute_query():
     
     请求体:
         {
-            "sql": "SELECT * FROM users LIMIT 10"
+            "sql": "SELECT * FROM users LIMIT 10",
+            "refresh": false,   // 可选，为 true 时绕过结果缓存重新查询
+            "stream": false,    // 可选，为 true 时以 NDJSON 流式返回
+            "batch_size": 1000  // 可选，流式模式下每批读取的行数
         }
     
     返回:
@@ -226,6 +321,9 @@ def execute_query():
             "count": 10,
             "columns": ["id", "name", "email"]
         }
+    
+    流式模式返回 application/x-ndjson：每行一条记录，
+    最后一行为 {"__summary__": {"success": true, "rows_count": N, ...}}
     """
     try:
         data = request.get_json()
@@ -257,8 +355,22 @@ def execute_query():
         # 创建或获取 QueryExecutor（需要传入 Supabase 客户端）
         query_executor = QueryExecutor(sb)
         
+        if data.get('stream'):
+            try:
+                batches = query_executor.stream_query(sql, batch_size=data.get('batch_size'))
+            except ValueError as e:
+                return jsonify({
+                    'success': False,
+                    'error': str(e),
+                    'sql': sql
+                }), 400
+            return Response(
+                stream_with_context(iter_ndjson(batches, sql=sql)),
+                mimetype=NDJSON_MIMETYPE
+            )
+        
         # 执行查询
-        result = query_executor.execute_query(sql)
+        result = query_executor.execute_query(sql, refresh=bool(data.get('refresh', False)))
         
         return jsonify(result), 200 if result['success'] else 500
         
@@ -402,6 +514,13 @@ def health_check():
             'db_name': os.getenv('DB_NAME', 'NOT SET'),
         })
     
+    # 查询执行引擎
+    query_engine = os.getenv('QUERY_ENGINE', 'postgrest').lower()
+    diagnosis['query_engine'] = query_engine
+    if query_engine == 'postgres':
+        from app.services.postgres_read_engine import get_postgres_read_engine
+        diagnosis['postgres_pool'] = get_postgres_read_engine().health_check()
+    
     return jsonify({
         'status': 'healthy',
         'service': 'NL2SQL Report Backend',
@@ -649,6 +768,120 @@ def recognize_intent():
             }
         }), 500
 
+@bp.route('/recognize-intent/batch', methods=['POST'])
+def recognize_intent_batch():
+    """
+    批量识别查询意图
+
+    规则/分类器路径对所有条目一次完成，仍需 LLM 的条目被打包成多条目 prompt
+    （INTENT_LLM_BATCH_SIZE）并以有限并发（INTENT_LLM_MAX_CONCURRENCY）调用
+
+    请求体:
+        {
+            "queries": ["查询今天的产量", "上周设备停机情况"]
+        }
+
+    返回:
+        {
+            "success": true,
+            "count": 2,
+            "llm_items": 1,
+            "elapsed_ms": 812.4,
+            "results": [
+                {
+                    ...to_frontend_format 结果...,
+                    "_backend": {...},
+                    "timings": {"local_ms": 0.1, "llm_ms": 0.0, "total_ms": 0.1}
+                }
+            ]
+        }
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        queries = data.get('queries')
+
+        if not isinstance(queries, list) or not queries:
+            return jsonify({
+                'success': False,
+                'error': 'Missing required field: queries (non-empty list)'
+            }), 400
+
+        max_items = int(os.getenv('INTENT_BATCH_MAX_ITEMS', 500))
+        if len(queries) > max_items:
+            return jsonify({
+                'success': False,
+                'error': f'Too many queries: {len(queries)} (max {max_items})'
+            }), 400
+
+        recognizer = get_intent_recognizer_instance()
+        texts = [str(q).strip() if q is not None else '' for q in queries]
+        valid = [i for i, text in enumerate(texts) if text]
+
+        start = time.perf_counter()
+        recognized = recognizer.recognize_batch([texts[i] for i in valid])
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        results = [{
+            'success': False,
+            'error': 'Query cannot be empty or whitespace only'
+        } for _ in texts]
+        for index, result in zip(valid, recognized):
+            if not result.get('success', False):
+                results[index] = {'success': False, 'error': result.get('error'), 'timings': result['timings']}
+                continue
+            user_intent = recognizer.to_frontend_format(result)
+            user_intent['_backend'] = {
+                'recognizedIntent': result['intent'],
+                'methodsUsed': result.get('methodsUsed', []),
+                'reasoning': result.get('reasoning', '')
+            }
+            user_intent['timings'] = result['timings']
+            results[index] = user_intent
+
+        llm_items = sum(1 for r in recognized if 'llm' in r.get('methodsUsed', []))
+        logger.info(f"Batch intent recognition: {len(texts)} queries, "
+                    f"{llm_items} via LLM, {elapsed_ms:.1f}ms")
+
+        return jsonify({
+            'success': True,
+            'count': len(results),
+            'llm_items': llm_items,
+            'elapsed_ms': round(elapsed_ms, 3),
+            'results': results
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Error in recognize_intent_batch: {str(e)}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@bp.route('/recognize-intent/stats', methods=['GET'])
+def recognize_intent_stats():
+    """
+    意图识别的 LLM 开销统计（按延迟模式 sequential / speculative / batch 分别计数）
+
+    返回:
+        {
+            "success": true,
+            "latency_mode": "speculative",
+            "modes": {
+                "speculative": {"requests": 10, "llm_calls": 10, "llm_results_used": 3,
+                                "llm_cancelled": 2, "llm_abandoned": 5, ...}
+            }
+        }
+    """
+    try:
+        recognizer = get_intent_recognizer_instance()
+        return jsonify({'success': True, **recognizer.get_llm_spend_stats()}), 200
+    except Exception as e:
+        logger.error(f"Error in recognize_intent_stats: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @bp.route('/cors-check', methods=['GET', 'OPTIONS'])
 def cors_check():
     """
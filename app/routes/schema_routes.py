@@ -2,7 +2,7 @@
 Schema 标注 API 路由
 提供标注的 CRUD 操作和自动生成功能
 """
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response
 import logging
 import asyncio
 from app.services.schema_annotator import schema_annotator
@@ -263,23 +263,39 @@ def get_approved_metadata():
     获取所有已批准的 schema 元数据
     用于 NL2SQL 理解和查询
     
+    支持 ETag：请求头 If-None-Match 与当前元数据版本一致时返回 304（无响应体）
+    
+    查询参数:
+        full: 为 true 时强制全量同步
+    
     响应:
     {
         "success": true,
         "metadata": {
             "tables": {...},
             "columns": {...},
+            "relations": [...],
             "last_updated": "2024-02-03T..."
         }
     }
     """
     try:
-        metadata = schema_annotator.get_approved_schema_metadata()
+        full = request.args.get('full', 'false').lower() in ('1', 'true', 'yes')
+        metadata = schema_annotator.get_approved_schema_metadata(incremental=not full)
+        etag = schema_annotator.get_metadata_etag()
         
-        return jsonify({
+        if etag and request.if_none_match.contains(etag):
+            response = Response(status=304)
+            response.set_etag(etag)
+            return response
+        
+        response = jsonify({
             "success": True,
             "metadata": metadata
-        }), 200
+        })
+        if etag:
+            response.set_etag(etag)
+        return response, 200
         
     except Exception as e:
         logger.error(f"Failed to get approved metadata: {str(e)}")
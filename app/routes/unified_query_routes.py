@@ -4,7 +4,13 @@
 """
 
 import logging
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+from app.services.example_store import get_example_store
+# 路由函数 get_execution_history 与服务同名，以别名导入
+from app.services.execution_history import get_execution_history as get_history_store
+from app.services.query_recommender import get_query_recommender
+from app.services.query_scheduler import get_query_scheduler
+from app.services.result_stream import iter_ndjson, NDJSON_MIMETYPE
 from app.services.unified_query_service import (
     get_unified_query_service,
     QueryPlan,
@@ -25,13 +31,15 @@ def process_query():
     {
         "natural_language": "查询今天的OEE数据",
         "execution_mode": "explain",  // "explain" 或 "execute"
-        "user_context": {...}  // 可选
+        "user_context": {...},  // 可选
+        "defer_explanation": false  // 可选，为 true 时不等待解释生成，
+                                    // 之后通过 /explanation 单独获取
     }
     
     响应:
     {
         "success": true,
-        "query_plan": {...},
+        "query_plan": {...},  // 含 stage_timings 各阶段耗时（毫秒）
         "query_result": {...} // 如果 execution_mode 为 execute
     }
     """
@@ -41,6 +49,7 @@ def process_query():
         natural_language = data.get('natural_language', '').strip()
         execution_mode = data.get('execution_mode', 'explain')
         user_context = data.get('user_context')
+        defer_explanation = bool(data.get('defer_explanation', False))
 
         if not natural_language:
             return jsonify({
@@ -56,7 +65,8 @@ def process_query():
         query_plan, query_result = asyncio.run(service.process_natural_language_query(
             natural_language,
             user_context,
-            execution_mode
+            execution_mode,
+            defer_explanation=defer_explanation
         ))
 
         response = {
@@ -120,6 +130,51 @@ def explain_query():
         }), 500
 
 
+@bp.route('/explanation', methods=['POST'])
+def get_sql_explanation():
+    """
+    单独生成SQL解释（配合 /process 的 defer_explanation 使用）
+    
+    请求体:
+    {
+        "sql": "SELECT * FROM oee_records WHERE ...",
+        "natural_language": "查询今天的OEE数据"  // 可选
+    }
+    
+    响应:
+    {
+        "success": true,
+        "explanation": "..."
+    }
+    """
+    try:
+        import asyncio
+        data = request.get_json()
+        sql_query = data.get('sql', '').strip()
+        natural_language = data.get('natural_language', '').strip()
+
+        if not sql_query:
+            return jsonify({
+                "success": False,
+                "error": "sql 不能为空"
+            }), 400
+
+        service = get_unified_query_service()
+        explanation = asyncio.run(service.generate_explanation(sql_query, natural_language))
+
+        return jsonify({
+            "success": True,
+            "explanation": explanation
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Error generating explanation: {e}", exc_info=True)
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+
 @bp.route('/execute', methods=['POST'])
 def execute_query():
     """
@@ -128,7 +183,11 @@ def execute_query():
     请求体:
     {
         "sql": "SELECT * FROM oee_records WHERE ...",
-        "query_intent": {...}  // 可选，用于优化结果展示
+        "query_intent": {...},  // 可选，用于优化结果展示
+        "refresh": false,       // 可选，为 true 时绕过结果缓存重新查询
+        "sql_source": "llm",    // 可选，查询计划中的 sql_source；为 llm 时执行成功后记入示例库
+        "stream": false,        // 可选，为 true 时以 NDJSON 流式返回
+        "batch_size": 1000      // 可选，流式模式下每批读取的行数
     }
     
     响应:
@@ -139,6 +198,9 @@ def execute_query():
         "summary": "查询成功",
         "visualization_type": "table"
     }
+    
+    流式模式返回 application/x-ndjson：每行一条记录，
+    最后一行为 {"__summary__": {"success": true, "rows_count": N, ...}}
     """
     try:
         import asyncio
@@ -152,6 +214,20 @@ def execute_query():
                 "error": "sql 不能为空"
             }), 400
 
+        if data.get('stream'):
+            service = get_unified_query_service()
+            try:
+                batches = service.stream_approved_query(sql_query, data.get('batch_size'))
+            except ValueError as e:
+                return jsonify({
+                    "success": False,
+                    "error": str(e)
+                }), 400
+            return Response(
+                stream_with_context(iter_ndjson(batches, sql=sql_query)),
+                mimetype=NDJSON_MIMETYPE
+            )
+
         # 重建QueryIntent对象（如果提供了）
         query_intent = None
         if query_intent_data:
@@ -171,7 +247,12 @@ def execute_query():
                 logger.warning(f"Could not rebuild query intent: {e}")
 
         service = get_unified_query_service()
-        query_result = asyncio.run(service.execute_approved_query(sql_query, query_intent))
+        query_result = asyncio.run(service.execute_approved_query(
+            sql_query,
+            query_intent,
+            refresh=bool(data.get('refresh', False)),
+            sql_source=data.get('sql_source')
+        ))
 
         return jsonify({
             "success": query_result.success,
@@ -299,41 +380,137 @@ def validate_sql():
         }), 500
 
 
+@bp.route('/examples', methods=['GET'])
+def search_examples():
+    """
+    查询问题 → SQL 示例库
+
+    查询参数:
+    - q: 问题；提供时返回最相近的示例，否则只返回统计信息
+    - k: 返回示例数（默认5）
+
+    响应:
+    {
+        "success": true,
+        "stats": {"examples": 120, "by_source": {"executed": 100, "approved": 20}, ...},
+        "examples": [
+            {"id": "...", "question": "...", "sql": "...", "source": "executed", "score": 0.92}
+        ]
+    }
+    """
+    try:
+        store = get_example_store()
+        question = request.args.get('q', '').strip()
+        k = request.args.get('k', 5, type=int)
+
+        examples = []
+        if question:
+            examples = [
+                dict(example.to_dict(), score=round(score, 4))
+                for example, score in store.search(question, k=min(max(k, 1), 50))
+            ]
+
+        return jsonify({
+            "success": True,
+            "stats": store.stats(),
+            "examples": examples
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Error searching examples: {e}", exc_info=True)
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+
+@bp.route('/examples', methods=['POST'])
+def add_example():
+    """
+    人工批准一条问题 → SQL 示例（执行成功的查询会自动记录）
+
+    请求体:
+    {
+        "natural_language": "查询今天各设备的OEE数据",
+        "sql": "SELECT ..."
+    }
+    """
+    try:
+        data = request.get_json() or {}
+        natural_language = (data.get('natural_language') or '').strip()
+        sql_query = (data.get('sql') or '').strip()
+
+        if not natural_language or not sql_query:
+            return jsonify({
+                "success": False,
+                "error": "natural_language 和 sql 不能为空"
+            }), 400
+
+        example = get_example_store().add(natural_language, sql_query, source='approved')
+        if example is None:
+            return jsonify({
+                "success": False,
+                "error": "示例库未启用"
+            }), 400
+
+        return jsonify({
+            "success": True,
+            "example": example.to_dict()
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Error adding example: {e}", exc_info=True)
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+
 @bp.route('/execution-history', methods=['GET'])
 def get_execution_history():
     """
-    获取查询执行历史
+    获取查询执行历史（按时间倒序）
     
     查询参数:
-    - limit: 返回记录数（默认20）
-    - offset: 偏移量（默认0）
+    - limit: 返回记录数（默认20，最大200）
+    - cursor: 上一页响应中的 next_cursor（游标分页，深页不变慢）
+    - offset: 偏移量（默认0，兼容旧客户端；提供 cursor 时忽略）
+    - mode: 可选，只看 explain / execute / approved
     
     响应:
     {
         "success": true,
         "history": [
             {
-                "id": "...",
+                "id": 1024,
+                "mode": "execute",
                 "natural_language": "...",
                 "sql": "...",
+                "intent": "query_equipment",
+                "sql_source": "llm",
+                "success": true,
                 "executed_at": "...",
-                "rows_count": 10
+                "rows_count": 10,
+                "cached": false,
+                "query_time_ms": 812.5,
+                "stage_timings": {...}
             },
             ...
         ],
-        "total": 100
+        "next_cursor": 1005,  // 没有更多记录时为 null
+        "total": 100  // 只在第一页（未提供 cursor）返回，之后为 null
     }
     """
     try:
-        limit = request.args.get('limit', 20, type=int)
-        offset = request.args.get('offset', 0, type=int)
+        limit = min(max(request.args.get('limit', 20, type=int), 1), 200)
+        cursor = request.args.get('cursor', type=int)
+        offset = max(request.args.get('offset', 0, type=int), 0)
+        mode = request.args.get('mode') or None
 
-        # 这里可以从数据库获取执行历史
-        # 目前返回空列表
+        page = get_history_store().page(limit=limit, cursor=cursor, offset=offset, mode=mode)
         return jsonify({
             "success": True,
-            "history": [],
-            "total": 0
+            **page
         }), 200
 
     except Exception as e:
@@ -347,56 +524,184 @@ def get_execution_history():
 @bp.route('/query-recommendations', methods=['GET'])
 def get_query_recommendations():
     """
-    获取常用查询建议
+    获取常用查询建议（按真实查询流量统计，流量不足时用默认建议补足）
+    
+    查询参数:
+    - window: 统计窗口 hour / day / week（默认 day，分别按 1 小时 / 1 天 / 7 天半衰期衰减）
+    - limit: 返回条数（默认8，最大50）
     
     响应:
     {
         "success": true,
+        "window": "day",
         "recommendations": [
             {
-                "title": "今天的OEE趋势",
-                "natural_language": "显示今天各小时的OEE趋势",
-                "category": "metric"
+                "title": "查询今天各设备的OEE数据",
+                "natural_language": "查询今天各设备的OEE数据",
+                "category": "metric",
+                "icon": "chart",
+                "source": "traffic",  // traffic: 来自流量统计；default: 默认建议
+                "score": 12.4,
+                "sql": "SELECT ...",
+                "last_seen": "..."
             },
             ...
         ]
     }
     """
     try:
-        recommendations = [
-            {
-                "title": "查看今天的OEE",
-                "natural_language": "查询今天各设备的OEE数据",
-                "category": "metric",
-                "icon": "chart"
-            },
-            {
-                "title": "对比设备效率",
-                "natural_language": "对比本周所有设备的效率差异",
-                "category": "comparison",
-                "icon": "compare"
-            },
-            {
-                "title": "查询停机时间",
-                "natural_language": "查询本月的设备停机时间统计",
-                "category": "metric",
-                "icon": "alert"
-            },
+        window = request.args.get('window', 'day')
+        limit = min(max(request.args.get('limit', 8, type=int), 1), 50)
+
+        recommender = get_query_recommender()
+        if window not in recommender.windows:
+            return jsonify({
+                "success": False,
+                "error": f"window 必须是 {', '.join(recommender.windows)} 之一"
+            }), 400
+
+        return jsonify({
+            "success": True,
+            "window": window,
+            "recommendations": recommender.recommendations(window, limit)
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Error getting recommendations: {e}", exc_info=True)
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+
+@bp.route('/schedules', methods=['GET'])
+def list_scheduled_queries():
+    """
+    列出定时查询
+
+    响应:
+    {
+        "success": true,
+        "stats": {"running": true, "jobs": 3, "in_flight": 0, "max_concurrency": 2},
+        "schedules": [
             {
-                "title": "产品质量分析",
-                "natural_language": "分析最近30天的产品良率趋势",
-                "category": "trend",
-                "icon": "trend"
+                "id": "...",
+                "name": "今日OEE看板",
+                "sql": "SELECT ...",
+                "interval_seconds": 300,
+                "cron": null,
+                "last_status": "success",
+                "last_run_at": "...",
+                "next_run_at": "...",
+                ...
             }
         ]
+    }
+    """
+    try:
+        scheduler = get_query_scheduler()
+        return jsonify({
+            "success": True,
+            "stats": scheduler.stats(),
+            "schedules": scheduler.list_jobs()
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Error listing scheduled queries: {e}", exc_info=True)
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
 
+@bp.route('/schedules', methods=['POST'])
+def create_scheduled_query():
+    """
+    新增定时查询：按间隔或 cron 表达式执行 SQL，结果写入查询结果缓存，
+    /execute 执行同一条 SQL 时直接返回预先计算的结果
+
+    请求体:
+    {
+        "sql": "SELECT ...",
+        "interval_seconds": 300,         // 与 cron 二选一
+        "cron": "*/5 8-20 * * 1-5",      // 分 时 日 月 周
+        "name": "今日OEE看板",            // 可选
+        "natural_language": "..."        // 可选
+    }
+    """
+    try:
+        data = request.get_json() or {}
+        job = get_query_scheduler().add_job(
+            sql=data.get('sql') or '',
+            interval_seconds=data.get('interval_seconds'),
+            cron=(data.get('cron') or '').strip() or None,
+            name=(data.get('name') or '').strip(),
+            natural_language=(data.get('natural_language') or '').strip()
+        )
         return jsonify({
             "success": True,
-            "recommendations": recommendations
+            "schedule": job.to_dict()
         }), 200
 
+    except ValueError as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 400
     except Exception as e:
-        logger.error(f"Error getting recommendations: {e}", exc_info=True)
+        logger.error(f"Error creating scheduled query: {e}", exc_info=True)
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+
+@bp.route('/schedules/<job_id>', methods=['DELETE'])
+def delete_scheduled_query(job_id):
+    """删除定时查询（已缓存的结果保留到过期）"""
+    try:
+        if not get_query_scheduler().remove_job(job_id):
+            return jsonify({
+                "success": False,
+                "error": "定时查询不存在"
+            }), 404
+        return jsonify({"success": True}), 200
+
+    except Exception as e:
+        logger.error(f"Error deleting scheduled query: {e}", exc_info=True)
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+
+@bp.route('/schedules/<job_id>/run', methods=['POST'])
+def run_scheduled_query(job_id):
+    """立即执行一次定时查询并刷新缓存（不影响原定调度）"""
+    try:
+        scheduler = get_query_scheduler()
+        if scheduler.get_job(job_id) is None:
+            return jsonify({
+                "success": False,
+                "error": "定时查询不存在"
+            }), 404
+
+        result = scheduler.run_now(job_id)
+        if result is None:
+            return jsonify({
+                "success": False,
+                "error": "定时查询正在执行"
+            }), 409
+
+        job = scheduler.get_job(job_id)
+        return jsonify({
+            "success": bool(result.get('success')),
+            "error": result.get('error'),
+            "schedule": job.to_dict() if job else None
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Error running scheduled query: {e}", exc_info=True)
         return jsonify({
             "success": False,
             "error": str(e)
@@ -0,0 +1,181 @@
+"""
+共享异步 HTTP 客户端
+在独立线程的事件循环中持有一个 httpx.AsyncClient，
+任意事件循环（包括路由中 asyncio.run 创建的临时循环）都复用同一个连接池
+"""
+import asyncio
+import logging
+import os
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncHTTPClient:
+    """跨事件循环共享的异步 HTTP 客户端"""
+
+    def __init__(self, max_connections: int = 20, max_keepalive_connections: int = 10,
+                 timeout: float = 30.0, transport: Optional[httpx.AsyncBaseTransport] = None):
+        """
+        初始化客户端（后台事件循环在首次请求时启动）
+
+        Args:
+            max_connections: 最大并发连接数
+            max_keepalive_connections: 最大空闲 keep-alive 连接数
+            timeout: 默认请求超时（秒）
+            transport: 自定义传输层（测试时注入）
+        """
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.timeout = timeout
+        self._transport = transport
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        # 仅在后台事件循环中访问
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        """启动（或在 fork 后重新启动）后台事件循环线程"""
+        pid = os.getpid()
+        if self._loop is None or self._pid != pid:
+            with self._lock:
+                if self._loop is None or self._pid != pid:
+                    loop = asyncio.new_event_loop()
+                    thread = threading.Thread(
+                        target=self._run_loop, args=(loop,),
+                        name='llm-async-http', daemon=True
+                    )
+                    thread.start()
+                    self._client = None
+                    self._inflight = {}
+                    self._loop = loop
+                    self._pid = pid
+                    logger.info(f"Async HTTP loop started (pid={pid}, "
+                                f"max_connections={self.max_connections})")
+        return self._loop
+
+    @staticmethod
+    def _run_loop(loop: asyncio.AbstractEventLoop) -> None:
+        asyncio.set_event_loop(loop)
+        loop.run_forever()
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """获取 httpx 客户端（只在后台事件循环中调用）"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive_connections
+                ),
+                timeout=self.timeout,
+                transport=self._transport
+            )
+        return self._client
+
+    async def _run(self, coro: Awaitable[Any]) -> Any:
+        """在后台事件循环中执行协程，并在调用方的事件循环中等待结果"""
+        loop = self._ensure_loop()
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            return await coro
+        future = asyncio.run_coroutine_threadsafe(coro, loop)
+        return await asyncio.wrap_future(future)
+
+    async def post_json(self, url: str, payload: Dict[str, Any],
+                        headers: Optional[Dict[str, str]] = None,
+                        timeout: Optional[float] = None) -> httpx.Response:
+        """
+        发送 JSON POST 请求
+
+        Args:
+            url: 请求地址
+            payload: JSON 请求体
+            headers: 请求头
+            timeout: 本次请求超时（秒），默认使用客户端超时
+
+        Returns:
+            已读取完响应体的 httpx.Response
+        """
+        return await self._run(self._post_json(url, payload, headers, timeout))
+
+    async def _post_json(self, url, payload, headers, timeout) -> httpx.Response:
+        client = self._get_client()
+        return await client.post(
+            url,
+            json=payload,
+            headers=headers,
+            timeout=timeout if timeout is not None else self.timeout
+        )
+
+    async def single_flight(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        合并并发的相同异步调用
+
+        Args:
+            key: 调用标识
+            factory: 返回实际执行协程的函数
+
+        Returns:
+            共享的调用结果
+        """
+        return await self._run(self._single_flight(key, factory))
+
+    async def _single_flight(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        # 只在后台事件循环中执行，字典访问无需加锁
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+            self.executed += 1
+        else:
+            self.coalesced += 1
+        # shield: 单个调用方被取消时不影响其他等待者
+        return await asyncio.shield(task)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取合并统计"""
+        return {
+            'executed': self.executed,
+            'coalesced': self.coalesced,
+            'in_flight': len(self._inflight)
+        }
+
+    def close(self) -> None:
+        """关闭客户端并停止后台事件循环"""
+        with self._lock:
+            loop, client = self._loop, self._client
+            self._loop = None
+            self._client = None
+            self._pid = None
+        if loop is None:
+            return
+        if client is not None:
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop).result(timeout=5)
+        loop.call_soon_threadsafe(loop.stop)
+
+
+# 全局实例
+_async_http_client = None
+
+
+def get_async_http_client() -> AsyncHTTPClient:
+    """获取共享异步 HTTP 客户端单例"""
+    global _async_http_client
+    if _async_http_client is None:
+        _async_http_client = AsyncHTTPClient(
+            max_connections=int(os.getenv('LLM_ASYNC_MAX_CONNECTIONS', 20)),
+            max_keepalive_connections=int(os.getenv('LLM_ASYNC_MAX_KEEPALIVE_CONNECTIONS', 10)),
+            timeout=float(os.getenv('LLM_ASYNC_TIMEOUT', 30))
+        )
+    return _async_http_client
@@ -0,0 +1,250 @@
+"""
+问题 → SQL 示例库
+持久化执行成功 / 人工批准的 (自然语言问题, SQL) 对，并在问题上建立字符 bigram 倒排索引：
+- 相似问题的 top-k 示例作为 few-shot 注入 NL2SQL 提示词
+- 与已有问题完全相同或几乎相同（Jaccard 相似度达到阈值，且数字、时间表达、指标一致）时直接复用 SQL，不调用 LLM
+
+数据以 JSONL 追加写入（同一问题以最后一行为准），启动时重放到内存
+"""
+import heapq
+import json
+import logging
+import os
+import re
+import threading
+import uuid
+from collections import Counter
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.services.intent_classifier import normalize_text
+from app.services.intent_recognizer import METRIC_KEYWORDS, NUM_TIME_PATTERN, TIME_EXPRESSIONS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EXAMPLE_STORE_PATH = os.path.join('data', 'sql_examples.jsonl')
+
+_NON_WORD = re.compile(r'[\W_]+')
+_DIGITS = re.compile(r'\d+')
+# 'YYYY-MM-DD' 形式的日期字面量：编译器按当天内联的时间窗口，换一天就过期
+_DATE_LITERAL = re.compile(r"'\d{4}-\d{2}-\d{2}")
+
+
+def question_key(question: str) -> str:
+    """问题的规范化键：全半角、大小写统一，去掉空白和标点"""
+    return _NON_WORD.sub('', normalize_text(question))
+
+
+def question_slots(question: str) -> Tuple:
+    """
+    问题中决定 SQL 取值的部分：数字、时间表达（今天 / 上个月 / 最近7天…）和指标关键词；
+    同义写法（本月 / 这个月）归一到同一个值
+    """
+    text = normalize_text(question)
+    times = frozenset(value for value, expressions in TIME_EXPRESSIONS
+                      if any(expression in text for expression in expressions))
+    relative = tuple((m.group('number'), m.group('unit')) for m in NUM_TIME_PATTERN.finditer(text))
+    metrics = frozenset(metric for keyword, metric in METRIC_KEYWORDS.items() if keyword in text)
+    return tuple(_DIGITS.findall(text)), times, relative, metrics
+
+
+def question_grams(key: str) -> frozenset:
+    """规范化键的字符 bigram 集合（单字问题退化为 unigram）"""
+    if len(key) < 2:
+        return frozenset([key]) if key else frozenset()
+    return frozenset(key[i:i + 2] for i in range(len(key) - 1))
+
+
+@dataclass
+class SQLExample:
+    """一条问题 → SQL 示例"""
+    id: str
+    question: str
+    sql: str
+    source: str = 'executed'  # executed: 执行成功；approved: 人工批准
+    created_at: str = ''
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class ExampleStore:
+    """带 n-gram 相似度索引的示例库（线程安全）"""
+
+    def __init__(self, path: Optional[str] = None, reuse_threshold: float = 0.9,
+                 enabled: bool = True):
+        """
+        初始化示例库并从 path 重放已有示例
+
+        Args:
+            path: JSONL 文件路径；为 None 时只保存在内存中
+            reuse_threshold: 直接复用 SQL 所需的最低相似度
+            enabled: 为 False 时不记录也不返回示例
+        """
+        self.path = path
+        self.reuse_threshold = reuse_threshold
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._examples: Dict[str, SQLExample] = {}  # 规范化键 -> 示例
+        self._grams: Dict[str, frozenset] = {}  # 规范化键 -> bigram 集合
+        self._postings: Dict[str, set] = {}  # bigram -> 规范化键集合
+        if enabled and path:
+            self._load()
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line_no, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    self._index(SQLExample(**json.loads(line)))
+                except (json.JSONDecodeError, TypeError) as e:
+                    logger.warning(f"⚠️  Skipping invalid example at {self.path}:{line_no}: {e}")
+        logger.info(f"✅ Loaded {len(self._examples)} SQL examples from {self.path}")
+
+    def _index(self, example: SQLExample) -> None:
+        key = question_key(example.question)
+        if not key:
+            return
+        if key in self._grams:
+            self._unindex(key)
+        grams = question_grams(key)
+        self._examples[key] = example
+        self._grams[key] = grams
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(key)
+
+    def _unindex(self, key: str) -> None:
+        for gram in self._grams.pop(key, ()):
+            keys = self._postings.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._postings[gram]
+        self._examples.pop(key, None)
+
+    def add(self, question: str, sql: str, source: str = 'executed') -> Optional[SQLExample]:
+        """
+        记录一条示例；同一问题（规范化后）已有相同 SQL 时不重复写入。
+        自动记录（非 approved）的 SQL 含日期字面量时不记录：
+        "今天" 的问题换一天复用或作为 few-shot 都会带上过期的日期
+
+        Returns:
+            当前生效的示例；问题或 SQL 为空、含日期字面量、示例库禁用时返回 None
+        """
+        question, sql = (question or '').strip(), (sql or '').strip()
+        key = question_key(question)
+        if not self.enabled or not key or not sql:
+            return None
+        if source != 'approved' and _DATE_LITERAL.search(sql):
+            return None
+        with self._lock:
+            existing = self._examples.get(key)
+            if existing is not None and existing.sql == sql:
+                if source == 'approved' and existing.source != 'approved':
+                    existing.source = 'approved'
+                    self._append(existing)
+                return existing
+            if existing is not None and existing.source == 'approved' and source != 'approved':
+                # 人工批准的 SQL 不被普通执行记录覆盖
+                return existing
+            example = SQLExample(
+                id=uuid.uuid4().hex,
+                question=question,
+                sql=sql,
+                source=source,
+                created_at=datetime.now().isoformat()
+            )
+            self._index(example)
+            self._append(example)
+            return example
+
+    def _append(self, example: SQLExample) -> None:
+        if not self.path:
+            return
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(example.to_dict(), ensure_ascii=False) + '\n')
+        except OSError as e:
+            logger.warning(f"Failed to persist SQL example: {e}")
+
+    def search(self, question: str, k: int = 3, min_score: float = 0.0) -> List[Tuple[SQLExample, float]]:
+        """
+        按问题的 bigram Jaccard 相似度返回最相近的 k 条示例
+
+        只对与问题至少共享一个 bigram 的示例打分（倒排索引取候选）
+
+        Returns:
+            [(示例, 相似度)]，相似度从高到低
+        """
+        key = question_key(question)
+        if not self.enabled or not key or k <= 0:
+            return []
+        grams = question_grams(key)
+        with self._lock:
+            overlap = Counter()
+            for gram in grams:
+                for candidate in self._postings.get(gram, ()):
+                    overlap[candidate] += 1
+            scored = []
+            for candidate, shared in overlap.items():
+                score = shared / (len(grams) + len(self._grams[candidate]) - shared)
+                if score >= min_score:
+                    scored.append((score, candidate))
+            top = heapq.nlargest(k, scored)
+            return [(self._examples[candidate], score) for score, candidate in top]
+
+    def find_reusable(self, question: str) -> Optional[SQLExample]:
+        """
+        查找可以直接复用 SQL 的示例：相似度不低于 reuse_threshold，
+        且数字、时间表达和指标完全一致（"前10条" 与 "前20条"、长问题里的 "上个月" 与 "这个月"
+        只差一两个字符，相似度仍然很高，SQL 却不同）
+        """
+        matches = self.search(question, k=1, min_score=self.reuse_threshold)
+        if not matches:
+            return None
+        example, _ = matches[0]
+        if question_slots(example.question) != question_slots(question):
+            return None
+        return example
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            sources = Counter(example.source for example in self._examples.values())
+            return {
+                'enabled': self.enabled,
+                'examples': len(self._examples),
+                'by_source': dict(sources),
+                'index_terms': len(self._postings),
+                'reuse_threshold': self.reuse_threshold
+            }
+
+    def clear(self) -> None:
+        """清空内存中的示例（不删除文件）"""
+        with self._lock:
+            self._examples.clear()
+            self._grams.clear()
+            self._postings.clear()
+
+
+# 全局实例
+_example_store = None
+_example_store_lock = threading.Lock()
+
+
+def get_example_store() -> ExampleStore:
+    """获取示例库单例"""
+    global _example_store
+    with _example_store_lock:
+        if _example_store is None:
+            _example_store = ExampleStore(
+                path=os.getenv('EXAMPLE_STORE_PATH', DEFAULT_EXAMPLE_STORE_PATH) or None,
+                reuse_threshold=float(os.getenv('EXAMPLE_REUSE_THRESHOLD', 0.9)),
+                enabled=os.getenv('EXAMPLE_STORE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+            )
+        return _example_store
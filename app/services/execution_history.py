@@ -0,0 +1,291 @@
+"""
+查询执行历史
+记录每次 process / execute 调用（自然语言、SQL、意图、行数、各阶段耗时、是否命中缓存），
+请求线程只把记录放入内存队列，后台线程按批写入本地 SQLite；
+分页使用 id 游标（keyset），翻到多深都只扫描一页的数据
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HISTORY_PATH = os.path.join('data', 'execution_history.db')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS execution_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    executed_at TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    natural_language TEXT,
+    sql TEXT,
+    intent TEXT,
+    sql_source TEXT,
+    success INTEGER NOT NULL,
+    rows_count INTEGER NOT NULL DEFAULT 0,
+    cached INTEGER NOT NULL DEFAULT 0,
+    query_time_ms REAL,
+    stage_timings TEXT,
+    error TEXT
+)
+"""
+
+# 按模式过滤时也能沿 id 倒序走索引
+_MODE_INDEX = "CREATE INDEX IF NOT EXISTS idx_execution_history_mode ON execution_history (mode, id)"
+
+_COLUMNS = (
+    'executed_at', 'mode', 'natural_language', 'sql', 'intent', 'sql_source',
+    'success', 'rows_count', 'cached', 'query_time_ms', 'stage_timings', 'error'
+)
+
+
+class ExecutionHistory:
+    """带缓冲批量写入的执行历史（SQLite）"""
+
+    def __init__(self, path: Optional[str] = None, batch_size: int = 100,
+                 flush_interval: float = 1.0, max_queue: int = 10000):
+        """
+        初始化执行历史
+
+        Args:
+            path: SQLite 文件路径；为 None 时禁用（记录被丢弃，查询返回空）
+            batch_size: 每个写事务最多写入的记录数
+            flush_interval: 后台线程等待新记录的超时（秒）
+            max_queue: 待写队列上限，写入跟不上时丢弃新记录而不阻塞请求
+        """
+        self.path = path
+        self.enabled = bool(path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=max_queue)
+        self._write_lock = threading.Lock()
+        self._writer_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._writer: Optional[threading.Thread] = None
+        self._writer_pid: Optional[int] = None
+        self.dropped = 0
+        self.written = 0
+        if self.enabled:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with self._connect() as conn:
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.execute(_SCHEMA)
+                conn.execute(_MODE_INDEX)
+
+    @contextmanager
+    def _connect(self):
+        """打开连接；正常退出时提交，最终关闭"""
+        conn = sqlite3.connect(self.path, timeout=5)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def record(self, entry: Dict[str, Any]) -> None:
+        """
+        记录一次执行（不阻塞；队列已满时丢弃并计数）
+
+        Args:
+            entry: 字段见 _COLUMNS；stage_timings 为 dict，executed_at 缺省为当前时间
+        """
+        if not self.enabled:
+            return
+        self._ensure_writer()
+        row = dict(entry)
+        row.setdefault('executed_at', datetime.now().isoformat())
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                logger.warning(f"Execution history queue full, dropped {self.dropped} records")
+
+    def _ensure_writer(self) -> None:
+        """启动后台写线程（fork 后在子进程中重新启动）"""
+        if self._writer_alive():
+            return
+        with self._writer_lock:
+            # 只能有一个消费者，否则写入顺序无法保证
+            if self._writer_alive():
+                return
+            self._writer_pid = os.getpid()
+            self._stop.clear()
+            self._writer = threading.Thread(target=self._run, name='execution-history-writer', daemon=True)
+            self._writer.start()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            batch = [first]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        rows = [
+            (
+                entry.get('executed_at'),
+                entry.get('mode') or 'unknown',
+                entry.get('natural_language'),
+                entry.get('sql'),
+                entry.get('intent'),
+                entry.get('sql_source'),
+                1 if entry.get('success') else 0,
+                int(entry.get('rows_count') or 0),
+                1 if entry.get('cached') else 0,
+                entry.get('query_time_ms'),
+                json.dumps(entry['stage_timings']) if entry.get('stage_timings') else None,
+                entry.get('error')
+            )
+            for entry in batch
+        ]
+        try:
+            with self._write_lock, self._connect() as conn:
+                conn.executemany(
+                    f"INSERT INTO execution_history ({', '.join(_COLUMNS)}) "
+                    f"VALUES ({', '.join('?' for _ in _COLUMNS)})",
+                    rows
+                )
+            self.written += len(rows)
+        except sqlite3.Error as e:
+            logger.error(f"Failed to write {len(rows)} execution history records: {e}")
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+
+    def _writer_alive(self) -> bool:
+        return self._writer is not None and self._writer.is_alive() and self._writer_pid == os.getpid()
+
+    def flush(self) -> None:
+        """
+        等待队列中的记录全部写入
+
+        后台线程在运行时由它写完（只有一个消费者，保证写入顺序与记录顺序一致），
+        否则在当前线程中直接写入
+        """
+        if not self.enabled:
+            return
+        if self._writer_alive():
+            self._queue.join()
+        else:
+            self._drain()
+
+    def _drain(self) -> None:
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+            if len(batch) >= self.batch_size:
+                self._write(batch)
+                batch = []
+        if batch:
+            self._write(batch)
+
+    def close(self) -> None:
+        """停止后台线程并写入剩余记录"""
+        if not self.enabled:
+            return
+        self._stop.set()
+        if self._writer_alive():
+            self._writer.join(timeout=self.flush_interval + 5)
+        self._drain()
+
+    def page(self, limit: int = 20, cursor: Optional[int] = None, offset: int = 0,
+             mode: Optional[str] = None) -> Dict[str, Any]:
+        """
+        按时间倒序分页读取
+
+        Args:
+            limit: 每页记录数
+            cursor: 上一页返回的 next_cursor（取 id 小于它的记录）；提供时忽略 offset
+            offset: 兼容旧接口的偏移量分页（深页会变慢，建议使用 cursor）
+            mode: 只返回指定模式（explain / execute / approved）的记录
+
+        Returns:
+            {"history": [...], "next_cursor": int 或 None, "total": int 或 None}；
+            total 需要全表计数，只在第一页（未提供 cursor）时返回，之后的页为 None
+        """
+        if not self.enabled:
+            return {'history': [], 'next_cursor': None, 'total': 0}
+
+        conditions, params = [], []
+        if mode:
+            conditions.append('mode = ?')
+            params.append(mode)
+        where_total = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        total_params = list(params)
+        if cursor is not None:
+            conditions.append('id < ?')
+            params.append(cursor)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        sql = f"SELECT * FROM execution_history {where} ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+        if cursor is None and offset > 0:
+            sql += " OFFSET ?"
+            params.append(offset)
+
+        with self._connect() as conn:
+            rows = conn.execute(sql, params).fetchall()
+            total = None
+            if cursor is None:
+                total = conn.execute(f"SELECT COUNT(*) FROM execution_history {where_total}",
+                                     total_params).fetchone()[0]
+
+        history = []
+        for row in rows:
+            item = dict(row)
+            item['success'] = bool(item['success'])
+            item['cached'] = bool(item['cached'])
+            item['stage_timings'] = json.loads(item['stage_timings']) if item['stage_timings'] else None
+            history.append(item)
+        return {
+            'history': history,
+            'next_cursor': history[-1]['id'] if len(history) == limit else None,
+            'total': total
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'enabled': self.enabled,
+            'pending': self._queue.qsize(),
+            'written': self.written,
+            'dropped': self.dropped
+        }
+
+
+# 全局实例
+_execution_history = None
+_execution_history_lock = threading.Lock()
+
+
+def get_execution_history() -> ExecutionHistory:
+    """获取执行历史单例"""
+    global _execution_history
+    with _execution_history_lock:
+        if _execution_history is None:
+            enabled = os.getenv('EXECUTION_HISTORY_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+            _execution_history = ExecutionHistory(
+                path=(os.getenv('EXECUTION_HISTORY_PATH', DEFAULT_HISTORY_PATH) or None) if enabled else None,
+                batch_size=int(os.getenv('EXECUTION_HISTORY_BATCH_SIZE', 100)),
+                flush_interval=float(os.getenv('EXECUTION_HISTORY_FLUSH_SECONDS', 1.0)),
+                max_queue=int(os.getenv('EXECUTION_HISTORY_MAX_QUEUE', 10000))
+            )
+            atexit.register(_execution_history.close)
+        return _execution_history
@@ -0,0 +1,284 @@
+"""
+Local statistical intent classifier.
+
+Character n-gram TF-IDF features with a multinomial logistic regression,
+trained offline (see app/tools/train_intent_classifier.py) and stored as a
+compact JSON model. Probabilities are temperature-scaled on held-out data,
+so the confidence can decide whether the LLM needs to be consulted at all.
+Pure Python, no numerical dependencies: prediction touches only the n-grams
+present in the query.
+"""
+
+import json
+import logging
+import math
+import os
+import random
+import re
+import unicodedata
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'resources', 'intent_classifier.json'
+)
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_text(text: str) -> str:
+    """NFKC (full-width to half-width), lowercase, collapse whitespace"""
+    return _WHITESPACE.sub(' ', unicodedata.normalize('NFKC', text or '').lower()).strip()
+
+
+def char_ngrams(text: str, ngram_range: Tuple[int, int] = (1, 3)) -> Counter:
+    """Count character n-grams of the normalized text (padded with spaces at the ends)"""
+    padded = f' {normalize_text(text)} '
+    counts = Counter()
+    for n in range(ngram_range[0], ngram_range[1] + 1):
+        for i in range(len(padded) - n + 1):
+            gram = padded[i:i + n]
+            if gram.strip():
+                counts[gram] += 1
+    return counts
+
+
+def _softmax(logits: Sequence[float], temperature: float = 1.0) -> List[float]:
+    scaled = [z / temperature for z in logits]
+    top = max(scaled)
+    exps = [math.exp(z - top) for z in scaled]
+    total = sum(exps)
+    return [e / total for e in exps]
+
+
+class IntentClassifier:
+    """Character n-gram TF-IDF + softmax regression intent classifier"""
+
+    def __init__(self, classes: List[str], features: Dict[str, Tuple[float, List[float]]],
+                 bias: List[float], temperature: float = 1.0,
+                 ngram_range: Tuple[int, int] = (1, 3), metadata: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            classes: Intent labels, in weight-vector order
+            features: n-gram -> (idf, per-class weights)
+            bias: Per-class bias
+            temperature: Calibration temperature applied to logits
+            ngram_range: Inclusive character n-gram sizes
+            metadata: Training information (sample count, metrics, ...)
+        """
+        self.classes = classes
+        self.features = features
+        self.bias = bias
+        self.temperature = temperature
+        self.ngram_range = tuple(ngram_range)
+        self.metadata = metadata or {}
+
+    def _vectorize(self, text: str) -> List[Tuple[List[float], float]]:
+        """Sparse L2-normalized TF-IDF vector as [(class weights, value)]"""
+        entries = []
+        for gram, count in char_ngrams(text, self.ngram_range).items():
+            feature = self.features.get(gram)
+            if feature is not None:
+                idf, weights = feature
+                entries.append((weights, (1 + math.log(count)) * idf))
+        norm = math.sqrt(sum(v * v for _, v in entries)) or 1.0
+        return [(weights, v / norm) for weights, v in entries]
+
+    def _logits(self, text: str) -> List[float]:
+        logits = list(self.bias)
+        for weights, value in self._vectorize(text):
+            for k, w in enumerate(weights):
+                logits[k] += w * value
+        return logits
+
+    def predict_proba(self, text: str) -> Dict[str, float]:
+        """Calibrated class probabilities"""
+        return dict(zip(self.classes, _softmax(self._logits(text), self.temperature)))
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        """Most likely intent and its calibrated probability"""
+        probs = _softmax(self._logits(text), self.temperature)
+        best = max(range(len(probs)), key=probs.__getitem__)
+        return self.classes[best], probs[best]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'format': 'char-ngram-tfidf-softmax/v1',
+            'classes': self.classes,
+            'ngram_range': list(self.ngram_range),
+            'temperature': round(self.temperature, 4),
+            'bias': [round(b, 4) for b in self.bias],
+            'features': {
+                gram: [round(idf, 4), [round(w, 4) for w in weights]]
+                for gram, (idf, weights) in sorted(self.features.items())
+            },
+            'metadata': self.metadata
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'IntentClassifier':
+        return cls(
+            classes=data['classes'],
+            features={gram: (idf, weights) for gram, (idf, weights) in data['features'].items()},
+            bias=data['bias'],
+            temperature=data.get('temperature', 1.0),
+            ngram_range=tuple(data.get('ngram_range', (1, 3))),
+            metadata=data.get('metadata', {})
+        )
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, path: str) -> 'IntentClassifier':
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+
+def _fit_softmax(vectors: List[Dict[int, float]], labels: List[int], n_features: int, n_classes: int,
+                 epochs: int, learning_rate: float, l2: float, rng: random.Random
+                 ) -> Tuple[List[List[float]], List[float]]:
+    """Plain SGD on the multinomial logistic loss with L2 regularization"""
+    weights = [[0.0] * n_classes for _ in range(n_features)]
+    bias = [0.0] * n_classes
+    order = list(range(len(vectors)))
+    for epoch in range(epochs):
+        rng.shuffle(order)
+        lr = learning_rate / (1 + 0.1 * epoch)
+        for i in order:
+            x, y = vectors[i], labels[i]
+            logits = list(bias)
+            for j, v in x.items():
+                row = weights[j]
+                for k in range(n_classes):
+                    logits[k] += row[k] * v
+            probs = _softmax(logits)
+            grad = [p - (1.0 if k == y else 0.0) for k, p in enumerate(probs)]
+            for k in range(n_classes):
+                bias[k] -= lr * grad[k]
+            for j, v in x.items():
+                row = weights[j]
+                for k in range(n_classes):
+                    row[k] -= lr * (grad[k] * v + l2 * row[k])
+    return weights, bias
+
+
+def _fit_temperature(logits: List[List[float]], labels: List[int]) -> float:
+    """Pick the temperature minimizing held-out negative log-likelihood"""
+    best_t, best_nll = 1.0, float('inf')
+    for step in range(1, 61):
+        t = step * 0.1
+        nll = -sum(math.log(max(_softmax(z, t)[y], 1e-12)) for z, y in zip(logits, labels))
+        if nll < best_nll:
+            best_t, best_nll = t, nll
+    return best_t
+
+
+def train_intent_classifier(samples: Iterable[Tuple[str, str]], ngram_range: Tuple[int, int] = (1, 3),
+                            min_df: int = 2, epochs: int = 30, learning_rate: float = 0.5,
+                            l2: float = 1e-4, holdout: float = 0.2, seed: int = 13,
+                            prune_below: float = 0.02) -> IntentClassifier:
+    """
+    Train a classifier from (query, intent) pairs.
+
+    The temperature is fitted on a stratified hold-out split, then the final
+    weights are trained on all samples.
+
+    Args:
+        samples: (query, intent) pairs
+        ngram_range: Inclusive character n-gram sizes
+        min_df: Minimum document frequency for an n-gram to become a feature
+        epochs: SGD epochs
+        learning_rate: Initial SGD step size
+        l2: L2 regularization strength
+        holdout: Fraction of each class held out for calibration
+        seed: Random seed (training is deterministic for a given seed)
+        prune_below: Drop features whose weights are all smaller than this
+    """
+    samples = [(text, label) for text, label in samples if text and label]
+    if not samples:
+        raise ValueError('No training samples')
+    rng = random.Random(seed)
+    classes = sorted({label for _, label in samples})
+    class_index = {label: k for k, label in enumerate(classes)}
+
+    grams = [char_ngrams(text, ngram_range) for text, _ in samples]
+    df = Counter(g for counts in grams for g in counts)
+    vocab = {g: i for i, g in enumerate(sorted(g for g, c in df.items() if c >= min_df))}
+    n_docs = len(samples)
+    idf = [0.0] * len(vocab)
+    for g, i in vocab.items():
+        idf[i] = math.log((1 + n_docs) / (1 + df[g])) + 1
+
+    vectors = []
+    for counts in grams:
+        x = {vocab[g]: (1 + math.log(c)) * idf[vocab[g]] for g, c in counts.items() if g in vocab}
+        norm = math.sqrt(sum(v * v for v in x.values())) or 1.0
+        vectors.append({j: v / norm for j, v in x.items()})
+    labels = [class_index[label] for _, label in samples]
+
+    # Stratified split for temperature calibration
+    by_class: Dict[int, List[int]] = {}
+    for i, y in enumerate(labels):
+        by_class.setdefault(y, []).append(i)
+    held = set()
+    for indices in by_class.values():
+        rng.shuffle(indices)
+        held.update(indices[:int(len(indices) * holdout)])
+    temperature = 1.0
+    if held:
+        train_idx = [i for i in range(n_docs) if i not in held]
+        w, b = _fit_softmax([vectors[i] for i in train_idx], [labels[i] for i in train_idx],
+                            len(vocab), len(classes), epochs, learning_rate, l2, rng)
+        held_logits = []
+        for i in sorted(held):
+            z = list(b)
+            for j, v in vectors[i].items():
+                for k in range(len(classes)):
+                    z[k] += w[j][k] * v
+            held_logits.append(z)
+        temperature = _fit_temperature(held_logits, [labels[i] for i in sorted(held)])
+
+    weights, bias = _fit_softmax(vectors, labels, len(vocab), len(classes),
+                                 epochs, learning_rate, l2, rng)
+    features = {
+        g: (idf[i], weights[i]) for g, i in vocab.items()
+        if max(abs(w) for w in weights[i]) >= prune_below
+    }
+    metadata = {
+        'samples': n_docs,
+        'class_counts': {label: len(by_class[class_index[label]]) for label in classes},
+        'features': len(features)
+    }
+    return IntentClassifier(classes, features, bias, temperature, ngram_range, metadata)
+
+
+# Global instance
+_intent_classifier = None
+_intent_classifier_loaded = False
+
+
+def get_intent_classifier() -> Optional[IntentClassifier]:
+    """
+    Load the intent classifier singleton from INTENT_CLASSIFIER_MODEL
+    (defaults to the bundled model). Returns None when disabled or unavailable.
+    """
+    global _intent_classifier, _intent_classifier_loaded
+    if not _intent_classifier_loaded:
+        _intent_classifier_loaded = True
+        if os.getenv('INTENT_CLASSIFIER_ENABLED', 'true').lower() not in ('1', 'true', 'yes'):
+            return None
+        path = os.getenv('INTENT_CLASSIFIER_MODEL') or DEFAULT_MODEL_PATH
+        try:
+            _intent_classifier = IntentClassifier.load(path)
+            logger.info(f"Intent classifier loaded from {path} "
+                        f"({len(_intent_classifier.features)} features)")
+        except FileNotFoundError:
+            logger.warning(f"Intent classifier model not found: {path}")
+        except Exception as e:
+            logger.warning(f"Failed to load intent classifier: {e}")
+    return _intent_classifier
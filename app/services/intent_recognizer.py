@@ -7,16 +7,102 @@ from typing import Dict, List, Optional, Any
 import re
 import logging
 import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from app.services.intent_classifier import get_intent_classifier
+from app.services.keyword_automaton import KeywordAutomaton
+from app.services.schema_retriever import estimate_tokens
 
 logger = logging.getLogger(__name__)
 
+_query_log_lock = threading.Lock()
+
+# sequential: rules/classifier first, LLM only if they are unsure
+# speculative: the LLM call starts together with the rules and is dropped if they are sure
+LATENCY_MODES = ('sequential', 'speculative')
+
+_speculative_executor = None
+_speculative_executor_lock = threading.Lock()
+
+
+def _get_speculative_executor() -> ThreadPoolExecutor:
+    """Shared pool for speculative LLM calls (INTENT_SPECULATIVE_WORKERS threads)"""
+    global _speculative_executor
+    with _speculative_executor_lock:
+        if _speculative_executor is None:
+            _speculative_executor = ThreadPoolExecutor(
+                max_workers=int(os.getenv('INTENT_SPECULATIVE_WORKERS', 8)),
+                thread_name_prefix='intent-llm'
+            )
+        return _speculative_executor
+
+# Time expressions in priority order: when several appear, the first listed wins
+TIME_EXPRESSIONS = [
+    ('today', ['今天', '今日']),
+    ('yesterday', ['昨天', '昨日']),
+    ('this_week', ['本周', '这周']),
+    ('last_week', ['上周', '上星期']),
+    ('this_month', ['本月', '这个月']),
+    ('last_month', ['上月', '上个月']),
+]
+
+# Metric keyword -> metric field
+METRIC_KEYWORDS = {
+    '产量': 'output_qty',
+    '良品率': 'yield_rate',
+    '良率': 'yield_rate',
+    'oee': 'oee',
+    '稼动率': 'utilization_rate',
+    '效率': 'efficiency',
+    '停机': 'downtime'
+}
+
+# Entity patterns, compiled once. Each one overlaps the others (\w+ also matches CJK),
+# so they stay separate searches to keep leftmost-match results; a pattern only runs
+# when the keyword scan has seen one of its required literals (ENTITY_ANCHORS)
+NUM_TIME_PATTERN = re.compile(r'(?:最近|过去|最)?\s*(?P<number>\d+)\s*(?P<unit>天|周|月)')
+TABLE_PATTERN = re.compile(r'(?:查询|返回|显示|获取)?\s*(\w+)\s*表')
+LIMIT_PATTERN = re.compile(r'(?:前\s*)?(\d+)\s*(?:条|条数|行|rows)')
+EQUIPMENT_PATTERN = re.compile(r'(?:设备|设备号|设备ID)\s*[:：]?\s*(\w+)')
+PRODUCT_LINE_PATTERN = re.compile(r'(?:产品线|产线)\s*[:：]?\s*(\w+)')
+
+# Literals without which the corresponding pattern cannot match
+ENTITY_ANCHORS = {
+    'num_time': ['天', '周', '月'],
+    'table': ['表'],
+    'limit': ['条', '行', 'rows'],
+    'equipment': ['设备'],
+    'productLine': ['产线', '产品线'],
+}
+
 
 class IntentRecognizer:
     """MES system intent recognition service with hybrid rule and LLM approach"""
     
-    def __init__(self, llm_provider=None):
-        """Initialize intent recognizer with optional LLM provider"""
+    def __init__(self, llm_provider=None, classifier=None):
+        """
+        Initialize intent recognizer.
+
+        Args:
+            llm_provider: Optional LLM provider used for uncertain queries
+            classifier: Local intent classifier (defaults to the bundled model; see intent_classifier)
+        """
         self.llm_provider = llm_provider
+        self.classifier = classifier if classifier is not None else get_intent_classifier()
+        self.classifier_threshold = float(os.getenv('INTENT_CLASSIFIER_THRESHOLD', 0.7))
+        self.query_log_path = os.getenv('INTENT_QUERY_LOG') or None
+        self.latency_mode = (os.getenv('INTENT_LATENCY_MODE') or 'sequential').lower()
+        if self.latency_mode not in LATENCY_MODES:
+            logger.warning(f"Unknown INTENT_LATENCY_MODE '{self.latency_mode}', using sequential")
+            self.latency_mode = 'sequential'
+        
+        # LLM spend per mode ('batch' covers recognize_batch)
+        self._llm_stats_lock = threading.Lock()
+        self._llm_stats = {mode: self._empty_llm_stats() for mode in LATENCY_MODES + ('batch',)}
         
         # Intent configuration
         self.intents = {
@@ -51,6 +137,32 @@ class IntentRecognizer:
                 'description': 'Comparative analysis'
             }
         }
+        
+        self.rebuild_keyword_matcher()
+    
+    def rebuild_keyword_matcher(self) -> None:
+        """
+        Build the keyword automaton from intent keywords, time expressions and metric keywords.
+
+        Call again after modifying self.intents.
+        """
+        automaton = KeywordAutomaton()
+        for intent_name, config in self.intents.items():
+            for keyword in config['keywords']:
+                automaton.add(keyword.lower(), ('intent', intent_name, keyword.lower()))
+        for priority, (value, expressions) in enumerate(TIME_EXPRESSIONS):
+            for expression in expressions:
+                automaton.add(expression, ('time', priority, value))
+        for keyword, metric in METRIC_KEYWORDS.items():
+            automaton.add(keyword.lower(), ('metric', metric))
+        for entity, anchors in ENTITY_ANCHORS.items():
+            for anchor in anchors:
+                automaton.add(anchor, ('anchor', entity))
+        self._keyword_matcher = automaton.build()
+    
+    def _scan_keywords(self, text: str) -> set:
+        """Single pass over the input collecting intent, time and metric keyword hits"""
+        return self._keyword_matcher.find_payloads(text.lower())
     
     def recognize(self, user_input: str) -> Dict[str, Any]:
         """
@@ -58,8 +170,9 @@ class IntentRecognizer:
 
         Strategy:
           1. Fast rule-based matching with low latency
-          2. LLM matching for uncertain cases (high accuracy)
-          3. Merge results from both methods
+          2. Local classifier for queries the rules are unsure about
+          3. LLM matching for uncertain cases (high accuracy)
+          4. Merge results from both methods
 
         Args:
             user_input: Natural language query from user
@@ -68,61 +181,301 @@ class IntentRecognizer:
             dict: Recognition result with keys: success, intent, confidence, entities, clarifications, methodsUsed
         """
         try:
-            # Step 1: Rule-based matching
-            rule_result = self._rule_based_match(user_input)
-            
-            logger.info(f"Rule match result: intent={rule_result['intent']}, "
-                       f"confidence={rule_result['confidence']:.2f}")
+            mode = self.latency_mode if self.llm_provider else 'sequential'
+            self._record_llm_spend(mode, requests=1)
+            if mode == 'speculative':
+                return self._recognize_speculative(user_input)
             
-            # Step 2: Return if rule confidence is high
-            if rule_result['confidence'] > 0.8:
-                return {
-                    'success': True,
-                    'intent': rule_result['intent'],
-                    'confidence': rule_result['confidence'],
-                    'entities': rule_result['entities'],
-                    'clarifications': self._generate_clarifications(
-                        rule_result['intent'],
-                        rule_result['entities'],
-                        rule_result['confidence']
-                    ),
-                    'methodsUsed': ['rule']
-                }
+            # Steps 1-2: Rule-based matching, then the local classifier
+            local_result, rule_result = self._local_match(user_input)
+            if local_result is not None:
+                return local_result
             
             # Step 3: LLM confirmation
-            llm_result = self._llm_based_match(user_input)
-            
-            logger.info(f"LLM match result: intent={llm_result['intent']}, "
-                       f"confidence={llm_result['confidence']:.2f}")
+            llm_result = self._llm_based_match(user_input, mode)
+            self._record_llm_spend(mode, llm_results_used=1)
             
             # Step 4: Merge results
-            merged = self._merge_results(rule_result, llm_result)
-            
-            return {
-                'success': True,
-                'intent': merged['intent'],
-                'confidence': merged['confidence'],
-                'entities': merged['entities'],
-                'clarifications': self._generate_clarifications(
-                    merged['intent'],
-                    merged['entities'],
-                    merged['confidence']
-                ),
-                'methodsUsed': merged['methodsUsed'],
-                'reasoning': llm_result.get('reasoning', '')
-            }
+            return self._finalize_llm_result(user_input, rule_result, llm_result)
             
         except Exception as e:
             logger.error(f"Error in recognize: {str(e)}")
-            return {
-                'success': False,
-                'error': str(e),
-                'intent': 'other',
-                'confidence': 0.0,
-                'entities': {},
-                'clarifications': [],
-                'methodsUsed': []
-            }
+            return self._error_result(e)
+    
+    def _recognize_speculative(self, user_input: str) -> Dict[str, Any]:
+        """
+        Start the LLM call before the local path instead of after it.
+
+        When the rules or the classifier are confident the LLM result is dropped:
+        a call that has not started yet is cancelled, one already in flight is
+        abandoned (it finishes in the background and is counted as wasted spend).
+        """
+        future = _get_speculative_executor().submit(self._llm_based_match, user_input, 'speculative')
+        try:
+            local_result, rule_result = self._local_match(user_input)
+        except Exception:
+            future.cancel()
+            raise
+        
+        if local_result is not None:
+            if future.cancel():
+                self._record_llm_spend('speculative', llm_cancelled=1)
+            else:
+                self._record_llm_spend('speculative', llm_abandoned=1)
+            return local_result
+        
+        llm_result = future.result()
+        self._record_llm_spend('speculative', llm_results_used=1)
+        return self._finalize_llm_result(user_input, rule_result, llm_result)
+    
+    @staticmethod
+    def _empty_llm_stats() -> Dict[str, Any]:
+        return {
+            'requests': 0,
+            'llm_calls': 0,
+            'llm_results_used': 0,
+            'llm_cancelled': 0,
+            'llm_abandoned': 0,
+            'prompt_tokens': 0,
+            'completion_tokens': 0,
+            'llm_ms': 0.0
+        }
+    
+    def _record_llm_spend(self, mode: str, **counts) -> None:
+        with self._llm_stats_lock:
+            stats = self._llm_stats[mode]
+            for key, value in counts.items():
+                stats[key] += value
+    
+    def get_llm_spend_stats(self) -> Dict[str, Any]:
+        """
+        LLM spend per latency mode.
+
+        Token counts are estimates (see schema_retriever.estimate_tokens); calls
+        answered by the LLM response cache are counted as well.
+        """
+        with self._llm_stats_lock:
+            modes = {mode: dict(stats) for mode, stats in self._llm_stats.items()}
+        for stats in modes.values():
+            stats['llm_ms'] = round(stats['llm_ms'], 3)
+            stats['llm_calls_per_request'] = (
+                round(stats['llm_calls'] / stats['requests'], 4) if stats['requests'] else 0.0
+            )
+        return {'latency_mode': self.latency_mode, 'modes': modes}
+    
+    def _generate(self, prompt: str, mode: str) -> str:
+        """Call the LLM provider and record the spend under the given mode"""
+        start = time.perf_counter()
+        response = ''
+        try:
+            response = self.llm_provider.generate(prompt) or ''
+            return response
+        finally:
+            self._record_llm_spend(
+                mode,
+                llm_calls=1,
+                prompt_tokens=estimate_tokens(prompt),
+                completion_tokens=estimate_tokens(response),
+                llm_ms=(time.perf_counter() - start) * 1000
+            )
+    
+    @staticmethod
+    def _error_result(error: Exception) -> Dict[str, Any]:
+        return {
+            'success': False,
+            'error': str(error),
+            'intent': 'other',
+            'confidence': 0.0,
+            'entities': {},
+            'clarifications': [],
+            'methodsUsed': []
+        }
+    
+    def _build_result(self, intent: str, confidence: float, entities: Dict[str, Any],
+                      methods: List[str]) -> Dict[str, Any]:
+        return {
+            'success': True,
+            'intent': intent,
+            'confidence': confidence,
+            'entities': entities,
+            'clarifications': self._generate_clarifications(intent, entities, confidence),
+            'methodsUsed': methods
+        }
+    
+    def _local_match(self, user_input: str):
+        """
+        Rule path followed by the local classifier.
+
+        Returns:
+            tuple: (final result or None when the LLM is needed, rule result)
+        """
+        rule_result = self._rule_based_match(user_input)
+        
+        logger.info(f"Rule match result: intent={rule_result['intent']}, "
+                   f"confidence={rule_result['confidence']:.2f}")
+        
+        # Return if rule confidence is high
+        if rule_result['confidence'] > 0.8:
+            return self._build_result(
+                rule_result['intent'], rule_result['confidence'], rule_result['entities'], ['rule']
+            ), rule_result
+        
+        # Local classifier; only fall through to the LLM when it is not confident
+        classifier_result = self._classifier_match(user_input, rule_result)
+        if classifier_result and classifier_result['confidence'] >= self.classifier_threshold:
+            return self._build_result(
+                classifier_result['intent'], classifier_result['confidence'],
+                classifier_result['entities'], ['rule', 'classifier']
+            ), rule_result
+        
+        return None, rule_result
+    
+    def _finalize_llm_result(self, user_input: str, rule_result: Dict[str, Any],
+                             llm_result: Dict[str, Any]) -> Dict[str, Any]:
+        """Log the LLM label and merge it with the rule result"""
+        logger.info(f"LLM match result: intent={llm_result['intent']}, "
+                   f"confidence={llm_result['confidence']:.2f}")
+        if llm_result['confidence'] > 0:
+            self._log_labelled_query(user_input, llm_result['intent'], llm_result['confidence'])
+        
+        merged = self._merge_results(rule_result, llm_result)
+        result = self._build_result(
+            merged['intent'], merged['confidence'], merged['entities'], merged['methodsUsed']
+        )
+        result['reasoning'] = llm_result.get('reasoning', '')
+        return result
+    
+    def recognize_batch(self, queries: List[str], llm_batch_size: Optional[int] = None,
+                        max_concurrency: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Recognize intents for many queries at once.
+
+        The rule/classifier path runs for every item first; the items that still
+        need the LLM are packed into multi-item prompts (llm_batch_size per prompt)
+        that run with bounded concurrency. Items missing from a packed response
+        fall back to a single-item LLM call.
+
+        Args:
+            queries: Natural language queries
+            llm_batch_size: Items per packed LLM prompt (INTENT_LLM_BATCH_SIZE, default 20)
+            max_concurrency: Concurrent LLM calls (INTENT_LLM_MAX_CONCURRENCY, default 4)
+
+        Returns:
+            list: One recognize()-shaped result per query, in order, each with a
+            'timings' dict (local_ms, llm_ms, total_ms)
+        """
+        llm_batch_size = llm_batch_size or int(os.getenv('INTENT_LLM_BATCH_SIZE', 20))
+        max_concurrency = max_concurrency or int(os.getenv('INTENT_LLM_MAX_CONCURRENCY', 4))
+        
+        self._record_llm_spend('batch', requests=len(queries))
+        results: List[Optional[Dict[str, Any]]] = [None] * len(queries)
+        timings = [{'local_ms': 0.0, 'llm_ms': 0.0, 'total_ms': 0.0} for _ in queries]
+        pending = []  # (index, query, rule_result)
+        
+        # Pass 1: rule + classifier for every item
+        for index, query in enumerate(queries):
+            start = time.perf_counter()
+            try:
+                local_result, rule_result = self._local_match(query)
+                if local_result is not None:
+                    results[index] = local_result
+                else:
+                    pending.append((index, query, rule_result))
+            except Exception as e:
+                logger.error(f"Error in recognize_batch item {index}: {str(e)}")
+                results[index] = self._error_result(e)
+            timings[index]['local_ms'] = (time.perf_counter() - start) * 1000
+        
+        # Pass 2: packed LLM prompts with bounded concurrency
+        if pending and self.llm_provider:
+            chunks = [pending[i:i + llm_batch_size] for i in range(0, len(pending), llm_batch_size)]
+            answered = {}  # index -> llm_result
+            missing = []
+            with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as pool:
+                for chunk, (llm_results, elapsed_ms) in zip(chunks, pool.map(self._llm_batch_match, chunks)):
+                    for item in chunk:
+                        if item[0] in llm_results:
+                            answered[item[0]] = llm_results[item[0]]
+                            timings[item[0]]['llm_ms'] += elapsed_ms
+                        else:
+                            missing.append(item)
+                # Items the packed responses skipped: single calls through the same bounded pool
+                for (index, _, _), (llm_result, elapsed_ms) in zip(
+                        missing, pool.map(self._timed_single_match, [query for _, query, _ in missing])):
+                    answered[index] = llm_result
+                    timings[index]['llm_ms'] += elapsed_ms
+            for index, query, rule_result in pending:
+                self._record_llm_spend('batch', llm_results_used=1)
+                results[index] = self._finalize_llm_result(query, rule_result, answered[index])
+        else:
+            for index, query, rule_result in pending:
+                results[index] = self._finalize_llm_result(query, rule_result, self._llm_based_match(query, 'batch'))
+        
+        for index, result in enumerate(results):
+            timings[index]['total_ms'] = round(timings[index]['local_ms'] + timings[index]['llm_ms'], 3)
+            timings[index]['local_ms'] = round(timings[index]['local_ms'], 3)
+            timings[index]['llm_ms'] = round(timings[index]['llm_ms'], 3)
+            result['timings'] = timings[index]
+        return results
+    
+    def _timed_single_match(self, query: str):
+        """Single-item LLM fallback for recognize_batch; returns (llm_result, elapsed_ms)."""
+        start = time.perf_counter()
+        llm_result = self._llm_based_match(query, 'batch')
+        return llm_result, (time.perf_counter() - start) * 1000
+    
+    def _llm_batch_match(self, items: List[tuple]):
+        """
+        Classify several queries with one packed LLM prompt.
+
+        Args:
+            items: (index, query, rule_result) tuples
+
+        Returns:
+            tuple: ({index: llm_result}, elapsed_ms); items the LLM skipped are absent
+        """
+        start = time.perf_counter()
+        numbered = '\n'.join(f'{i}. "{query}"' for i, (_, query, _) in enumerate(items))
+        prompt = f"""Analyze the intent of each user query in MES system.
+
+Possible intent types and descriptions:
+{chr(10).join(f"- {k}: {v['description']}" for k, v in self.intents.items())}
+
+User queries:
+{numbered}
+
+Return a JSON array with one object per query (must be valid JSON):
+[
+    {{
+        "id": 0,
+        "intent": "intent_type",
+        "confidence": 0.95,
+        "entities": {{
+            "timeRange": "time_range",
+            "metric": "metric"
+        }},
+        "reasoning": "reason_for_judgment"
+    }}
+]"""
+        parsed = {}
+        try:
+            response = self._generate(prompt, 'batch')
+            json_str = response.strip()
+            if json_str.startswith('```'):
+                lines = json_str.splitlines()
+                json_str = '\n'.join(line for line in lines[1:] if not line.strip().startswith('```'))
+            for entry in json.loads(json_str):
+                position = int(entry.get('id', -1))
+                if 0 <= position < len(items):
+                    parsed[items[position][0]] = {
+                        'intent': entry.get('intent', 'other'),
+                        'confidence': float(entry.get('confidence', 0.0)),
+                        'entities': entry.get('entities', {}) or {},
+                        'reasoning': entry.get('reasoning', '')
+                    }
+        except Exception as e:
+            logger.error(f"Packed LLM intent call failed for {len(items)} items: {str(e)}")
+        return parsed, (time.perf_counter() - start) * 1000
     
     def _rule_based_match(self, text: str) -> Dict[str, Any]:
         """
@@ -131,22 +484,19 @@ class IntentRecognizer:
         Returns:
             dict: Intent matching result with keys: intent, confidence, entities
         """
-        normalized_input = text.lower()
-        scores = {}
+        hits = self._scan_keywords(text)
+        
+        # Count distinct keyword matches per intent
+        matched = {}
+        for hit in hits:
+            if hit[0] == 'intent':
+                matched[hit[1]] = matched.get(hit[1], 0) + 1
         
-        # Calculate match scores for each intent
+        # Normalize score to 0-1 (iterate in declaration order so ties keep the first intent)
+        scores = {}
         for intent_name, config in self.intents.items():
-            score = 0
-            keywords = config['keywords']
-            
-            # Count keyword matches
-            for keyword in keywords:
-                if keyword.lower() in normalized_input:
-                    score += 1
-            
-            if score > 0:
-                # Normalize score to 0-1
-                scores[intent_name] = score / len(keywords)
+            if matched.get(intent_name):
+                scores[intent_name] = matched[intent_name] / len(config['keywords'])
         
         # No match found
         if not scores:
@@ -162,13 +512,57 @@ class IntentRecognizer:
         return {
             'intent': best_intent,
             'confidence': scores[best_intent],
-            'entities': self._extract_entities(text, best_intent)
+            'entities': self._extract_entities(text, best_intent, hits)
+        }
+    
+    def _classifier_match(self, text: str, rule_result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Intent classification with the local statistical model.
+
+        Returns:
+            dict with keys intent, confidence, entities; None when no classifier is loaded
+        """
+        if self.classifier is None:
+            return None
+        try:
+            intent, confidence = self.classifier.predict(text)
+        except Exception as e:
+            logger.warning(f"Intent classifier failed: {str(e)}")
+            return None
+        
+        logger.info(f"Classifier result: intent={intent}, confidence={confidence:.2f}")
+        return {
+            'intent': intent,
+            'confidence': confidence,
+            # Entity extraction does not depend on the intent, reuse the rule pass when it ran
+            'entities': rule_result['entities'] or self._extract_entities(text, intent)
         }
     
-    def _llm_based_match(self, text: str) -> Dict[str, Any]:
+    def _log_labelled_query(self, text: str, intent: str, confidence: float) -> None:
+        """Append an LLM-labelled query to INTENT_QUERY_LOG (training data for the classifier)"""
+        if not self.query_log_path:
+            return
+        try:
+            line = json.dumps({
+                'query': text,
+                'intent': intent,
+                'confidence': confidence,
+                'source': 'llm',
+                'logged_at': datetime.utcnow().isoformat()
+            }, ensure_ascii=False)
+            with _query_log_lock, open(self.query_log_path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+        except Exception as e:
+            logger.warning(f"Failed to log labelled query: {str(e)}")
+    
+    def _llm_based_match(self, text: str, mode: str = 'sequential') -> Dict[str, Any]:
         """
         Intent recognition using DeepSeek LLM.
 
+        Args:
+            text: User query
+            mode: Latency mode the LLM spend is recorded under
+
         Returns:
             dict: LLM matching result with keys: intent, confidence, entities, reasoning
         """
@@ -201,8 +595,9 @@ Return analysis result in JSON format (must be valid JSON):
     "reasoning": "reason_for_judgment"
 }}"""
         
+        response = ''
         try:
-            response = self.llm_provider.generate(prompt)
+            response = self._generate(prompt, mode)
             
             # Auto-remove markdown code block wrapper (e.g. ```json ... ```)
             if response.strip().startswith('```'):
@@ -242,7 +637,7 @@ Return analysis result in JSON format (must be valid JSON):
                 'llm_raw_response': response
             }
     
-    def _extract_entities(self, text: str, intent: str) -> Dict[str, Any]:
+    def _extract_entities(self, text: str, intent: str, hits: Optional[set] = None) -> Dict[str, Any]:
         """
         Extract entity information from user input.
 
@@ -253,69 +648,55 @@ Return analysis result in JSON format (must be valid JSON):
           - metrics: metrics to query
           - equipment: equipment IDs
           - productLine: product line
+
+        Args:
+            text: User input
+            intent: Recognized intent
+            hits: Keyword hits from _scan_keywords (scanned here when not provided)
         """
         entities = {}
+        if hits is None:
+            hits = self._scan_keywords(text)
         
-        # Time range extraction
-        time_patterns = {
-            r'今天|今日': 'today',
-            r'昨天|昨日': 'yesterday',
-            r'本周|这周': 'this_week',
-            r'上周|上星期': 'last_week',
-            r'本月|这个月': 'this_month',
-            r'上月|上个月': 'last_month',
-        }
-        
-        for pattern, value in time_patterns.items():
-            if re.search(pattern, text):
-                entities['timeRange'] = value
-                break
+        # Time range extraction (highest-priority expression present)
+        time_hits = [hit for hit in hits if hit[0] == 'time']
+        if time_hits:
+            entities['timeRange'] = min(time_hits)[2]
         
         # Numeric time range extraction
-        num_time_match = re.search(r'(?:最近|过去|最)?\s*(\d+)\s*(?:天|周|月)', text)
-        if num_time_match and 'timeRange' not in entities:
-            number = num_time_match.group(1)
-            unit = re.search(r'天|周|月', num_time_match.group(0)).group(0)
-            entities['timeRange'] = f"{number}{unit}"
+        if 'timeRange' not in entities and ('anchor', 'num_time') in hits:
+            num_time_match = NUM_TIME_PATTERN.search(text)
+            if num_time_match:
+                entities['timeRange'] = f"{num_time_match.group('number')}{num_time_match.group('unit')}"
         
         # Table name extraction
-        table_match = re.search(r'(?:查询|返回|显示|获取)?\s*(\w+)\s*表', text)
-        if table_match:
-            entities['table'] = table_match.group(1)
+        if ('anchor', 'table') in hits:
+            table_match = TABLE_PATTERN.search(text)
+            if table_match:
+                entities['table'] = table_match.group(1)
         
         # LIMIT extraction
-        limit_match = re.search(r'(?:前\s*)?(\d+)\s*(?:条|条数|行|rows)', text)
-        if limit_match:
-            entities['limit'] = int(limit_match.group(1))
+        if ('anchor', 'limit') in hits:
+            limit_match = LIMIT_PATTERN.search(text)
+            if limit_match:
+                entities['limit'] = int(limit_match.group(1))
         
         # Metric extraction
-        metric_mapping = {
-            '产量': 'output_qty',
-            '良品率': 'yield_rate',
-            '良率': 'yield_rate',
-            'oee': 'oee',
-            '稼动率': 'utilization_rate',
-            '效率': 'efficiency',
-            '停机': 'downtime'
-        }
-        
-        metrics = []
-        for keyword, metric in metric_mapping.items():
-            if keyword.lower() in text.lower():
-                metrics.append(metric)
-        
+        metrics = {hit[1] for hit in hits if hit[0] == 'metric'}
         if metrics:
-            entities['metrics'] = list(set(metrics))
+            entities['metrics'] = list(metrics)
         
         # Equipment extraction
-        equipment_match = re.search(r'(?:设备|设备号|设备ID)\s*[:：]?\s*(\w+)', text)
-        if equipment_match:
-            entities['equipment'] = equipment_match.group(1)
+        if ('anchor', 'equipment') in hits:
+            equipment_match = EQUIPMENT_PATTERN.search(text)
+            if equipment_match:
+                entities['equipment'] = equipment_match.group(1)
         
         # Product line extraction
-        product_line_match = re.search(r'(?:产品线|产线)\s*[:：]?\s*(\w+)', text)
-        if product_line_match:
-            entities['productLine'] = product_line_match.group(1)
+        if ('anchor', 'productLine') in hits:
+            product_line_match = PRODUCT_LINE_PATTERN.search(text)
+            if product_line_match:
+                entities['productLine'] = product_line_match.group(1)
         
         return entities
     
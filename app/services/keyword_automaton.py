@@ -0,0 +1,87 @@
+"""
+Aho-Corasick multi-pattern keyword automaton.
+
+Finds every occurrence of any number of keywords in a single left-to-right
+pass over the input, so matching cost is O(len(text) + matches) regardless
+of vocabulary size.
+"""
+
+from collections import deque
+from typing import Any, Dict, Hashable, Iterator, List, Set, Tuple
+
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton mapping keywords to arbitrary payloads"""
+
+    def __init__(self):
+        # Node 0 is the root; each node has goto transitions, a failure link and outputs
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[Tuple[str, Any]]] = [[]]
+        self._built = False
+
+    def add(self, keyword: str, payload: Hashable) -> None:
+        """
+        Register a keyword. The same keyword may carry several payloads.
+
+        Args:
+            keyword: Literal string to match (callers normalize case beforehand)
+            payload: Value reported when the keyword is found
+        """
+        if not keyword:
+            return
+        node = 0
+        for char in keyword:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+                self._goto[node][char] = next_node
+            node = next_node
+        self._output[node].append((keyword, payload))
+        self._built = False
+
+    def build(self) -> 'KeywordAutomaton':
+        """Compute failure links (BFS) and merge outputs along them"""
+        queue = deque()
+        for child in self._goto[0].values():
+            self._fail[child] = 0
+            queue.append(child)
+
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                if self._fail[child] == child:
+                    self._fail[child] = 0
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+        self._built = True
+        return self
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, str, Any]]:
+        """
+        Yield (start_index, keyword, payload) for every keyword occurrence.
+
+        Args:
+            text: Input text (normalized the same way as the keywords)
+        """
+        if not self._built:
+            self.build()
+        node = 0
+        for index, char in enumerate(text):
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            for keyword, payload in self._output[node]:
+                yield index - len(keyword) + 1, keyword, payload
+
+    def find_payloads(self, text: str) -> Set[Any]:
+        """Return the distinct payloads of all keywords present in text"""
+        return {payload for _, _, payload in self.iter_matches(text)}
@@ -0,0 +1,150 @@
+"""
+LLM 响应缓存
+按 provider、模型、温度和 prompt 的内容哈希缓存 LLM 输出，
+带 TTL 过期和 LRU 淘汰，schema 元数据变化时整体失效
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class LLMResponseCache:
+    """内存中的 LLM 响应缓存（线程安全）"""
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 3600, enabled: bool = True):
+        """
+        初始化缓存
+
+        Args:
+            max_entries: 最大缓存条目数，超出后淘汰最久未使用的条目
+            ttl_seconds: 条目存活时间（秒）
+            enabled: 是否启用缓存
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """
+        根据请求参数生成内容寻址的缓存键
+
+        Args:
+            parts: provider 名称、模型、温度、prompt 等
+
+        Returns:
+            SHA-256 十六进制摘要
+        """
+        raw = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key: str, record_stats: bool = True) -> Optional[str]:
+        """
+        读取缓存，未命中或已过期时返回 None
+
+        Args:
+            key: 缓存键
+            record_stats: 是否计入命中/未命中统计
+        """
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                if record_stats:
+                    self.misses += 1
+                return None
+
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                if record_stats:
+                    self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            if record_stats:
+                self.hits += 1
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        """写入缓存"""
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self) -> int:
+        """
+        清空所有缓存条目（例如 schema 元数据变化时）
+
+        Returns:
+            被清除的条目数
+        """
+        with self._lock:
+            count = len(self._entries)
+            self._entries.clear()
+            self.invalidations += 1
+        if count:
+            logger.info(f"LLM response cache invalidated: {count} entries removed")
+        return count
+
+    def clear(self) -> None:
+        """清空缓存并重置统计"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+            self.invalidations = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
+
+
+# 全局实例
+_llm_cache = None
+
+
+def get_llm_cache() -> LLMResponseCache:
+    """获取 LLM 响应缓存单例"""
+    global _llm_cache
+    if _llm_cache is None:
+        _llm_cache = LLMResponseCache(
+            max_entries=int(os.getenv('LLM_CACHE_MAX_ENTRIES', 1000)),
+            ttl_seconds=float(os.getenv('LLM_CACHE_TTL_SECONDS', 3600)),
+            enabled=os.getenv('LLM_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+        )
+    return _llm_cache
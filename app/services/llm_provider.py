@@ -2,10 +2,17 @@
 LLM 提供者抽象层
 支持多个 LLM 服务商（OpenAI、DeepSeek 等）
 """
+import asyncio
 import logging
 import os
-from typing import Optional
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
+from app.services.async_http import get_async_http_client
+from app.services.llm_cache import get_llm_cache
+from app.services.single_flight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
@@ -25,6 +32,96 @@ class LLMProvider:
             转换后的 SQL 语句
         """
         raise NotImplementedError
+    
+    def _cached_completion(self, kind: str, prompt: str, temperature: float,
+                           compute: Callable[[], Optional[str]]) -> Optional[str]:
+        """
+        经过响应缓存调用 LLM
+        
+        Args:
+            kind: 调用类型（generate / nl2sql），对应不同的系统提示词
+            prompt: 完整的 prompt 内容
+            temperature: 采样温度
+            compute: 未命中缓存时实际调用 LLM 的函数
+            
+        Returns:
+            LLM 输出；空结果不写入缓存
+        """
+        cache = get_llm_cache()
+        key = self._cache_key(kind, prompt, temperature)
+        
+        cached = cache.get(key)
+        if cached is not None:
+            logger.info(f"LLM cache hit ({kind})")
+            return cached
+        
+        def fetch() -> Optional[str]:
+            # 上一个相同请求可能刚刚完成并写入缓存
+            cached = cache.get(key, record_stats=False)
+            if cached is not None:
+                return cached
+            result = compute()
+            if result:
+                cache.set(key, result)
+            return result
+        
+        # 并发的相同请求只向上游发送一次
+        return get_llm_single_flight().do(key, fetch)
+    
+    async def agenerate(self, prompt: str) -> str:
+        """
+        generate 的异步版本
+        
+        未实现原生异步调用的提供者在线程池中执行同步方法。
+        """
+        return await asyncio.to_thread(self.generate, prompt)
+    
+    async def aconvert_nl_to_sql(self, natural_language: str, schema_info: str = "") -> Optional[str]:
+        """
+        convert_nl_to_sql 的异步版本
+        
+        未实现原生异步调用的提供者在线程池中执行同步方法。
+        """
+        return await asyncio.to_thread(self.convert_nl_to_sql, natural_language, schema_info)
+    
+    async def _acached_completion(self, kind: str, prompt: str, temperature: float,
+                                  compute: Callable[[], Awaitable[Optional[str]]]) -> Optional[str]:
+        """
+        _cached_completion 的异步版本，与同步调用共享响应缓存
+        
+        Args:
+            kind: 调用类型（generate / nl2sql）
+            prompt: 完整的 prompt 内容
+            temperature: 采样温度
+            compute: 未命中缓存时返回实际调用协程的函数
+            
+        Returns:
+            LLM 输出；空结果不写入缓存
+        """
+        cache = get_llm_cache()
+        key = self._cache_key(kind, prompt, temperature)
+        
+        cached = cache.get(key)
+        if cached is not None:
+            logger.info(f"LLM cache hit ({kind}, async)")
+            return cached
+        
+        async def fetch() -> Optional[str]:
+            cached = cache.get(key, record_stats=False)
+            if cached is not None:
+                return cached
+            result = await compute()
+            if result:
+                cache.set(key, result)
+            return result
+        
+        return await get_async_http_client().single_flight(key, fetch)
+    
+    def _cache_key(self, kind: str, prompt: str, temperature: float) -> str:
+        """生成响应缓存键"""
+        return get_llm_cache().make_key(
+            type(self).__name__, getattr(self, 'model', ''), temperature, kind, prompt
+        )
 
 
 class DeepSeekProvider(LLMProvider):
@@ -36,34 +133,26 @@ class DeepSeekProvider(LLMProvider):
         Returns:
             LLM 生成的字符串内容
         """
+        return self._cached_completion(
+            'generate', prompt, 0.2, lambda: self._generate_uncached(prompt)
+        )
+    
+    def _generate_uncached(self, prompt: str) -> str:
+        """直接调用 DeepSeek API 生成内容（不经过缓存）"""
         if not self.api_key:
             logger.error("DeepSeek API key not configured")
             raise RuntimeError("DeepSeek API key not configured")
         try:
-            headers = {
-                'Authorization': f'Bearer {self.api_key}',
-                'Content-Type': 'application/json'
-            }
-            payload = {
-                'model': self.model,
-                'messages': [
-                    {'role': 'system', 'content': 'You are an expert assistant for intent recognition.'},
-                    {'role': 'user', 'content': prompt}
-                ],
-                'temperature': 0.2,
-                'max_tokens': 1000
-            }
             logger.info(f"Calling DeepSeek API (generate) with model: {self.model}")
-            response = requests.post(
+            response = self._get_session().post(
                 f"{self.base_url}/chat/completions",
-                headers=headers,
-                json=payload,
-                timeout=30
+                headers=self._headers(),
+                json=self._generate_payload(prompt),
+                timeout=self.timeout
             )
             if response.status_code == 200:
-                result = response.json()
-                if 'choices' in result and len(result['choices']) > 0:
-                    content = result['choices'][0]['message']['content'].strip()
+                content = self._extract_content(response.json())
+                if content is not None:
                     logger.info(f"DeepSeek generate successful: {content[:80]}...")
                     return content
                 else:
@@ -81,6 +170,50 @@ class DeepSeekProvider(LLMProvider):
         except Exception as e:
             logger.error(f"Error calling DeepSeek API (generate): {str(e)}")
             raise
+    
+    async def agenerate(self, prompt: str) -> str:
+        """
+        generate 的原生异步版本，使用共享的异步 HTTP 客户端
+        
+        Args:
+            prompt: 输入的 prompt
+        Returns:
+            LLM 生成的字符串内容
+        """
+        return await self._acached_completion(
+            'generate', prompt, 0.2, lambda: self._agenerate_uncached(prompt)
+        )
+    
+    async def _agenerate_uncached(self, prompt: str) -> str:
+        """异步调用 DeepSeek API 生成内容（不经过缓存）"""
+        if not self.api_key:
+            logger.error("DeepSeek API key not configured")
+            raise RuntimeError("DeepSeek API key not configured")
+        try:
+            logger.info(f"Calling DeepSeek API (agenerate) with model: {self.model}")
+            response = await get_async_http_client().post_json(
+                f"{self.base_url}/chat/completions",
+                self._generate_payload(prompt),
+                headers=self._headers(),
+                timeout=self.timeout
+            )
+            if response.status_code == 200:
+                content = self._extract_content(response.json())
+                if content is not None:
+                    logger.info(f"DeepSeek agenerate successful: {content[:80]}...")
+                    return content
+                else:
+                    logger.error("Invalid response from DeepSeek API (agenerate)")
+                    raise RuntimeError("Invalid response from DeepSeek API (agenerate)")
+            else:
+                logger.error(f"DeepSeek API error (agenerate): {response.status_code} - {response.text}")
+                raise RuntimeError(f"DeepSeek API error (agenerate): {response.status_code}")
+        except httpx.TimeoutException:
+            logger.error("DeepSeek API request timeout (agenerate)")
+            raise RuntimeError("DeepSeek API request timeout (agenerate)")
+        except httpx.HTTPError as e:
+            logger.error(f"DeepSeek API request error (agenerate): {str(e)}")
+            raise RuntimeError(f"DeepSeek API request error (agenerate): {str(e)}")
 
     """DeepSeek LLM 提供者"""
     
@@ -89,10 +222,106 @@ class DeepSeekProvider(LLMProvider):
         self.api_key = os.getenv('DEEPSEEK_API_KEY', '')
         self.base_url = os.getenv('DEEPSEEK_BASE_URL', 'https://api.deepseek.com')
         self.model = os.getenv('DEEPSEEK_MODEL', 'deepseek-chat')
+        self.timeout = float(os.getenv('DEEPSEEK_TIMEOUT', 30))
+        self.pool_size = int(os.getenv('DEEPSEEK_POOL_SIZE', 10))
+        
+        # HTTP 会话按进程惰性创建，见 _get_session
+        self._session: Optional[requests.Session] = None
+        self._session_pid: Optional[int] = None
+        self._session_lock = threading.Lock()
         
         if not self.api_key:
             logger.warning("DeepSeek API key not configured")
     
+    def _get_session(self) -> requests.Session:
+        """
+        获取当前进程的 HTTP 会话（连接池 + keep-alive）
+        
+        会话在首次调用时创建；gunicorn fork 出的 worker 会检测到 pid 变化并
+        重新创建自己的会话，避免与父进程共享 socket。
+        
+        Returns:
+            复用连接的 requests.Session
+        """
+        pid = os.getpid()
+        if self._session is None or self._session_pid != pid:
+            with self._session_lock:
+                if self._session is None or self._session_pid != pid:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(
+                        pool_connections=self.pool_size,
+                        pool_maxsize=self.pool_size
+                    )
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    session.headers.update({'Connection': 'keep-alive'})
+                    self._session = session
+                    self._session_pid = pid
+                    logger.info(f"DeepSeek HTTP session created (pid={pid}, pool_size={self.pool_size})")
+        return self._session
+    
+    def close(self) -> None:
+        """关闭 HTTP 会话并释放连接池"""
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+            self._session_pid = None
+    
+    def _headers(self) -> Dict[str, str]:
+        """API 请求头"""
+        return {
+            'Authorization': f'Bearer {self.api_key}',
+            'Content-Type': 'application/json'
+        }
+    
+    def _generate_payload(self, prompt: str) -> Dict[str, Any]:
+        """构建通用生成（意图识别等）的请求体"""
+        return {
+            'model': self.model,
+            'messages': [
+                {'role': 'system', 'content': 'You are an expert assistant for intent recognition.'},
+                {'role': 'user', 'content': prompt}
+            ],
+            'temperature': 0.2,
+            'max_tokens': 1000
+        }
+    
+    def _nl2sql_payload(self, natural_language: str, schema_info: str = "") -> Dict[str, Any]:
+        """构建 NL 转 SQL 的请求体"""
+        # 构建系统提示词
+        system_prompt = """You are a SQL expert. Convert natural language queries to SQL.
+Rules:
+1. Only return the SQL query without any explanation
+2. The SQL should be valid and executable
+3. Use appropriate SQL syntax
+4. Optimize for readability"""
+        
+        if schema_info:
+            system_prompt += f"\n\nDatabase Schema:\n{schema_info}"
+        
+        return {
+            'model': self.model,
+            'messages': [
+                {
+                    'role': 'system',
+                    'content': system_prompt
+                },
+                {
+                    'role': 'user',
+                    'content': f"Convert to SQL: {natural_language}"
+                }
+            ],
+            'temperature': 0.3,
+            'max_tokens': 1000
+        }
+    
+    @staticmethod
+    def _extract_content(result: Dict[str, Any]) -> Optional[str]:
+        """从 chat/completions 响应中取出文本内容"""
+        if 'choices' in result and len(result['choices']) > 0:
+            return result['choices'][0]['message']['content'].strip()
+        return None
+    
     def convert_nl_to_sql(self, natural_language: str, schema_info: str = "") -> Optional[str]:
         """
         使用 DeepSeek API 将自然语言转换为 SQL
@@ -104,57 +333,30 @@ class DeepSeekProvider(LLMProvider):
         Returns:
             转换后的 SQL 语句
         """
+        return self._cached_completion(
+            'nl2sql', f"{schema_info}\n{natural_language}", 0.3,
+            lambda: self._convert_nl_to_sql_uncached(natural_language, schema_info)
+        )
+    
+    def _convert_nl_to_sql_uncached(self, natural_language: str, schema_info: str = "") -> Optional[str]:
+        """直接调用 DeepSeek API 转换 SQL（不经过缓存）"""
         if not self.api_key:
             logger.error("DeepSeek API key not configured")
             return None
         
         try:
-            # 构建系统提示词
-            system_prompt = """You are a SQL expert. Convert natural language queries to SQL.
-Rules:
-1. Only return the SQL query without any explanation
-2. The SQL should be valid and executable
-3. Use appropriate SQL syntax
-4. Optimize for readability"""
-            
-            if schema_info:
-                system_prompt += f"\n\nDatabase Schema:\n{schema_info}"
-            
-            # 调用 DeepSeek API
-            headers = {
-                'Authorization': f'Bearer {self.api_key}',
-                'Content-Type': 'application/json'
-            }
-            
-            payload = {
-                'model': self.model,
-                'messages': [
-                    {
-                        'role': 'system',
-                        'content': system_prompt
-                    },
-                    {
-                        'role': 'user',
-                        'content': f"Convert to SQL: {natural_language}"
-                    }
-                ],
-                'temperature': 0.3,
-                'max_tokens': 1000
-            }
-            
             logger.info(f"Calling DeepSeek API with model: {self.model}")
             
-            response = requests.post(
+            response = self._get_session().post(
                 f"{self.base_url}/chat/completions",
-                headers=headers,
-                json=payload,
-                timeout=30
+                headers=self._headers(),
+                json=self._nl2sql_payload(natural_language, schema_info),
+                timeout=self.timeout
             )
             
             if response.status_code == 200:
-                result = response.json()
-                if 'choices' in result and len(result['choices']) > 0:
-                    sql = result['choices'][0]['message']['content'].strip()
+                sql = self._extract_content(response.json())
+                if sql is not None:
                     logger.info(f"DeepSeek conversion successful: {sql}")
                     return sql
                 else:
@@ -173,6 +375,55 @@ Rules:
         except Exception as e:
             logger.error(f"Error calling DeepSeek API: {str(e)}")
             return None
+    
+    async def aconvert_nl_to_sql(self, natural_language: str, schema_info: str = "") -> Optional[str]:
+        """
+        convert_nl_to_sql 的原生异步版本，使用共享的异步 HTTP 客户端
+        
+        Args:
+            natural_language: 用户的自然语言查询
+            schema_info: 数据库 schema 信息
+            
+        Returns:
+            转换后的 SQL 语句
+        """
+        return await self._acached_completion(
+            'nl2sql', f"{schema_info}\n{natural_language}", 0.3,
+            lambda: self._aconvert_nl_to_sql_uncached(natural_language, schema_info)
+        )
+    
+    async def _aconvert_nl_to_sql_uncached(self, natural_language: str, schema_info: str = "") -> Optional[str]:
+        """异步调用 DeepSeek API 转换 SQL（不经过缓存）"""
+        if not self.api_key:
+            logger.error("DeepSeek API key not configured")
+            return None
+        
+        try:
+            logger.info(f"Calling DeepSeek API (async) with model: {self.model}")
+            
+            response = await get_async_http_client().post_json(
+                f"{self.base_url}/chat/completions",
+                self._nl2sql_payload(natural_language, schema_info),
+                headers=self._headers(),
+                timeout=self.timeout
+            )
+            
+            if response.status_code == 200:
+                sql = self._extract_content(response.json())
+                if sql is not None:
+                    logger.info(f"DeepSeek async conversion successful: {sql}")
+                    return sql
+                logger.error("Invalid response from DeepSeek API (async)")
+                return None
+            logger.error(f"DeepSeek API error (async): {response.status_code} - {response.text}")
+            return None
+        
+        except httpx.TimeoutException:
+            logger.error("DeepSeek API request timeout (async)")
+            return None
+        except Exception as e:
+            logger.error(f"Error calling DeepSeek API (async): {str(e)}")
+            return None
 
 
 class OpenAIProvider(LLMProvider):
@@ -182,10 +433,58 @@ class OpenAIProvider(LLMProvider):
         """初始化 OpenAI 提供者"""
         self.api_key = os.getenv('OPENAI_API_KEY', '')
         self.model = os.getenv('OPENAI_MODEL', 'gpt-3.5-turbo')
+        self.timeout = float(os.getenv('OPENAI_TIMEOUT', 30))
+        self.max_connections = int(os.getenv('OPENAI_MAX_CONNECTIONS', 10))
+        self.max_keepalive_connections = int(os.getenv('OPENAI_MAX_KEEPALIVE_CONNECTIONS', 5))
+        
+        # OpenAI 客户端按进程惰性创建，见 _get_client
+        self._client = None
+        self._client_pid: Optional[int] = None
+        self._client_lock = threading.Lock()
         
         if not self.api_key:
             logger.warning("OpenAI API key not configured")
     
+    def _get_client(self):
+        """
+        获取当前进程的 OpenAI 客户端
+        
+        客户端内部的 httpx 连接池在多次调用间复用；gunicorn fork 出的 worker
+        会检测到 pid 变化并创建自己的客户端。
+        
+        Returns:
+            openai.OpenAI 实例
+        """
+        pid = os.getpid()
+        if self._client is None or self._client_pid != pid:
+            with self._client_lock:
+                if self._client is None or self._client_pid != pid:
+                    import httpx
+                    from openai import OpenAI
+                    
+                    http_client = httpx.Client(
+                        limits=httpx.Limits(
+                            max_connections=self.max_connections,
+                            max_keepalive_connections=self.max_keepalive_connections
+                        ),
+                        timeout=self.timeout
+                    )
+                    self._client = OpenAI(
+                        api_key=self.api_key,
+                        timeout=self.timeout,
+                        http_client=http_client
+                    )
+                    self._client_pid = pid
+                    logger.info(f"OpenAI client created (pid={pid}, max_connections={self.max_connections})")
+        return self._client
+    
+    def close(self) -> None:
+        """关闭 OpenAI 客户端并释放连接池"""
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+            self._client_pid = None
+    
     def convert_nl_to_sql(self, natural_language: str, schema_info: str = "") -> Optional[str]:
         """
         使用 OpenAI API 将自然语言转换为 SQL
@@ -197,14 +496,19 @@ class OpenAIProvider(LLMProvider):
         Returns:
             转换后的 SQL 语句
         """
+        return self._cached_completion(
+            'nl2sql', f"{schema_info}\n{natural_language}", 0.3,
+            lambda: self._convert_nl_to_sql_uncached(natural_language, schema_info)
+        )
+    
+    def _convert_nl_to_sql_uncached(self, natural_language: str, schema_info: str = "") -> Optional[str]:
+        """直接调用 OpenAI API 转换 SQL（不经过缓存）"""
         if not self.api_key:
             logger.error("OpenAI API key not configured")
             return None
         
         try:
-            from openai import OpenAI
-            
-            client = OpenAI(api_key=self.api_key)
+            client = self._get_client()
             
             system_prompt = """You are a SQL expert. Convert natural language queries to SQL.
 Rules:
@@ -235,6 +539,18 @@ Rules:
             return None
 
 
+# 全局实例
+_llm_single_flight = None
+
+
+def get_llm_single_flight() -> SingleFlight:
+    """获取 LLM 调用的 single-flight 合并器单例"""
+    global _llm_single_flight
+    if _llm_single_flight is None:
+        _llm_single_flight = SingleFlight()
+    return _llm_single_flight
+
+
 def get_llm_provider() -> LLMProvider:
     """
     根据配置获取 LLM 提供者
@@ -2,130 +2,385 @@
 增强的 NL2SQL 服务 - 集成 Schema Annotation 元数据
 使用已批准的表名和列名改进查询生成质量
 """
-from typing import Optional, Dict, Any, List
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Any, List, Tuple
 import logging
+import hashlib
+import os
+import random
+import threading
 import requests
 import json
 from app.services.llm_provider import get_llm_provider
+from app.services.llm_cache import get_llm_cache
+from app.services.example_store import get_example_store
+from app.services.schema_name_index import SchemaNameIndex, load_synonyms
+from app.services.schema_retriever import SchemaRetriever, estimate_tokens, get_schema_retrieval_config
 
 logger = logging.getLogger(__name__)
 
+SCHEMA_PROMPT_HEADER = "【数据库 Schema 信息】\n"
+
+
+@dataclass
+class CompiledTable:
+    """预编译的单表 schema 片段"""
+    header: str                     # 表名、中文名、描述等
+    column_lines: Dict[str, str]    # 列名 -> 该列的渲染文本
+    relation_lines: str             # 外键关系
+    fragment: str                   # 含全部列的完整片段
+    tokens: int                     # 完整片段的估算 token 数
+
+
+@dataclass
+class SchemaPromptCache:
+    """按元数据版本预编译的 schema 提示词片段
+    
+    每个版本只渲染一次表片段；整表提示词按 token 预算缓存，
+    只包含部分列的片段由预渲染的列文本直接拼接
+    """
+    version: Optional[str]
+    tables: Dict[str, CompiledTable] = field(default_factory=dict)
+    _full_prompts: Dict[int, str] = field(default_factory=dict)
+    
+    @classmethod
+    def compile(cls, version: Optional[str], metadata: Dict[str, Any]) -> 'SchemaPromptCache':
+        """渲染元数据中所有表的片段"""
+        relation_lines: Dict[str, List[str]] = {}
+        for rel in metadata.get('relations', []) or []:
+            relation_lines.setdefault(rel.get('source_table'), []).append(
+                f"  关联: {rel.get('source_column')} -> "
+                f"{rel.get('target_table')}.{rel.get('target_column')}"
+            )
+        
+        all_columns = metadata.get('columns', {}) or {}
+        compiled = {}
+        for table_name, table_info in (metadata.get('tables', {}) or {}).items():
+            lines = [f"表名: {table_name}"]
+            table_info = table_info or {}
+            if table_info.get('name_cn'):
+                lines.append(f"  中文名: {table_info['name_cn']}")
+            if table_info.get('description_cn'):
+                lines.append(f"  描述: {table_info['description_cn']}")
+            if table_info.get('description_en'):
+                lines.append(f"  Description: {table_info['description_en']}")
+            if table_info.get('business_meaning'):
+                lines.append(f"  业务含义: {table_info['business_meaning']}")
+            if table_info.get('use_case'):
+                lines.append(f"  使用场景: {table_info['use_case']}")
+            header = "\n".join(lines) + "\n"
+            
+            column_lines = {
+                col_name: cls._render_column(col_name, col or {})
+                for col_name, col in (all_columns.get(table_name, {}) or {}).items()
+            }
+            relations = "".join(line + "\n" for line in relation_lines.get(table_name, []))
+            fragment = cls._join(header, column_lines.values(), relations)
+            compiled[table_name] = CompiledTable(
+                header, column_lines, relations, fragment, estimate_tokens(fragment)
+            )
+        
+        return cls(version=version, tables=compiled)
+    
+    @staticmethod
+    def _render_column(col_name: str, col: Dict[str, Any]) -> str:
+        col_name_cn = col.get('name_cn')
+        data_type = col.get('data_type') or ''
+        if col_name_cn:
+            text = f"    - {col_name} ({col_name_cn}): {data_type}\n"
+        else:
+            text = f"    - {col_name}: {data_type}\n"
+        if col.get('description_cn'):
+            text += f"      描述: {col['description_cn']}\n"
+        if col.get('example'):
+            text += f"      示例: {col['example']}\n"
+        return text
+    
+    @staticmethod
+    def _join(header: str, column_lines, relations: str) -> str:
+        columns = "".join(column_lines)
+        return header + ("  列:\n" + columns if columns else "") + relations
+    
+    def fragment(self, table_name: str, column_names: Optional[List[str]] = None) -> Tuple[str, int]:
+        """获取表片段及其 token 数（column_names 为 None 时返回完整片段）"""
+        table = self.tables[table_name]
+        if column_names is None or len(column_names) == len(table.column_lines):
+            return table.fragment, table.tokens
+        text = self._join(
+            table.header,
+            (table.column_lines[c] for c in column_names if c in table.column_lines),
+            table.relation_lines
+        )
+        return text, estimate_tokens(text)
+    
+    def assemble(self, selected: List[Tuple[str, Optional[List[str]]]], budget: int) -> str:
+        """按顺序拼接表片段，超出 token 预算的表跳过（至少保留一张）"""
+        used = estimate_tokens(SCHEMA_PROMPT_HEADER)
+        fragments = []
+        for table_name, column_names in selected:
+            if table_name not in self.tables:
+                continue
+            text, cost = self.fragment(table_name, column_names)
+            if fragments and budget > 0 and used + cost > budget:
+                continue
+            fragments.append(text)
+            used += cost
+        
+        if len(fragments) < len(self.tables):
+            logger.info(f"Schema prompt pruned to {len(fragments)}/{len(self.tables)} tables (~{used} tokens)")
+        return SCHEMA_PROMPT_HEADER + "\n".join(fragments)
+    
+    def full_prompt(self, budget: int) -> str:
+        """包含全部表的提示词（按预算截断），同一版本内按预算缓存"""
+        prompt = self._full_prompts.get(budget)
+        if prompt is None:
+            prompt = self.assemble([(name, None) for name in self.tables], budget)
+            self._full_prompts[budget] = prompt
+        return prompt
+
 
 class EnhancedNL2SQLConverter:
     """集成 Schema Annotation 的 NL2SQL 转换器"""
     
-    def __init__(self, schema_api_url: str = "http://localhost:8000/api/schema"):
+    def __init__(self, schema_api_url: Optional[str] = None):
         """初始化转换器
         
+        构造时不加载元数据：由 start_background_refresh() 在后台线程加载，
+        请求到达时若尚未加载完成则在进程内同步读取一次（read-through）
+        
         Args:
-            schema_api_url: Schema Annotation API 地址
+            schema_api_url: Schema Annotation API 地址（可选）；
+                不提供时直接在进程内调用 schema_annotator，不经过 HTTP
         """
-        self.schema_api_url = schema_api_url
+        self.schema_api_url = schema_api_url or os.getenv('SCHEMA_METADATA_API_URL') or None
         self.schema_info = {}
         self.annotation_metadata = {}
+        self.retrieval_config = get_schema_retrieval_config()
+        self.few_shot_k = int(os.getenv('EXAMPLE_FEW_SHOT_K', 3))
+        self.few_shot_min_score = float(os.getenv('EXAMPLE_FEW_SHOT_MIN_SCORE', 0.3))
+        self.metadata_version: Optional[str] = None
+        self._schema_retriever = None
+        self._prompt_cache = SchemaPromptCache.compile(None, {})
+        self._synonyms = load_synonyms(os.getenv('SCHEMA_SYNONYMS_FILE'))
+        self._name_index = SchemaNameIndex({}, self._synonyms)
         self.llm_provider = get_llm_provider()
-        self._load_annotation_metadata()
+        
+        self.refresh_interval = float(os.getenv('SCHEMA_METADATA_REFRESH_SECONDS', 300))
+        self.refresh_jitter = float(os.getenv('SCHEMA_METADATA_REFRESH_JITTER', 0.1))
+        self._load_lock = threading.RLock()
+        self._loaded = threading.Event()
+        self._stop_refresh = threading.Event()
+        self._refresh_thread: Optional[threading.Thread] = None
+        self._refresh_pid: Optional[int] = None
+        self._refresh_start_lock = threading.Lock()
+        self._metadata_etag: Optional[str] = None
     
-    def _load_annotation_metadata(self) -> None:
-        """从 Schema Annotation API 加载元数据"""
-        try:
+    def _fetch_metadata(self, full: bool = False) -> Optional[Dict[str, Any]]:
+        """获取已批准的元数据；失败或未变化（304）时返回 None
+        
+        Args:
+            full: 是否强制全量同步（默认按 updated_at 水位线增量同步）
+        """
+        if self.schema_api_url:
+            headers = {}
+            if self._metadata_etag and not full:
+                headers['If-None-Match'] = f'"{self._metadata_etag}"'
             response = requests.get(
                 f"{self.schema_api_url}/metadata",
+                params={'full': 'true'} if full else None,
+                headers=headers,
                 timeout=5
             )
-            if response.status_code == 200:
-                data = response.json()
-                self.annotation_metadata = data.get('metadata', {})
-                logger.info(f"✅ Loaded schema annotation metadata")
-                logger.info(f"   Tables: {list(self.annotation_metadata.get('tables', {}).keys())}")
-                logger.info(f"   Columns: {len(self.annotation_metadata.get('columns', {}))}")
-            else:
+            if response.status_code == 304:
+                return None
+            if response.status_code != 200:
                 logger.warning(f"Failed to load annotation metadata: {response.status_code}")
-        except requests.exceptions.ConnectionError:
-            logger.warning("Schema Annotation API not available, using basic schema")
-        except Exception as e:
-            logger.warning(f"Error loading annotation metadata: {e}")
+                return None
+            self._metadata_etag = (response.headers.get('ETag') or '').strip('"') or None
+            return response.json().get('metadata', {})
+        
+        # 进程内直接读取，避免回环 HTTP 调用；延迟导入以免模块加载时初始化 Supabase
+        from app.services.schema_annotator import schema_annotator
+        return schema_annotator.get_approved_schema_metadata(incremental=not full) or None
+    
+    def _load_annotation_metadata(self, full: bool = False) -> None:
+        """加载 Schema Annotation 元数据"""
+        with self._load_lock:
+            try:
+                metadata = self._fetch_metadata(full)
+                if metadata is not None:
+                    self._set_metadata(metadata)
+                    logger.info(f"✅ Loaded schema annotation metadata (version {self.metadata_version[:12]})")
+                    logger.info(f"   Tables: {len(self.annotation_metadata.get('tables', {}))}")
+            except requests.exceptions.ConnectionError:
+                logger.warning("Schema Annotation API not available, using basic schema")
+            except Exception as e:
+                logger.warning(f"Error loading annotation metadata: {e}")
+            finally:
+                # 无论成功与否都标记已尝试，失败时由后台刷新重试，不阻塞后续请求
+                self._loaded.set()
+    
+    def _ensure_metadata(self) -> None:
+        """read-through：元数据尚未加载时在当前线程同步加载一次"""
+        if self._refresh_pid is not None and self._refresh_pid != os.getpid():
+            # fork 后后台线程不会被继承，在子进程中重新启动
+            self.start_background_refresh()
+        if not self._loaded.is_set():
+            with self._load_lock:
+                if not self._loaded.is_set():
+                    self._load_annotation_metadata()
     
-    def refresh_metadata(self) -> None:
-        """刷新元数据（手动调用）"""
+    def _next_refresh_delay(self) -> float:
+        """带随机抖动的刷新间隔，避免多个 worker 同时刷新"""
+        jitter = self.refresh_interval * self.refresh_jitter
+        return max(1.0, self.refresh_interval + random.uniform(-jitter, jitter))
+    
+    def _refresh_loop(self) -> None:
+        """后台线程：立即加载一次，之后按带抖动的间隔周期刷新"""
         self._load_annotation_metadata()
+        while not self._stop_refresh.wait(self._next_refresh_delay()):
+            self._load_annotation_metadata()
+    
+    def start_background_refresh(self) -> None:
+        """启动后台元数据加载/刷新线程（每个进程一个）"""
+        if self._refresh_alive():
+            return
+        with self._refresh_start_lock:
+            # fork 后并发的首批请求都会走到这里，加锁后再检查一次，保证只启动一个线程
+            if self._refresh_alive():
+                return
+            self._refresh_pid = os.getpid()
+            self._stop_refresh.clear()
+            self._refresh_thread = threading.Thread(
+                target=self._refresh_loop, name='schema-metadata-refresh', daemon=True
+            )
+            self._refresh_thread.start()
+    
+    def _refresh_alive(self) -> bool:
+        return (self._refresh_pid == os.getpid() and self._refresh_thread is not None
+                and self._refresh_thread.is_alive())
+    
+    def stop_background_refresh(self) -> None:
+        """停止后台刷新线程"""
+        self._stop_refresh.set()
+    
+    def _set_metadata(self, metadata: Dict[str, Any]) -> bool:
+        """设置元数据；内容哈希（版本）变化时重建预编译的 schema 片段
+        
+        Args:
+            metadata: 已批准的 schema 元数据
+            
+        Returns:
+            元数据版本是否发生变化
+        """
+        self._loaded.set()
+        version = self._metadata_hash(metadata)
+        if version == self.metadata_version:
+            # 内容未变（可能只是 last_updated 不同），保留已编译的片段
+            self.annotation_metadata = metadata
+            return False
+        
+        if self.metadata_version is not None:
+            # schema 变化后缓存的 LLM 输出可能引用旧的表/列
+            get_llm_cache().invalidate()
+        self.annotation_metadata = metadata
+        self.metadata_version = version
+        self._schema_retriever = None
+        self._prompt_cache = SchemaPromptCache.compile(version, metadata)
+        self._name_index = SchemaNameIndex(metadata, self._synonyms)
+        return True
+    
+    @staticmethod
+    def _metadata_hash(metadata: Dict[str, Any]) -> str:
+        """计算元数据内容哈希（忽略 last_updated 时间戳）"""
+        content = {k: v for k, v in (metadata or {}).items() if k != 'last_updated'}
+        raw = json.dumps(content, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+    
+    def refresh_metadata(self, full: bool = False) -> None:
+        """刷新元数据（手动调用）
+        
+        Args:
+            full: 为 True 时强制全量同步，否则只合并上次同步后更新的标注
+        """
+        self._load_annotation_metadata(full)
     
     def set_schema(self, schema: Dict[str, Any]) -> None:
         """设置基础数据库 schema 信息"""
         self.schema_info = schema
         logger.info(f"Schema set with tables: {list(schema.keys())}")
     
-    def _build_enhanced_schema_prompt(self) -> str:
-        """构建增强的 schema 提示词，包含中文名称和业务含义"""
-        schema_lines = ["【数据库 Schema 信息】\n"]
+    def _get_schema_retriever(self) -> SchemaRetriever:
+        """获取（必要时构建）当前元数据的 schema 检索器"""
+        if self._schema_retriever is None:
+            self._schema_retriever = SchemaRetriever(
+                self.annotation_metadata,
+                top_k_tables=self.retrieval_config['top_k_tables'],
+                top_k_columns=self.retrieval_config['top_k_columns']
+            )
+        return self._schema_retriever
+    
+    def _build_enhanced_schema_prompt(self, natural_language: Optional[str] = None) -> str:
+        """构建增强的 schema 提示词，包含中文名称和业务含义
         
-        tables = self.annotation_metadata.get('tables', {})
-        columns = self.annotation_metadata.get('columns', {})
+        提供问题时只包含检索到的相关表和列（含外键关联表），
+        并按 token 预算截断；检索无命中时退回到按顺序填充全部表。
+        表片段在元数据加载时预编译，这里只做拼接
         
-        # 添加表信息
-        for table_name, table_info in tables.items():
-            schema_lines.append(f"表名: {table_name}")
-            
-            # 添加中文名称
-            if 'name_cn' in table_info:
-                schema_lines.append(f"  中文名: {table_info['name_cn']}")
-            
-            # 添加描述
-            if 'description_cn' in table_info:
-                schema_lines.append(f"  描述: {table_info['description_cn']}")
-            if 'description_en' in table_info:
-                schema_lines.append(f"  Description: {table_info['description_en']}")
-            
-            # 添加业务含义
-            if 'business_meaning' in table_info:
-                schema_lines.append(f"  业务含义: {table_info['business_meaning']}")
-            
-            # 添加使用场景
-            if 'use_case' in table_info:
-                schema_lines.append(f"  使用场景: {table_info['use_case']}")
-            
-            # 添加该表的列信息
-            table_columns = [col for col in columns.values() 
-                           if col.get('table_name') == table_name]
-            if table_columns:
-                schema_lines.append("  列:")
-                for col in table_columns:
-                    col_name = col.get('column_name', '')
-                    col_name_cn = col.get('column_name_cn', '')
-                    data_type = col.get('data_type', '')
-                    desc = col.get('description_cn', '')
-                    example = col.get('example_value', '')
-                    
-                    if col_name_cn:
-                        schema_lines.append(f"    - {col_name} ({col_name_cn}): {data_type}")
-                    else:
-                        schema_lines.append(f"    - {col_name}: {data_type}")
-                    
-                    if desc:
-                        schema_lines.append(f"      描述: {desc}")
-                    if example:
-                        schema_lines.append(f"      示例: {example}")
-            
-            schema_lines.append("")
+        Args:
+            natural_language: 用户问题（可选）
+        """
+        self._ensure_metadata()
+        cache = self._prompt_cache
         
         # 如果没有元数据，使用基础 schema
-        if not tables and self.schema_info:
-            schema_lines.append("【基础 Schema 信息】\n")
-            for table_name, columns_info in self.schema_info.items():
-                schema_lines.append(f"表: {table_name}")
-                for col_name, col_type in columns_info.items():
-                    schema_lines.append(f"  - {col_name} ({col_type})")
-                schema_lines.append("")
+        if not cache.tables:
+            schema_lines = [SCHEMA_PROMPT_HEADER]
+            if self.schema_info:
+                schema_lines.append("【基础 Schema 信息】\n")
+                for table_name, columns_info in self.schema_info.items():
+                    schema_lines.append(f"表: {table_name}")
+                    for col_name, col_type in columns_info.items():
+                        schema_lines.append(f"  - {col_name} ({col_type})")
+                    schema_lines.append("")
+            return "\n".join(schema_lines)
+        
+        budget = self.retrieval_config['token_budget']
+        if natural_language and self.retrieval_config['enabled']:
+            selection = self._get_schema_retriever().retrieve(natural_language)
+            if selection.tables:
+                return cache.assemble(
+                    [(name, selection.columns.get(name)) for name in selection.tables], budget
+                )
         
-        return "\n".join(schema_lines)
+        return cache.full_prompt(budget)
+    
+    def _build_few_shot_prompt(self, question: str) -> str:
+        """与问题最相近的已执行 / 已批准示例（无相近示例时为空字符串）"""
+        if self.few_shot_k <= 0:
+            return ""
+        matches = get_example_store().search(question, k=self.few_shot_k, min_score=self.few_shot_min_score)
+        if not matches:
+            return ""
+        lines = ["【参考示例】"]
+        for example, _ in matches:
+            lines.append(f"问题: {example.question}")
+            lines.append(f"SQL: {example.sql}")
+        return "\n".join(lines) + "\n\n"
     
-    def _build_enhanced_prompt(self, natural_language: str) -> str:
-        """构建增强的 LLM 提示词"""
-        schema_prompt = self._build_enhanced_schema_prompt()
+    def _build_enhanced_prompt(self, natural_language: str, question: Optional[str] = None) -> str:
+        """构建增强的 LLM 提示词
+        
+        Args:
+            natural_language: 交给 LLM 转换的查询
+            question: 用户原始问题，用于检索 few-shot 示例（默认与 natural_language 相同）
+        """
+        schema_prompt = self._build_enhanced_schema_prompt(natural_language)
+        few_shot_prompt = self._build_few_shot_prompt(question or natural_language)
         
         prompt = f"""{schema_prompt}
 
-【用户查询】
+{few_shot_prompt}【用户查询】
 {natural_language}
 
 【转换规则】
@@ -142,18 +397,31 @@ class EnhancedNL2SQLConverter:
         
         return prompt
     
-    def convert(self, natural_language: str) -> Optional[str]:
+    def find_reusable_sql(self, question: str) -> Optional[str]:
+        """问题与已有示例完全相同或几乎相同时返回其 SQL（无需调用 LLM）"""
+        example = get_example_store().find_reusable(question)
+        if example is None:
+            return None
+        logger.info(f"♻️  Reusing SQL of example {example.id} for: {question[:50]}")
+        return example.sql
+    
+    def convert(self, natural_language: str, question: Optional[str] = None) -> Optional[str]:
         """将自然语言转换为 SQL
         
         Args:
             natural_language: 用户输入的自然语言查询
+            question: 用户原始问题，用于示例复用和 few-shot 检索（默认与 natural_language 相同）
             
         Returns:
             转换后的 SQL 语句
         """
         try:
+            reused = self.find_reusable_sql(question or natural_language)
+            if reused:
+                return reused
+            
             # 使用增强的 schema 构建提示词
-            enhanced_prompt = self._build_enhanced_prompt(natural_language)
+            enhanced_prompt = self._build_enhanced_prompt(natural_language, question)
             
             # 调用 LLM 直接转换（使用完整的 prompt）
             sql = self.llm_provider.generate(enhanced_prompt) if hasattr(
@@ -171,6 +439,39 @@ class EnhancedNL2SQLConverter:
             logger.error(f"Error converting NL to SQL: {str(e)}")
             return self._fallback_parse_nl_to_sql(natural_language)
     
+    async def aconvert(self, natural_language: str, question: Optional[str] = None) -> Optional[str]:
+        """convert 的异步版本，LLM 调用不阻塞事件循环，可与其他阶段并发
+        
+        Args:
+            natural_language: 用户输入的自然语言查询
+            question: 用户原始问题，用于示例复用和 few-shot 检索（默认与 natural_language 相同）
+            
+        Returns:
+            转换后的 SQL 语句
+        """
+        try:
+            reused = self.find_reusable_sql(question or natural_language)
+            if reused:
+                return reused
+            
+            enhanced_prompt = self._build_enhanced_prompt(natural_language, question)
+            
+            if hasattr(self.llm_provider, 'generate'):
+                sql = await self.llm_provider.agenerate(enhanced_prompt)
+            else:
+                sql = await self.llm_provider.aconvert_nl_to_sql(enhanced_prompt)
+            
+            if sql:
+                logger.info(f"✅ Converted NL to SQL: {sql[:100]}...")
+                return sql.strip()
+            else:
+                logger.warning("LLM provider returned None")
+                return self._fallback_parse_nl_to_sql(natural_language)
+                
+        except Exception as e:
+            logger.error(f"Error converting NL to SQL: {str(e)}")
+            return self._fallback_parse_nl_to_sql(natural_language)
+    
     def _call_llm_with_prompt(self, prompt: str) -> Optional[str]:
         """直接调用 LLM 的通用方法"""
         try:
@@ -212,7 +513,7 @@ class EnhancedNL2SQLConverter:
             return "SELECT * FROM users"
     
     def get_table_name_from_cn(self, cn_name: str) -> Optional[str]:
-        """从中文名称获取表名
+        """从中文名称获取表名（支持同义词，忽略全半角、大小写和空白差异）
         
         Args:
             cn_name: 中文表名
@@ -220,14 +521,11 @@ class EnhancedNL2SQLConverter:
         Returns:
             英文表名，或 None 如果未找到
         """
-        tables = self.annotation_metadata.get('tables', {})
-        for table_name, table_info in tables.items():
-            if table_info.get('name_cn') == cn_name:
-                return table_name
-        return None
+        self._ensure_metadata()
+        return self._name_index.table(cn_name)
     
     def get_column_name_from_cn(self, table_name: str, cn_col_name: str) -> Optional[str]:
-        """从中文列名获取列名
+        """从中文列名获取列名（支持同义词，忽略全半角、大小写和空白差异）
         
         Args:
             table_name: 英文表名
@@ -236,25 +534,18 @@ class EnhancedNL2SQLConverter:
         Returns:
             英文列名，或 None 如果未找到
         """
-        columns = self.annotation_metadata.get('columns', {})
-        for col in columns.values():
-            if (col.get('table_name') == table_name and 
-                col.get('column_name_cn') == cn_col_name):
-                return col.get('column_name')
-        return None
+        self._ensure_metadata()
+        return self._name_index.column(table_name, cn_col_name)
+    
+    def find_columns_by_cn(self, cn_col_name: str) -> List[Tuple[str, str]]:
+        """不指定表时按中文列名查找所有匹配的 (表名, 列名)"""
+        self._ensure_metadata()
+        return self._name_index.find_columns(cn_col_name)
     
     def get_metadata_summary(self) -> Dict[str, Any]:
-        """获取当前元数据摘要"""
-        return {
-            'tables': len(self.annotation_metadata.get('tables', {})),
-            'columns': len(self.annotation_metadata.get('columns', {})),
-            'table_names': list(self.annotation_metadata.get('tables', {}).keys()),
-            'column_count_by_table': {
-                table: len([c for c in self.annotation_metadata.get('columns', {}).values()
-                           if c.get('table_name') == table])
-                for table in self.annotation_metadata.get('tables', {}).keys()
-            }
-        }
+        """获取当前元数据摘要（加载元数据时预先计算）"""
+        self._ensure_metadata()
+        return dict(self._name_index.summary, version=self.metadata_version)
 
 
 # 全局实例
@@ -266,4 +557,6 @@ def get_enhanced_nl2sql_converter() -> EnhancedNL2SQLConverter:
     global _enhanced_converter
     if _enhanced_converter is None:
         _enhanced_converter = EnhancedNL2SQLConverter()
+        if os.getenv('SCHEMA_METADATA_BACKGROUND', 'true').lower() in ('1', 'true', 'yes'):
+            _enhanced_converter.start_background_refresh()
     return _enhanced_converter
@@ -0,0 +1,322 @@
+"""
+PostgreSQL 只读查询引擎
+通过线程安全的连接池直接在数据库中原样执行生成的 SELECT，
+JOIN / GROUP BY / 聚合都由 PostgreSQL 完成
+"""
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+try:
+    import psycopg2
+    import psycopg2.extras
+    import psycopg2.pool
+    PSYCOPG2_AVAILABLE = True
+except ImportError:
+    PSYCOPG2_AVAILABLE = False
+    logger.warning("⚠️  psycopg2 not installed. Run: pip install psycopg2-binary")
+
+_READ_STATEMENT = re.compile(r'^\s*(SELECT|WITH)\b', re.IGNORECASE)
+
+
+class PostgreSQLReadEngine:
+    """基于连接池的只读 SQL 执行引擎"""
+
+    def __init__(self, dsn: Optional[str] = None, connect_kwargs: Optional[Dict[str, Any]] = None,
+                 min_size: int = 1, max_size: int = 10, statement_timeout_ms: int = 15000,
+                 pool_timeout: float = 10.0, health_check_interval: float = 30.0,
+                 max_rows: int = 10000, pool_factory=None):
+        """
+        初始化引擎（连接池在首次查询时创建）
+
+        Args:
+            dsn: libpq 连接串，优先于 connect_kwargs
+            connect_kwargs: psycopg2.connect 关键字参数（host/port/user/password/dbname）
+            min_size: 连接池最小连接数
+            max_size: 连接池最大连接数
+            statement_timeout_ms: 单条查询超时（毫秒）
+            pool_timeout: 等待空闲连接的最长时间（秒）
+            health_check_interval: 连接空闲超过该秒数后，借出前先做健康检查
+            max_rows: 单次查询最多返回的行数
+            pool_factory: 自定义连接池构造函数（测试时注入）
+        """
+        self.dsn = dsn
+        self.connect_kwargs = connect_kwargs or {}
+        self.min_size = min_size
+        self.max_size = max_size
+        self.statement_timeout_ms = statement_timeout_ms
+        self.pool_timeout = pool_timeout
+        self.health_check_interval = health_check_interval
+        self.max_rows = max_rows
+        self._pool_factory = pool_factory
+        self._pool = None
+        self._pool_pid: Optional[int] = None
+        self._lock = threading.Lock()
+        # ThreadedConnectionPool 在耗尽时直接抛错，用信号量让调用方排队等待
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._last_used: Dict[int, float] = {}
+        self.queries = 0
+        self.failures = 0
+        self.discarded = 0
+
+    def _get_pool(self):
+        """懒加载连接池；fork 后的子进程重新建池，不复用父进程的连接"""
+        pid = os.getpid()
+        if self._pool is None or self._pool_pid != pid:
+            with self._lock:
+                if self._pool is None or self._pool_pid != pid:
+                    factory = self._pool_factory
+                    if factory is None:
+                        if not PSYCOPG2_AVAILABLE:
+                            raise RuntimeError("psycopg2 not available. Run: pip install psycopg2-binary")
+                        factory = psycopg2.pool.ThreadedConnectionPool
+                    if self.dsn:
+                        self._pool = factory(self.min_size, self.max_size, self.dsn)
+                    else:
+                        self._pool = factory(self.min_size, self.max_size, **self.connect_kwargs)
+                    self._pool_pid = pid
+                    self._last_used = {}
+                    self._slots = threading.BoundedSemaphore(self.max_size)
+                    logger.info(f"PostgreSQL read pool created (pid={pid}, "
+                                f"min={self.min_size}, max={self.max_size})")
+        return self._pool
+
+    def _is_healthy(self, conn) -> bool:
+        """检查连接是否可用；最近用过的连接跳过 SELECT 1"""
+        if conn.closed:
+            return False
+        last_used = self._last_used.get(id(conn))
+        if last_used is not None and time.monotonic() - last_used < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception as e:
+            logger.warning(f"Discarding unhealthy connection: {e}")
+            return False
+
+    @contextmanager
+    def _connection(self) -> Iterator[Any]:
+        """借出一个健康的连接，用完归还"""
+        pool = self._get_pool()
+        if not self._slots.acquire(timeout=self.pool_timeout):
+            raise TimeoutError(f"No database connection available within {self.pool_timeout}s")
+        conn = None
+        try:
+            for _ in range(self.max_size + 1):
+                conn = pool.getconn()
+                if self._is_healthy(conn):
+                    break
+                self._last_used.pop(id(conn), None)
+                pool.putconn(conn, close=True)
+                self.discarded += 1
+                conn = None
+            if conn is None:
+                raise RuntimeError("Could not obtain a healthy database connection")
+
+            broken = False
+            try:
+                yield conn
+            except Exception:
+                broken = bool(conn.closed)
+                raise
+            finally:
+                if not conn.closed:
+                    try:
+                        conn.rollback()
+                    except Exception:
+                        broken = True
+                if broken or conn.closed:
+                    self._last_used.pop(id(conn), None)
+                    pool.putconn(conn, close=True)
+                    self.discarded += 1
+                else:
+                    self._last_used[id(conn)] = time.monotonic()
+                    pool.putconn(conn)
+        finally:
+            self._slots.release()
+
+    @staticmethod
+    def validate_read_only(sql: str) -> Optional[str]:
+        """
+        基础校验：只允许单条 SELECT / WITH 语句
+        （真正的写保护由只读事务保证）
+
+        Returns:
+            错误信息；通过时返回 None
+        """
+        statement = sql.strip().rstrip(';').strip()
+        if not statement:
+            return 'SQL cannot be empty'
+        if not _READ_STATEMENT.match(statement):
+            return 'Only SELECT queries are allowed'
+        if ';' in re.sub(r"'(?:[^']|'')*'", '', statement):
+            return 'Multiple statements are not allowed'
+        return None
+
+    @contextmanager
+    def _read_cursor(self, sql: str, params: Optional[Any] = None, name: Optional[str] = None):
+        """在只读事务中执行查询并返回游标；name 非空时使用服务端游标"""
+        with self._connection() as conn:
+            conn.set_session(readonly=True)
+            with conn.cursor() as setup:
+                setup.execute("SET LOCAL statement_timeout = %s", (int(self.statement_timeout_ms),))
+            cursor_factory = psycopg2.extras.RealDictCursor if PSYCOPG2_AVAILABLE else None
+            if name:
+                cur = conn.cursor(name=name, cursor_factory=cursor_factory)
+            else:
+                cur = conn.cursor(cursor_factory=cursor_factory)
+            try:
+                cur.execute(sql.strip().rstrip(';'), params)
+                yield cur
+            finally:
+                cur.close()
+
+    def execute_query(self, sql: str, params: Optional[Any] = None) -> Dict[str, Any]:
+        """
+        原样执行只读 SQL
+
+        Args:
+            sql: SELECT 语句，可包含 JOIN / GROUP BY / 聚合
+            params: psycopg2 查询参数（%s 或 %(name)s 占位符）
+
+        Returns:
+            与 SupabaseClient.execute_query 相同结构的结果字典
+        """
+        error = self.validate_read_only(sql)
+        if error:
+            return {'success': False, 'error': error, 'data': [], 'sql': sql}
+
+        start = time.time()
+        self.queries += 1
+        try:
+            with self._read_cursor(sql, params) as cur:
+                rows = cur.fetchmany(self.max_rows + 1)
+                columns = [d[0] for d in cur.description or []]
+            truncated = len(rows) > self.max_rows
+            data = [dict(row) for row in rows[:self.max_rows]]
+            elapsed_ms = (time.time() - start) * 1000
+            logger.info(f"✅ PostgreSQL query executed: {len(data)} rows in {elapsed_ms:.1f}ms")
+            return {
+                'success': True,
+                'data': data,
+                'count': len(data),
+                'columns': columns,
+                'truncated': truncated,
+                'message': f'成功返回 {len(data)} 条记录'
+            }
+        except Exception as e:
+            self.failures += 1
+            logger.error(f"❌ PostgreSQL query failed: {e}")
+            return {'success': False, 'error': str(e), 'data': [], 'sql': sql}
+
+    def stream_query(self, sql: str, params: Optional[Any] = None,
+                     batch_size: int = 1000) -> Iterator[List[Dict[str, Any]]]:
+        """
+        使用服务端游标分批读取结果，内存占用与结果集大小无关
+
+        校验在调用时立即进行，连接在第一次迭代时才借出，
+        迭代结束或生成器被关闭（如客户端断开）时归还
+
+        Args:
+            sql: SELECT 语句
+            params: psycopg2 查询参数
+            batch_size: 每批行数
+
+        Returns:
+            逐批产出结果行的迭代器
+
+        Raises:
+            ValueError: SQL 不是单条只读语句
+        """
+        error = self.validate_read_only(sql)
+        if error:
+            raise ValueError(error)
+        return self._stream(sql, params, batch_size)
+
+    def _stream(self, sql: str, params: Optional[Any], batch_size: int) -> Iterator[List[Dict[str, Any]]]:
+        self.queries += 1
+        try:
+            with self._read_cursor(sql, params, name=f"nl2sql_stream_{uuid.uuid4().hex[:12]}") as cur:
+                cur.itersize = batch_size
+                while True:
+                    rows = cur.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield [dict(row) for row in rows]
+        except GeneratorExit:
+            raise
+        except Exception:
+            self.failures += 1
+            raise
+
+    def health_check(self) -> Dict[str, Any]:
+        """连接池健康检查"""
+        try:
+            with self._connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+            return {'healthy': True, **self.get_stats()}
+        except Exception as e:
+            return {'healthy': False, 'error': str(e), **self.get_stats()}
+
+    def get_stats(self) -> Dict[str, Any]:
+        """连接池统计"""
+        return {
+            'min_size': self.min_size,
+            'max_size': self.max_size,
+            'statement_timeout_ms': self.statement_timeout_ms,
+            'pool_created': self._pool is not None,
+            'queries': self.queries,
+            'failures': self.failures,
+            'discarded_connections': self.discarded
+        }
+
+    def close(self) -> None:
+        """关闭所有连接"""
+        with self._lock:
+            pool, self._pool = self._pool, None
+            self._pool_pid = None
+        if pool is not None:
+            pool.closeall()
+            logger.info("PostgreSQL read pool closed")
+
+
+# 全局实例
+_postgres_read_engine = None
+
+
+def get_postgres_read_engine() -> PostgreSQLReadEngine:
+    """获取 PostgreSQL 只读引擎单例"""
+    global _postgres_read_engine
+    if _postgres_read_engine is None:
+        _postgres_read_engine = PostgreSQLReadEngine(
+            dsn=os.getenv('QUERY_DATABASE_URL') or None,
+            connect_kwargs={
+                'host': os.getenv('SUPABASE_DB_HOST'),
+                'port': int(os.getenv('SUPABASE_DB_PORT', 5432)),
+                'user': os.getenv('SUPABASE_DB_USER', 'postgres'),
+                'password': os.getenv('SUPABASE_DB_PASSWORD'),
+                'dbname': os.getenv('SUPABASE_DB_NAME', 'postgres'),
+                'connect_timeout': int(os.getenv('QUERY_DB_CONNECT_TIMEOUT', 10))
+            },
+            min_size=int(os.getenv('QUERY_DB_POOL_MIN', 1)),
+            max_size=int(os.getenv('QUERY_DB_POOL_MAX', 10)),
+            statement_timeout_ms=int(os.getenv('QUERY_STATEMENT_TIMEOUT_MS', 15000)),
+            pool_timeout=float(os.getenv('QUERY_DB_POOL_TIMEOUT', 10)),
+            health_check_interval=float(os.getenv('QUERY_DB_HEALTH_CHECK_INTERVAL', 30)),
+            max_rows=int(os.getenv('QUERY_MAX_ROWS', 10000))
+        )
+    return _postgres_read_engine
@@ -3,23 +3,36 @@
 执行 SQL 查询并返回结果
 支持 Supabase 客户端
 """
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterator, Optional
 import logging
+import os
 import re
 
+from app.services.postgres_read_engine import get_postgres_read_engine
+from app.services.result_cache import get_query_result_cache, extract_tables
+from app.services.sql_translator import SQLTranslationError, translate_sql
+
 logger = logging.getLogger(__name__)
 
 class QueryExecutor:
-    """SQL 查询执行器 - 支持 Supabase"""
+    """SQL 查询执行器 - 支持 Supabase (PostgREST) 和 PostgreSQL 直连两种引擎"""
+    
+    ENGINES = ('postgrest', 'postgres')
     
-    def __init__(self, supabase_client=None):
+    def __init__(self, supabase_client=None, engine: Optional[str] = None):
         """
         初始化查询执行器
         
         Args:
             supabase_client: Supabase 客户端对象
+            engine: 执行引擎，'postgrest'（默认，SQL 翻译为 PostgREST 调用）
+                或 'postgres'（连接池直连，原样执行 SQL）；默认读取 QUERY_ENGINE
         """
         self.supabase_client = supabase_client
+        self.engine = (engine or os.getenv('QUERY_ENGINE', 'postgrest')).lower()
+        if self.engine not in self.ENGINES:
+            logger.warning(f"Unknown QUERY_ENGINE '{self.engine}', falling back to postgrest")
+            self.engine = 'postgrest'
     
     def _extract_table_from_sql(self, sql: str) -> Optional[str]:
         """
@@ -64,18 +77,41 @@ class QueryExecutor:
             logger.error(f"Error extracting table name: {str(e)}")
             return None
     
-    def execute_query(self, sql: str, params: Optional[List] = None) -> Dict[str, Any]:
+    def execute_query(self, sql: str, params: Optional[List] = None,
+                      refresh: bool = False, cache_ttl: Optional[float] = None) -> Dict[str, Any]:
         """
-        执行 SQL 查询
+        执行 SQL 查询（带结果缓存）
         
         Args:
             sql: SQL 查询语句
-            params: 查询参数（可选，Supabase 不支持）
+            params: 查询参数（可选，仅 postgres 引擎支持）
+            refresh: 为 True 时跳过缓存读取，强制查询数据库并刷新缓存
+            cache_ttl: 覆盖结果缓存的 TTL（秒），默认按表配置
             
         Returns:
-            包含查询结果和元数据的字典
+            包含查询结果和元数据的字典；命中缓存时带 cached=True
         """
+        cache = get_query_result_cache()
+        key = cache.make_key(sql, params, namespace=self.engine)
+        
+        if not refresh:
+            cached = cache.get(key)
+            if cached is not None:
+                logger.info(f"Query result cache hit: {sql[:100]}")
+                return {**cached, 'cached': True}
+        
+        result = self._execute_uncached(sql, params)
+        if result.get('success') and not result.get('truncated'):
+            cache.set(key, result, extract_tables(sql), ttl=cache_ttl)
+        return result
+    
+    def _execute_uncached(self, sql: str, params: Optional[List] = None) -> Dict[str, Any]:
+        """直接执行查询，不经过缓存"""
         try:
+            if self.engine == 'postgres':
+                # JOIN / GROUP BY / 聚合直接在数据库中执行
+                return get_postgres_read_engine().execute_query(sql, params)
+            
             if not self.supabase_client:
                 logger.error("Database connection not initialized")
                 return {
@@ -93,24 +129,23 @@ class QueryExecutor:
                     'data': []
                 }
             
-            # 从 SQL 中提取表名
-            table_name = self._extract_table_from_sql(sql)
-            
-            if not table_name:
-                logger.warning(f"Cannot determine table from SQL: {sql}")
+            # 先翻译一次，超出 PostgREST 支持范围的语句直接明确拒绝
+            try:
+                query = translate_sql(sql)
+            except SQLTranslationError as e:
+                logger.warning(f"Rejected SQL: {e}")
                 return {
                     'success': False,
-                    'error': 'Cannot determine table from SQL statement',
+                    'error': f'不支持的 SQL: {e}',
                     'data': [],
                     'sql': sql
                 }
             
-            # 使用 Supabase 执行查询
-            logger.info(f"Executing query on table: {table_name}")
+            logger.info(f"Executing query on table: {query.table}")
             logger.info(f"SQL: {sql}")
             
-            # 调用 Supabase 客户端的 execute_query 方法
-            result = self.supabase_client.execute_query(sql, table_name)
+            # 调用 Supabase 客户端的 execute_query 方法（翻译并下推到 PostgREST）
+            result = self.supabase_client.execute_query(sql, query.table)
             
             return result
             
@@ -121,3 +156,32 @@ class QueryExecutor:
                 'error': str(e),
                 'data': []
             }
+    
+    def stream_query(self, sql: str, params: Optional[List] = None,
+                     batch_size: Optional[int] = None) -> Iterator[List[Dict[str, Any]]]:
+        """
+        流式执行 SQL 查询，逐批返回结果行
+        
+        postgres 引擎使用服务端游标，postgrest 引擎使用 Range 分页；
+        SQL 校验/翻译错误在返回迭代器之前抛出，便于接口在开始输出前返回 400
+        
+        Args:
+            sql: SQL 查询语句
+            params: 查询参数（可选，仅 postgres 引擎支持）
+            batch_size: 每批行数，默认读取 QUERY_STREAM_BATCH_SIZE
+            
+        Returns:
+            逐批产出结果行的迭代器
+            
+        Raises:
+            ValueError: SQL 不受支持（SQLTranslationError 是其子类）
+            RuntimeError: 数据库未连接
+        """
+        batch_size = batch_size or int(os.getenv('QUERY_STREAM_BATCH_SIZE', 1000))
+        
+        if self.engine == 'postgres':
+            return get_postgres_read_engine().stream_query(sql, params, batch_size)
+        
+        if not self.supabase_client or not self.supabase_client.client:
+            raise RuntimeError('Supabase client not connected')
+        return self.supabase_client.stream_query(sql, batch_size)
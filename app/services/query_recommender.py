@@ -0,0 +1,342 @@
+"""
+基于真实流量的查询推荐
+按规范化问题统计频次，每个时间窗口一个带时间衰减的 Space-Saving 热点草图：
+- 容量固定（capacity 个计数器），内存不随问题数增长
+- 计数按窗口半衰期指数衰减，近期的查询权重更高
+- 推荐列表定期预计算后直接从内存返回
+- 可选的后台预热：定期执行热门推荐，使 LLM 缓存和结果缓存保持命中
+"""
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.services.example_store import question_key
+from app.services.execution_history import get_execution_history
+
+logger = logging.getLogger(__name__)
+
+# 窗口名 -> 半衰期（秒）
+RECOMMENDATION_WINDOWS = {
+    'hour': 3600,
+    'day': 86400,
+    'week': 7 * 86400,
+}
+
+# 没有足够流量时的默认推荐
+DEFAULT_RECOMMENDATIONS = [
+    {
+        "title": "查看今天的OEE",
+        "natural_language": "查询今天各设备的OEE数据",
+        "category": "metric",
+        "icon": "chart"
+    },
+    {
+        "title": "对比设备效率",
+        "natural_language": "对比本周所有设备的效率差异",
+        "category": "comparison",
+        "icon": "compare"
+    },
+    {
+        "title": "查询停机时间",
+        "natural_language": "查询本月的设备停机时间统计",
+        "category": "metric",
+        "icon": "alert"
+    },
+    {
+        "title": "产品质量分析",
+        "natural_language": "分析最近30天的产品良率趋势",
+        "category": "trend",
+        "icon": "trend"
+    }
+]
+
+
+class SpaceSaving:
+    """
+    带指数时间衰减的 Space-Saving 热点计数器
+
+    使用前向衰减：时刻 t 的一次出现记为 2^((t - t0) / half_life)，
+    读出时整体乘以 2^(-(now - t0) / half_life)，因此更新时无需衰减其他计数器
+    """
+
+    def __init__(self, capacity: int, half_life: float):
+        self.capacity = capacity
+        self.half_life = half_life
+        self._t0: Optional[float] = None
+        self._counters: Dict[str, List[float]] = {}  # key -> [计数, 误差上界]
+
+    def _weight(self, now: float) -> float:
+        if self._t0 is None:
+            self._t0 = now
+        exponent = (now - self._t0) / self.half_life
+        if exponent > 500:
+            # 避免浮点溢出：把基准时间移到 now，所有计数器同比缩小
+            scale = 2.0 ** -exponent
+            for counter in self._counters.values():
+                counter[0] *= scale
+                counter[1] *= scale
+            self._t0, exponent = now, 0.0
+        return 2.0 ** exponent
+
+    def add(self, key: str, now: float) -> Optional[str]:
+        """
+        记录一次出现
+
+        Returns:
+            为腾出位置被淘汰的 key（没有淘汰时为 None）
+        """
+        weight = self._weight(now)
+        counter = self._counters.get(key)
+        if counter is not None:
+            counter[0] += weight
+            return None
+        if len(self._counters) < self.capacity:
+            self._counters[key] = [weight, 0.0]
+            return None
+        evicted = min(self._counters, key=lambda k: self._counters[k][0])
+        floor = self._counters.pop(evicted)[0]
+        self._counters[key] = [floor + weight, floor]
+        return evicted
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._counters
+
+    def top(self, now: float) -> List[Tuple[str, float, float]]:
+        """按衰减后计数从高到低返回 [(key, 计数, 误差上界)]"""
+        if self._t0 is None:
+            return []
+        decay = 2.0 ** (-(now - self._t0) / self.half_life)
+        ranked = sorted(self._counters.items(), key=lambda item: item[1][0], reverse=True)
+        return [(key, count * decay, error * decay) for key, (count, error) in ranked]
+
+
+class QueryRecommender:
+    """按时间窗口维护热门查询并预计算推荐列表（线程安全）"""
+
+    def __init__(self, capacity: int = 200, refresh_interval: float = 60,
+                 min_count: float = 2.0, windows: Optional[Dict[str, float]] = None):
+        """
+        Args:
+            capacity: 每个窗口草图的计数器数量
+            refresh_interval: 推荐列表预计算的间隔（秒）
+            min_count: 进入推荐所需的最低衰减计数
+            windows: 窗口名 -> 半衰期（秒），默认 RECOMMENDATION_WINDOWS
+        """
+        self.capacity = capacity
+        self.refresh_interval = refresh_interval
+        self.min_count = min_count
+        self._lock = threading.Lock()
+        self._sketches = {
+            name: SpaceSaving(capacity, half_life)
+            for name, half_life in (windows or RECOMMENDATION_WINDOWS).items()
+        }
+        self._samples: Dict[str, Dict[str, Any]] = {}  # key -> 最近一次的问题、SQL、意图
+        self._snapshots: Dict[str, List[Dict[str, Any]]] = {}
+        self._snapshot_at = 0.0
+        self._prewarm_thread: Optional[threading.Thread] = None
+        self._prewarm_pid: Optional[int] = None
+        self._stop_prewarm = threading.Event()
+        self._prewarm_lock = threading.Lock()
+
+    @property
+    def windows(self) -> List[str]:
+        return list(self._sketches)
+
+    def observe(self, question: str, sql: Optional[str] = None, intent: Optional[str] = None,
+                timestamp: Optional[float] = None) -> None:
+        """记录一次成功的查询"""
+        key = question_key(question or '')
+        if not key:
+            return
+        now = timestamp if timestamp is not None else time.time()
+        with self._lock:
+            evicted = set()
+            for sketch in self._sketches.values():
+                dropped = sketch.add(key, now)
+                if dropped:
+                    evicted.add(dropped)
+            sample = self._samples.get(key)
+            if sample is None or now >= sample['last_seen']:
+                self._samples[key] = {
+                    'question': question.strip(),
+                    'sql': sql or (sample or {}).get('sql'),
+                    'intent': intent,
+                    'last_seen': now
+                }
+            for dropped in evicted:
+                if not any(dropped in sketch for sketch in self._sketches.values()):
+                    self._samples.pop(dropped, None)
+
+    def seed(self, rows: List[Dict[str, Any]]) -> int:
+        """
+        用执行历史回放初始化计数（rows 按时间正序）
+
+        Returns:
+            回放的记录数
+        """
+        count = 0
+        for row in rows:
+            if not row.get('success') or not row.get('natural_language'):
+                continue
+            try:
+                timestamp = datetime.fromisoformat(row['executed_at']).timestamp()
+            except (KeyError, TypeError, ValueError):
+                timestamp = None
+            self.observe(row['natural_language'], row.get('sql'), row.get('intent'), timestamp)
+            count += 1
+        self._snapshot_at = 0.0
+        return count
+
+    def refresh(self) -> None:
+        """重新计算各窗口的推荐列表"""
+        now = time.time()
+        with self._lock:
+            snapshots = {}
+            for name, sketch in self._sketches.items():
+                entries = []
+                for key, count, error in sketch.top(now):
+                    # Space-Saving 计数可能高估 error，保守地用下界判断是否够热
+                    if count - error < self.min_count:
+                        continue
+                    sample = self._samples.get(key)
+                    if sample is None:
+                        continue
+                    entries.append(self._to_recommendation(sample, count))
+                snapshots[name] = entries
+            self._snapshots = snapshots
+            self._snapshot_at = now
+
+    @staticmethod
+    def _to_recommendation(sample: Dict[str, Any], count: float) -> Dict[str, Any]:
+        question = sample['question']
+        if sample.get('intent') == 'compare_analysis' or '对比' in question:
+            category, icon = 'comparison', 'compare'
+        elif '趋势' in question:
+            category, icon = 'trend', 'trend'
+        else:
+            category, icon = 'metric', 'chart'
+        return {
+            'title': question if len(question) <= 20 else question[:19] + '…',
+            'natural_language': question,
+            'category': category,
+            'icon': icon,
+            'sql': sample.get('sql'),
+            'score': round(count, 2),
+            'last_seen': datetime.fromtimestamp(sample['last_seen']).isoformat()
+        }
+
+    def recommendations(self, window: str = 'day', limit: int = 8) -> List[Dict[str, Any]]:
+        """
+        返回指定窗口的推荐（预计算结果，过期时先重新计算）；
+        流量不足时用 DEFAULT_RECOMMENDATIONS 补足
+        """
+        if window not in self._sketches:
+            raise ValueError(f"Unknown window: {window} (expected one of {', '.join(self._sketches)})")
+        if time.time() - self._snapshot_at >= self.refresh_interval:
+            self.refresh()
+        entries = [dict(entry, source='traffic') for entry in self._snapshots.get(window, [])[:limit]]
+        seen = {question_key(entry['natural_language']) for entry in entries}
+        for default in DEFAULT_RECOMMENDATIONS:
+            if len(entries) >= limit:
+                break
+            if question_key(default['natural_language']) not in seen:
+                entries.append(dict(default, source='default'))
+        return entries
+
+    def start_prewarm(self, warm: Callable[[str], Any], top: int = 5, interval: float = 45,
+                      window: str = 'hour') -> None:
+        """
+        启动后台预热线程：每 interval 秒把 window 窗口中前 top 个基于流量的推荐交给 warm 执行一遍
+        （每个进程一个线程）
+        """
+        if self._prewarm_alive():
+            return
+        with self._prewarm_lock:
+            # 并发的首批请求都会走到这里，加锁后再检查一次，保证只启动一个线程
+            if self._prewarm_alive():
+                return
+            self._prewarm_pid = os.getpid()
+            self._stop_prewarm.clear()
+
+            def loop():
+                while not self._stop_prewarm.wait(interval):
+                    self.prewarm(warm, top, window)
+
+            self._prewarm_thread = threading.Thread(target=loop, name='recommendation-prewarm', daemon=True)
+            self._prewarm_thread.start()
+
+    def _prewarm_alive(self) -> bool:
+        return (self._prewarm_pid == os.getpid() and self._prewarm_thread is not None
+                and self._prewarm_thread.is_alive())
+
+    def stop_prewarm(self) -> None:
+        self._stop_prewarm.set()
+
+    def prewarm(self, warm: Callable[[str], Any], top: int = 5, window: str = 'hour') -> int:
+        """
+        依次执行前 top 个基于流量的推荐；warm 在执行失败时应抛出异常
+
+        Returns:
+            成功预热的条数
+        """
+        warmed = 0
+        for entry in self.recommendations(window, top):
+            if entry['source'] != 'traffic':
+                continue
+            try:
+                warm(entry['natural_language'])
+                warmed += 1
+            except Exception as e:
+                logger.warning(f"Failed to prewarm recommendation '{entry['natural_language']}': {e}")
+        if warmed:
+            logger.info(f"🔥 Prewarmed {warmed} recommended queries ({window})")
+        return warmed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'capacity': self.capacity,
+                'tracked': {name: len(sketch._counters) for name, sketch in self._sketches.items()},
+                'samples': len(self._samples),
+                'snapshot_at': (datetime.fromtimestamp(self._snapshot_at).isoformat()
+                                if self._snapshot_at else None)
+            }
+
+
+# 全局实例
+_query_recommender = None
+_query_recommender_lock = threading.Lock()
+
+
+def get_query_recommender() -> QueryRecommender:
+    """获取查询推荐单例；首次创建时用执行历史中最近的记录初始化"""
+    global _query_recommender
+    with _query_recommender_lock:
+        if _query_recommender is None:
+            _query_recommender = QueryRecommender(
+                capacity=int(os.getenv('RECOMMENDATION_CAPACITY', 200)),
+                refresh_interval=float(os.getenv('RECOMMENDATION_REFRESH_SECONDS', 60)),
+                min_count=float(os.getenv('RECOMMENDATION_MIN_COUNT', 2))
+            )
+            _seed_from_history(_query_recommender, int(os.getenv('RECOMMENDATION_SEED_LIMIT', 5000)))
+        return _query_recommender
+
+
+def _seed_from_history(recommender: QueryRecommender, limit: int) -> None:
+    try:
+        history = get_execution_history()
+        rows, cursor = [], None
+        while len(rows) < limit:
+            page = history.page(limit=min(500, limit - len(rows)), cursor=cursor)
+            rows.extend(page['history'])
+            cursor = page['next_cursor']
+            if cursor is None:
+                break
+        seeded = recommender.seed(list(reversed(rows)))
+        if seeded:
+            logger.info(f"✅ Seeded query recommendations from {seeded} history records")
+    except Exception as e:
+        logger.warning(f"Failed to seed query recommendations from history: {e}")
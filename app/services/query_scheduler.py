@@ -0,0 +1,445 @@
+"""
+定时查询调度器
+进程内按固定间隔或 cron 表达式执行保存的 SQL，把最新结果写入查询结果缓存，
+仪表盘通过 /api/query/unified/execute 请求同一条 SQL 时直接命中预先计算的结果
+
+- 任务持久化到 JSON 文件，重启后立即各执行一次以重新填充缓存
+- 有界并发（线程池），同一任务上一次未结束时跳过本次
+- 每次调度加随机抖动，避免整点同时打到数据库
+- 结果缓存 TTL 覆盖到下一次执行之后，不会在两次执行之间过期
+
+调度线程默认不启动：多进程部署（gunicorn 多 worker）时每个进程都会运行各自的调度器，
+只应在一个进程中设置 SCHEDULER_ENABLED；未启用的进程仍可管理任务和手动执行
+"""
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field, fields
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from app.services.postgres_read_engine import PostgreSQLReadEngine
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SCHEDULE_PATH = os.path.join('data', 'scheduled_queries.json')
+
+
+class CronSchedule:
+    """
+    五段 cron 表达式：分 时 日 月 周（0/7 为周日）
+    每段支持 *、*/n、a、a-b、a-b/n 以及逗号分隔的组合；
+    日和周都不是 * 时按标准 cron 语义任一匹配即可
+    """
+
+    _RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+    def __init__(self, expression: str):
+        parts = expression.split()
+        if len(parts) != 5:
+            raise ValueError(f"Cron expression must have 5 fields: {expression!r}")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            self._parse_field(part, low, high) for part, (low, high) in zip(parts, self._RANGES)
+        )
+        self.weekdays = {d % 7 for d in weekdays}
+        self._any_day = parts[2] == '*'
+        self._any_weekday = parts[4] == '*'
+
+    @staticmethod
+    def _parse_field(part: str, low: int, high: int) -> Set[int]:
+        values = set()
+        for item in part.split(','):
+            step = 1
+            if '/' in item:
+                item, step_text = item.split('/', 1)
+                step = int(step_text)
+                if step <= 0:
+                    raise ValueError(f"Invalid cron step: {part!r}")
+            if item == '*':
+                start, end = low, high
+            elif '-' in item:
+                start, end = (int(v) for v in item.split('-', 1))
+            else:
+                start = end = int(item)
+            if start < low or end > high or start > end:
+                raise ValueError(f"Cron value out of range {low}-{high}: {part!r}")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, moment: datetime) -> bool:
+        day_ok = moment.day in self.days
+        # Python: Monday=0；cron: Sunday=0
+        weekday_ok = (moment.weekday() + 1) % 7 in self.weekdays
+        if self._any_day:
+            return weekday_ok
+        if self._any_weekday:
+            return day_ok
+        return day_ok or weekday_ok
+
+    def next_after(self, moment: datetime) -> datetime:
+        """moment 之后（不含）的下一个触发时间（精确到分钟）"""
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate + timedelta(days=366 * 5)
+        while candidate < limit:
+            if candidate.month not in self.months:
+                year, month = (candidate.year + 1, 1) if candidate.month == 12 else (candidate.year, candidate.month + 1)
+                candidate = candidate.replace(year=year, month=month, day=1, hour=0, minute=0)
+            elif not self._day_matches(candidate):
+                candidate = candidate.replace(hour=0, minute=0) + timedelta(days=1)
+            elif candidate.hour not in self.hours:
+                candidate = candidate.replace(minute=0) + timedelta(hours=1)
+            elif candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+            else:
+                return candidate
+        raise ValueError(f"Cron expression never fires: {self.expression!r}")
+
+
+@dataclass
+class ScheduledJob:
+    """一条定时查询"""
+    id: str
+    name: str
+    sql: str
+    interval_seconds: Optional[float] = None
+    cron: Optional[str] = None
+    natural_language: str = ''
+    enabled: bool = True
+    created_at: str = ''
+    last_run_at: Optional[str] = None
+    last_status: Optional[str] = None  # success / error
+    last_error: Optional[str] = None
+    last_duration_ms: Optional[float] = None
+    last_rows_count: Optional[int] = None
+    run_count: int = 0
+    next_run_at: float = field(default=0.0, repr=False)  # planned_at + 本次抖动
+    planned_at: float = field(default=0.0, repr=False)  # 不含抖动的计划时间，按它推算下一次
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data.pop('planned_at')
+        data['next_run_at'] = datetime.fromtimestamp(self.next_run_at).isoformat() if self.next_run_at else None
+        return data
+
+
+class QueryScheduler:
+    """进程内定时查询调度器（线程安全）"""
+
+    def __init__(self, run_query: Callable[[str, float], Dict[str, Any]], path: Optional[str] = None,
+                 max_concurrency: int = 2, jitter_seconds: float = 10.0, min_interval: float = 30.0):
+        """
+        Args:
+            run_query: 执行 (sql, 结果缓存 TTL) 并返回 {'success', 'data', 'error'} 的函数
+            path: 任务持久化文件；为 None 时只保存在内存中
+            max_concurrency: 同时执行的任务数上限
+            jitter_seconds: 每次调度附加的随机延迟上限
+            min_interval: 允许的最小执行间隔（秒）
+        """
+        self.run_query = run_query
+        self.path = path
+        self.max_concurrency = max_concurrency
+        self.jitter_seconds = jitter_seconds
+        self.min_interval = min_interval
+        self._lock = threading.RLock()
+        self._save_lock = threading.Lock()
+        self._jobs: Dict[str, ScheduledJob] = {}
+        self._crons: Dict[str, CronSchedule] = {}
+        self._running: Set[str] = set()
+        self._changed = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_pid: Optional[int] = None
+        self._pool: Optional[ThreadPoolExecutor] = None
+        if path:
+            self._load()
+
+    # ---- 任务管理 ----
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                rows = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.error(f"Failed to load scheduled queries from {self.path}: {e}")
+            return
+        known = {f.name for f in fields(ScheduledJob)} - {'next_run_at', 'planned_at'}
+        now = time.time()
+        for row in rows:
+            try:
+                job = ScheduledJob(**{k: v for k, v in row.items() if k in known})
+                if job.cron:
+                    self._crons[job.id] = CronSchedule(job.cron)
+            except (TypeError, ValueError) as e:
+                logger.warning(f"⚠️  Skipping invalid scheduled query {row.get('id')}: {e}")
+                continue
+            if job.cron and job.enabled:
+                try:
+                    self._crons[job.id].next_after(datetime.now())
+                except ValueError as e:
+                    logger.warning(f"⚠️  Disabling scheduled query {job.id}: {e}")
+                    job.enabled, job.last_status, job.last_error = False, 'error', str(e)
+            # 重启后缓存为空：先执行一次
+            job.planned_at = now
+            job.next_run_at = now + random.uniform(0, self.jitter_seconds)
+            self._jobs[job.id] = job
+        logger.info(f"✅ Loaded {len(self._jobs)} scheduled queries from {self.path}")
+
+    def _save(self) -> None:
+        """写入临时文件后原子替换；多个执行线程同时保存时按顺序进行，最后一次保存的是最新快照"""
+        if not self.path:
+            return
+        with self._save_lock:
+            with self._lock:
+                rows = [job.to_dict() for job in self._jobs.values()]
+            for row in rows:
+                row.pop('next_run_at', None)
+            tmp_path = None
+            try:
+                directory = os.path.dirname(os.path.abspath(self.path))
+                os.makedirs(directory, exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.scheduled_queries.', suffix='.tmp')
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(rows, f, ensure_ascii=False, indent=2)
+                os.replace(tmp_path, self.path)
+                tmp_path = None
+            except OSError as e:
+                logger.error(f"Failed to save scheduled queries: {e}")
+            finally:
+                if tmp_path and os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+    def add_job(self, sql: str, interval_seconds: Optional[float] = None, cron: Optional[str] = None,
+                name: str = '', natural_language: str = '') -> ScheduledJob:
+        """
+        新增定时查询
+
+        Raises:
+            ValueError: SQL 不是只读查询，或调度配置无效
+        """
+        sql = (sql or '').strip()
+        error = PostgreSQLReadEngine.validate_read_only(sql)
+        if error:
+            raise ValueError(error)
+        if (interval_seconds is None) == (not cron):
+            raise ValueError('Exactly one of interval_seconds or cron is required')
+        cron_schedule = CronSchedule(cron) if cron else None
+        if cron_schedule:
+            # 例如 "0 0 30 2 *"：语法正确但永远不会触发
+            cron_schedule.next_after(datetime.now())
+        if interval_seconds is not None:
+            interval_seconds = float(interval_seconds)
+            if interval_seconds < self.min_interval:
+                raise ValueError(f'interval_seconds must be at least {self.min_interval:g}')
+
+        job = ScheduledJob(
+            id=uuid.uuid4().hex,
+            name=name or natural_language or sql[:50],
+            sql=sql,
+            interval_seconds=interval_seconds,
+            cron=cron or None,
+            natural_language=natural_language,
+            created_at=datetime.now().isoformat(),
+        )
+        job.planned_at = time.time()
+        job.next_run_at = job.planned_at + random.uniform(0, self.jitter_seconds)
+        with self._lock:
+            self._jobs[job.id] = job
+            if cron_schedule:
+                self._crons[job.id] = cron_schedule
+        self._save()
+        self._changed.set()
+        logger.info(f"Scheduled query {job.id} added: {job.name}")
+        return job
+
+    def remove_job(self, job_id: str) -> bool:
+        with self._lock:
+            removed = self._jobs.pop(job_id, None) is not None
+            self._crons.pop(job_id, None)
+        if removed:
+            self._save()
+            self._changed.set()
+        return removed
+
+    def get_job(self, job_id: str) -> Optional[ScheduledJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            jobs = sorted(self._jobs.values(), key=lambda job: job.created_at)
+            return [job.to_dict() for job in jobs]
+
+    # ---- 调度 ----
+
+    def _period(self, job: ScheduledJob, now: float) -> float:
+        """两次执行之间的预计间隔（秒）"""
+        if job.interval_seconds:
+            return job.interval_seconds
+        first = self._crons[job.id].next_after(datetime.fromtimestamp(now))
+        return (self._crons[job.id].next_after(first) - first).total_seconds()
+
+    def _schedule_next(self, job: ScheduledJob, now: float) -> None:
+        """
+        按计划时间（而非完成时间）推算下一次执行，落后时从 now 重新计算；
+        抖动只加在 next_run_at 上，不累积到计划时间中
+        """
+        if job.interval_seconds:
+            planned = job.planned_at + job.interval_seconds
+            if planned <= now:
+                planned = now + job.interval_seconds
+        else:
+            planned = self._crons[job.id].next_after(datetime.fromtimestamp(now)).timestamp()
+        job.planned_at = planned
+        job.next_run_at = planned + random.uniform(0, self.jitter_seconds)
+
+    def _collect_due(self) -> Tuple[List[ScheduledJob], float]:
+        """取出到期任务并推算它们的下一次执行；返回 (到期任务, 距下一个任务的秒数)"""
+        now = time.time()
+        due, disabled = [], False
+        with self._lock:
+            for job in self._jobs.values():
+                if not job.enabled or job.next_run_at > now:
+                    continue
+                try:
+                    self._schedule_next(job, now)
+                except Exception as e:
+                    # 单个任务无法调度时停用它，不影响其他任务
+                    logger.error(f"Disabling scheduled query {job.id}: {e}")
+                    job.enabled, job.last_status, job.last_error = False, 'error', str(e)
+                    disabled = True
+                    continue
+                if job.id in self._running:
+                    logger.warning(f"Scheduled query {job.id} still running, skipping this run")
+                else:
+                    self._running.add(job.id)
+                    due.append(job)
+            upcoming = [job.next_run_at for job in self._jobs.values() if job.enabled]
+        if disabled:
+            self._save()
+        timeout = min(upcoming) - now if upcoming else 60.0
+        return due, min(max(timeout, 0.05), 60.0)
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            self._changed.clear()
+            try:
+                due, timeout = self._collect_due()
+            except Exception as e:
+                logger.error(f"Query scheduler tick failed: {e}", exc_info=True)
+                due, timeout = [], 5.0
+            for job in due:
+                try:
+                    self._pool.submit(self._execute, job)
+                except RuntimeError:
+                    # stop() 已关闭线程池
+                    with self._lock:
+                        self._running.discard(job.id)
+            self._changed.wait(timeout)
+
+    def _execute(self, job: ScheduledJob) -> Dict[str, Any]:
+        """执行一次任务并记录状态（调用方已把 job.id 加入 _running）"""
+        start = time.perf_counter()
+        try:
+            # 结果保留到下一次执行之后（再加一次抖动和 50% 余量）
+            ttl = self._period(job, time.time()) * 1.5 + self.jitter_seconds
+            result = self.run_query(job.sql, ttl)
+        except Exception as e:
+            result = {'success': False, 'error': str(e), 'data': []}
+        duration_ms = (time.perf_counter() - start) * 1000
+
+        with self._lock:
+            job.last_run_at = datetime.now().isoformat()
+            job.last_duration_ms = round(duration_ms, 2)
+            job.run_count += 1
+            if result.get('success'):
+                job.last_status, job.last_error = 'success', None
+                job.last_rows_count = len(result.get('data') or [])
+            else:
+                job.last_status, job.last_error = 'error', result.get('error')
+                logger.error(f"Scheduled query {job.id} failed: {job.last_error}")
+            self._running.discard(job.id)
+        self._save()
+        return result
+
+    def run_now(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        立即执行一次（同步），不影响原定调度
+
+        Returns:
+            执行结果；任务不存在或正在执行时返回 None
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.id in self._running:
+                return None
+            self._running.add(job.id)
+        return self._execute(job)
+
+    def start(self) -> None:
+        """启动调度线程（每个进程一个）"""
+        pid = os.getpid()
+        if self._thread_pid == pid and self._thread and self._thread.is_alive():
+            return
+        self._thread_pid = pid
+        self._stop.clear()
+        self._pool = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix='scheduled-query')
+        self._thread = threading.Thread(target=self._loop, name='query-scheduler', daemon=True)
+        self._thread.start()
+        logger.info(f"Query scheduler started with {len(self._jobs)} jobs")
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._changed.set()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'running': bool(self._thread and self._thread.is_alive()),
+                'jobs': len(self._jobs),
+                'in_flight': len(self._running),
+                'max_concurrency': self.max_concurrency
+            }
+
+
+# 全局实例
+_query_scheduler = None
+_query_scheduler_lock = threading.Lock()
+_scheduler_executor = None
+
+
+def _run_scheduled_query(sql: str, ttl: float) -> Dict[str, Any]:
+    """用与 /execute 相同的执行器（同一缓存命名空间）执行并写入结果缓存"""
+    global _scheduler_executor
+    if _scheduler_executor is None:
+        from app.services.query_executor import QueryExecutor
+        from app.services.supabase_client import get_supabase_client
+        _scheduler_executor = QueryExecutor(get_supabase_client())
+    return _scheduler_executor.execute_query(sql, refresh=True, cache_ttl=ttl)
+
+
+def get_query_scheduler() -> QueryScheduler:
+    """获取定时查询调度器单例；只有设置了 SCHEDULER_ENABLED 时才启动调度线程"""
+    global _query_scheduler
+    with _query_scheduler_lock:
+        if _query_scheduler is None:
+            _query_scheduler = QueryScheduler(
+                run_query=_run_scheduled_query,
+                path=os.getenv('SCHEDULED_QUERIES_PATH', DEFAULT_SCHEDULE_PATH) or None,
+                max_concurrency=int(os.getenv('SCHEDULER_MAX_CONCURRENCY', 2)),
+                jitter_seconds=float(os.getenv('SCHEDULER_JITTER_SECONDS', 10)),
+                min_interval=float(os.getenv('SCHEDULER_MIN_INTERVAL_SECONDS', 30))
+            )
+            if os.getenv('SCHEDULER_ENABLED', 'false').lower() in ('1', 'true', 'yes'):
+                _query_scheduler.start()
+        return _query_scheduler
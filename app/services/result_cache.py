@@ -0,0 +1,252 @@
+"""
+查询结果缓存
+按规范化 SQL + 参数缓存查询结果，记录每个结果依赖的表，
+支持按表配置 TTL、按字节数限制容量（LRU 淘汰），写表时按表失效
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_TABLE_REFERENCE = re.compile(
+    r'\b(?:FROM|JOIN)\s+(?:"?public"?\s*\.\s*)?"?([A-Za-z_][A-Za-z0-9_]*)"?',
+    re.IGNORECASE
+)
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    规范化 SQL：去掉注释和末尾分号，合并空白，字符串字面量以外的部分转小写
+    使仅有格式差异的相同查询命中同一缓存条目
+    """
+    sql = re.sub(r'--[^\n]*', ' ', sql)
+    sql = re.sub(r'/\*.*?\*/', ' ', sql, flags=re.DOTALL)
+    parts = []
+    last = 0
+    for match in _STRING_LITERAL.finditer(sql):
+        parts.append(sql[last:match.start()].lower())
+        parts.append(match.group(0))
+        last = match.end()
+    parts.append(sql[last:].lower())
+    normalized = re.sub(r'\s+', ' ', ''.join(parts)).strip()
+    return normalized.rstrip(';').strip()
+
+
+def extract_tables(sql: str) -> Set[str]:
+    """提取 SQL 中 FROM / JOIN 引用的表名（小写）"""
+    without_literals = _STRING_LITERAL.sub("''", sql)
+    return {name.lower() for name in _TABLE_REFERENCE.findall(without_literals)}
+
+
+class QueryResultCache:
+    """带表级依赖和字节容量限制的查询结果缓存（线程安全）"""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, default_ttl: float = 60,
+                 table_ttls: Optional[Dict[str, float]] = None,
+                 max_entry_bytes: int = 5 * 1024 * 1024, enabled: bool = True):
+        """
+        初始化缓存
+
+        Args:
+            max_bytes: 缓存总字节上限，超出后淘汰最久未使用的条目
+            default_ttl: 默认存活时间（秒）
+            table_ttls: 按表覆盖的 TTL；查询涉及多张表时取最小值
+            max_entry_bytes: 单条结果超过该大小时不缓存
+            enabled: 是否启用缓存
+        """
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.table_ttls = {k.lower(): v for k, v in (table_ttls or {}).items()}
+        self.max_entry_bytes = max_entry_bytes
+        self.enabled = enabled
+        # key -> (expires_at, size, tables, value)
+        self._entries: "OrderedDict[str, Tuple[float, int, Set[str], Dict[str, Any]]]" = OrderedDict()
+        self._by_table: Dict[str, Set[str]] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(sql: str, params: Any = None, namespace: str = '') -> str:
+        """
+        生成缓存键
+
+        Args:
+            sql: SQL 语句
+            params: 查询参数
+            namespace: 区分执行引擎等上下文
+        """
+        raw = json.dumps([namespace, normalize_sql(sql), params],
+                         ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def ttl_for(self, tables: Iterable[str]) -> float:
+        """查询涉及多张表时取最短的 TTL"""
+        ttls = [self.table_ttls[t] for t in tables if t in self.table_ttls]
+        return min(ttls) if ttls else self.default_ttl
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """读取缓存，未命中或已过期时返回 None"""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] <= time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[3]
+
+    def set(self, key: str, value: Dict[str, Any], tables: Iterable[str],
+            ttl: Optional[float] = None) -> bool:
+        """
+        写入缓存
+
+        Args:
+            key: 缓存键
+            value: 查询结果
+            tables: 结果依赖的表
+            ttl: 覆盖按表计算的 TTL（定时查询的结果需要保留到下一次执行）
+
+        Returns:
+            是否写入（结果过大或 TTL 为 0 时不缓存）
+        """
+        if not self.enabled:
+            return False
+
+        tables = {t.lower() for t in tables}
+        ttl = self.ttl_for(tables) if ttl is None else ttl
+        if ttl <= 0:
+            return False
+        size = len(json.dumps(value, ensure_ascii=False, default=str).encode('utf-8'))
+        if size > self.max_entry_bytes or size > self.max_bytes:
+            return False
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + ttl, size, tables, value)
+            self._bytes += size
+            for table in tables:
+                self._by_table.setdefault(table, set()).add(key)
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+        return True
+
+    def _remove(self, key: str) -> None:
+        """删除条目（调用方持有锁）"""
+        _, size, tables, _ = self._entries.pop(key)
+        self._bytes -= size
+        for table in tables:
+            keys = self._by_table.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_table[table]
+
+    def invalidate_tables(self, tables: Iterable[str]) -> int:
+        """
+        失效依赖指定表的所有条目
+
+        Returns:
+            被清除的条目数
+        """
+        removed = 0
+        with self._lock:
+            for table in {t.lower() for t in tables}:
+                for key in list(self._by_table.get(table, ())):
+                    self._remove(key)
+                    removed += 1
+            self.invalidations += 1
+        if removed:
+            logger.info(f"Query result cache invalidated {removed} entries for tables {list(tables)}")
+        return removed
+
+    def invalidate(self) -> int:
+        """清空所有条目"""
+        with self._lock:
+            count = len(self._entries)
+            self._entries.clear()
+            self._by_table.clear()
+            self._bytes = 0
+            self.invalidations += 1
+        return count
+
+    def clear(self) -> None:
+        """清空缓存并重置统计"""
+        self.invalidate()
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+            self.invalidations = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'default_ttl': self.default_ttl,
+                'table_ttls': dict(self.table_ttls),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'entries_by_table': {t: len(keys) for t, keys in self._by_table.items()}
+            }
+
+
+def _parse_table_ttls(raw: str) -> Dict[str, float]:
+    """解析 'oee_records=30,equipment=600' 形式的配置"""
+    ttls = {}
+    for item in (raw or '').split(','):
+        if '=' not in item:
+            continue
+        table, ttl = item.split('=', 1)
+        try:
+            ttls[table.strip()] = float(ttl)
+        except ValueError:
+            logger.warning(f"Ignoring invalid QUERY_CACHE_TABLE_TTLS entry: {item}")
+    return ttls
+
+
+# 全局实例
+_query_result_cache = None
+
+
+def get_query_result_cache() -> QueryResultCache:
+    """获取查询结果缓存单例"""
+    global _query_result_cache
+    if _query_result_cache is None:
+        _query_result_cache = QueryResultCache(
+            max_bytes=int(os.getenv('QUERY_CACHE_MAX_BYTES', 64 * 1024 * 1024)),
+            default_ttl=float(os.getenv('QUERY_CACHE_TTL_SECONDS', 60)),
+            table_ttls=_parse_table_ttls(os.getenv('QUERY_CACHE_TABLE_TTLS', '')),
+            max_entry_bytes=int(os.getenv('QUERY_CACHE_MAX_ENTRY_BYTES', 5 * 1024 * 1024)),
+            enabled=os.getenv('QUERY_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+        )
+    return _query_result_cache
@@ -0,0 +1,77 @@
+"""
+查询结果流式输出
+将逐批产出的结果行编码为 NDJSON：每行一个 JSON 对象，
+最后一行是 {"__summary__": {...}} 汇总记录（行数、耗时、是否成功）
+"""
+import json
+import logging
+import time
+from datetime import date, datetime, time as dt_time
+from decimal import Decimal
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from uuid import UUID
+
+logger = logging.getLogger(__name__)
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+SUMMARY_KEY = '__summary__'
+
+
+def _json_default(value: Any) -> Any:
+    """数据库类型的 JSON 编码"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date, dt_time)):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, (bytes, memoryview)):
+        return bytes(value).hex()
+    return str(value)
+
+
+def _dumps(obj: Any) -> str:
+    return json.dumps(obj, ensure_ascii=False, default=_json_default, separators=(',', ':'))
+
+
+def iter_ndjson(batches: Iterable[List[Dict[str, Any]]], sql: Optional[str] = None,
+                extra_summary: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+    """
+    将结果批次编码为 NDJSON 文本块
+
+    每批输出一个文本块（而不是每行一次 yield），减少 WSGI 写调用次数；
+    迭代中途出错时输出 success=false 的汇总记录，客户端据此判断结果不完整
+
+    Args:
+        batches: 逐批产出结果行的迭代器
+        sql: 执行的 SQL（写入汇总记录）
+        extra_summary: 附加到汇总记录的字段
+
+    Yields:
+        以换行结尾的 NDJSON 文本块
+    """
+    start = time.time()
+    rows = 0
+    summary: Dict[str, Any] = {'success': True}
+    try:
+        for batch in batches:
+            if not batch:
+                continue
+            rows += len(batch)
+            yield ''.join(_dumps(row) + '\n' for row in batch)
+    except Exception as e:
+        logger.error(f"Streaming query failed after {rows} rows: {e}")
+        summary = {'success': False, 'error': str(e)}
+    finally:
+        close = getattr(batches, 'close', None)
+        if close is not None:
+            close()
+
+    summary.update({
+        'rows_count': rows,
+        'elapsed_ms': round((time.time() - start) * 1000, 2),
+        'sql': sql
+    })
+    if extra_summary:
+        summary.update(extra_summary)
+    yield _dumps({SUMMARY_KEY: summary}) + '\n'
@@ -2,8 +2,12 @@
 Schema 语义标注服务
 用于对数据库 schema 进行 LLM 自动标注和手动审核
 """
+import hashlib
 import logging
 import json
+import os
+import threading
+import time
 from typing import Dict, List, Any, Optional
 from datetime import datetime
 from app.services.supabase_client import get_supabase_client
@@ -19,6 +23,11 @@ class SchemaAnnotator:
     SCHEMA_TABLES_TABLE = "schema_table_annotations"
     SCHEMA_COLUMNS_TABLE = "schema_column_annotations"
     SCHEMA_RELATIONS_TABLE = "schema_relation_annotations"
+    _ANNOTATION_TABLES = {
+        "table": SCHEMA_TABLES_TABLE,
+        "column": SCHEMA_COLUMNS_TABLE,
+        "relation": SCHEMA_RELATIONS_TABLE
+    }
     
     def __init__(self, supabase_client=None):
         """初始化标注器
@@ -28,6 +37,15 @@ class SchemaAnnotator:
         """
         self.supabase = supabase_client or get_supabase_client()
         self.llm = get_llm_provider()
+        
+        # 已批准元数据的增量同步状态
+        self.full_sync_interval = float(os.getenv('SCHEMA_METADATA_FULL_SYNC_SECONDS', 3600))
+        self._sync_lock = threading.Lock()
+        self._approved_rows: Dict[str, Dict[Any, Dict]] = {t: {} for t in self._ANNOTATION_TABLES}
+        self._watermarks: Dict[str, Optional[str]] = {t: None for t in self._ANNOTATION_TABLES}
+        self._last_full_sync = 0.0
+        self._metadata: Optional[Dict[str, Any]] = None
+        self._metadata_etag: Optional[str] = None
     
     def get_database_schema(self, database_name: str = None) -> Dict[str, Any]:
         """
@@ -151,7 +169,7 @@ class SchemaAnnotator:
         
         try:
             logger.info(f"Generating auto-annotation for table: {table_name}")
-            response = await self.llm.generate(prompt)
+            response = await self.llm.agenerate(prompt)
             
             # 解析 JSON 响应
             annotation = json.loads(response)
@@ -471,67 +489,167 @@ class SchemaAnnotator:
             logger.error(f"Failed to update annotation: {str(e)}")
             raise
     
-    def get_approved_schema_metadata(self) -> Dict[str, Any]:
+    def _fetch_annotation_rows(self, annotation_type: str, since: Optional[str] = None) -> List[Dict]:
+        """
+        读取标注行
+        
+        Args:
+            annotation_type: 标注类型 (table, column, relation)
+            since: 水位线；为 None 时读取全部已批准的行，
+                否则读取 updated_at >= since 的所有状态的行（用于发现被驳回的标注）
+        """
+        table_name = self._ANNOTATION_TABLES[annotation_type]
+        query = self.supabase.table(table_name).select("*")
+        if since is None:
+            query = query.eq("status", "approved")
+        else:
+            query = query.gte("updated_at", since)
+        return query.execute().data or []
+    
+    @staticmethod
+    def _row_key(annotation_type: str, row: Dict[str, Any]):
+        """标注行在缓存中的键"""
+        if annotation_type == "table":
+            return row.get("table_name")
+        if annotation_type == "column":
+            return (row.get("table_name"), row.get("column_name"))
+        return (row.get("source_table"), row.get("source_column"),
+                row.get("target_table"), row.get("target_column"))
+    
+    def _build_metadata(self) -> Dict[str, Any]:
+        """由缓存的已批准行构建元数据结构"""
+        metadata = {
+            "tables": {},
+            "columns": {},
+            "relations": [],
+            "last_updated": datetime.utcnow().isoformat()
+        }
+        
+        # 整理表数据
+        for table_name, table in self._approved_rows["table"].items():
+            metadata["tables"][table_name] = {
+                "name_cn": table.get("table_name_cn"),
+                "description_cn": table.get("description_cn"),
+                "description_en": table.get("description_en"),
+                "business_meaning": table.get("business_meaning"),
+                "use_case": table.get("use_case")
+            }
+        
+        # 整理列数据
+        for (table_name, column_name), column in self._approved_rows["column"].items():
+            metadata["columns"].setdefault(table_name, {})[column_name] = {
+                "name_cn": column.get("column_name_cn"),
+                "data_type": column.get("data_type"),
+                "description_cn": column.get("description_cn"),
+                "description_en": column.get("description_en"),
+                "example": column.get("example_value"),
+                "business_meaning": column.get("business_meaning"),
+                "range": column.get("value_range")
+            }
+        
+        # 整理关系数据（外键），用于 schema 检索时扩展关联表
+        for relation in self._approved_rows["relation"].values():
+            metadata["relations"].append({
+                "source_table": relation.get("source_table"),
+                "source_column": relation.get("source_column"),
+                "target_table": relation.get("target_table"),
+                "target_column": relation.get("target_column"),
+                "relation_type": relation.get("relation_type"),
+                "relation_name": relation.get("relation_name"),
+                "description_cn": relation.get("description_cn")
+            })
+        
+        return metadata
+    
+    def _full_sync(self) -> None:
+        """全量读取已批准的标注，重置水位线"""
+        for annotation_type in self._ANNOTATION_TABLES:
+            rows = self._fetch_annotation_rows(annotation_type)
+            self._approved_rows[annotation_type] = {
+                self._row_key(annotation_type, row): row for row in rows
+            }
+            self._watermarks[annotation_type] = max(
+                (row["updated_at"] for row in rows if row.get("updated_at")), default=None
+            )
+        self._last_full_sync = time.monotonic()
+    
+    def _incremental_sync(self) -> bool:
+        """
+        只读取水位线之后更新的行并合并
+        
+        使用 >= 比较：与水位线同一时刻写入的行会被重复读取，但合并是幂等的，不会遗漏
+        
+        Returns:
+            已批准的标注是否发生变化
+        """
+        changed = False
+        for annotation_type in self._ANNOTATION_TABLES:
+            rows = self._fetch_annotation_rows(annotation_type, since=self._watermarks[annotation_type])
+            approved = self._approved_rows[annotation_type]
+            for row in rows:
+                key = self._row_key(annotation_type, row)
+                if row.get("status") == "approved":
+                    if approved.get(key) != row:
+                        approved[key] = row
+                        changed = True
+                elif key in approved:
+                    # 被驳回或改回待审核的标注从元数据中移除
+                    del approved[key]
+                    changed = True
+                if row.get("updated_at") and row["updated_at"] > (self._watermarks[annotation_type] or ""):
+                    self._watermarks[annotation_type] = row["updated_at"]
+        return changed
+    
+    def get_approved_schema_metadata(self, incremental: bool = True) -> Dict[str, Any]:
         """
         获取所有已审核通过的 schema 元数据
         用于改进 NL2SQL 的理解
         
+        首次调用全量读取；之后按 updated_at 水位线增量同步并合并到缓存中。
+        物理删除的行无法通过水位线发现，因此每隔 SCHEMA_METADATA_FULL_SYNC_SECONDS 做一次全量同步
+        
+        Args:
+            incremental: 为 False 时强制全量同步
+        
         Returns:
-            完整的 schema 元数据
+            完整的 schema 元数据（内容未变化时返回同一个对象，调用方不应修改）
         """
         try:
-            # 获取已审核的表标注
-            tables_result = self.supabase.table(self.SCHEMA_TABLES_TABLE).select("*").eq(
-                "status", "approved"
-            ).execute()
-            
-            # 获取已审核的列标注
-            columns_result = self.supabase.table(self.SCHEMA_COLUMNS_TABLE).select("*").eq(
-                "status", "approved"
-            ).execute()
-            
-            # 构建元数据结构
-            metadata = {
-                "tables": {},
-                "columns": {},
-                "last_updated": datetime.utcnow().isoformat()
-            }
-            
-            # 整理表数据
-            for table in tables_result.data or []:
-                table_name = table.get("table_name")
-                metadata["tables"][table_name] = {
-                    "name_cn": table.get("table_name_cn"),
-                    "description_cn": table.get("description_cn"),
-                    "description_en": table.get("description_en"),
-                    "business_meaning": table.get("business_meaning"),
-                    "use_case": table.get("use_case")
-                }
-            
-            # 整理列数据
-            for column in columns_result.data or []:
-                table_name = column.get("table_name")
-                column_name = column.get("column_name")
-                
-                if table_name not in metadata["columns"]:
-                    metadata["columns"][table_name] = {}
+            with self._sync_lock:
+                full = (
+                    not incremental
+                    or self._metadata is None
+                    or time.monotonic() - self._last_full_sync >= self.full_sync_interval
+                )
+                if full:
+                    self._full_sync()
+                    changed = True
+                else:
+                    changed = self._incremental_sync()
                 
-                metadata["columns"][table_name][column_name] = {
-                    "name_cn": column.get("column_name_cn"),
-                    "data_type": column.get("data_type"),
-                    "description_cn": column.get("description_cn"),
-                    "description_en": column.get("description_en"),
-                    "example": column.get("example_value"),
-                    "business_meaning": column.get("business_meaning"),
-                    "range": column.get("value_range")
-                }
-            
-            logger.info(f"✅ Schema metadata retrieved: {len(metadata['tables'])} tables, "
-                       f"{len(metadata['columns'])} tables with columns")
-            return metadata
+                if changed:
+                    metadata = self._build_metadata()
+                    etag = self._content_hash(metadata)
+                    if etag != self._metadata_etag:
+                        self._metadata = metadata
+                        self._metadata_etag = etag
+                    logger.info(f"✅ Schema metadata {'full' if full else 'incremental'} sync: "
+                               f"{len(self._metadata['tables'])} tables, "
+                               f"{len(self._metadata['columns'])} tables with columns")
+                return self._metadata
         except Exception as e:
             logger.error(f"Failed to get approved schema metadata: {str(e)}")
-            return {}
+            return self._metadata or {}
+    
+    def get_metadata_etag(self) -> Optional[str]:
+        """当前元数据的 ETag（内容哈希，忽略 last_updated）"""
+        return self._metadata_etag
+    
+    @staticmethod
+    def _content_hash(metadata: Dict[str, Any]) -> str:
+        content = {k: v for k, v in metadata.items() if k != "last_updated"}
+        raw = json.dumps(content, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
 
 
 # 创建全局实例
@@ -0,0 +1,133 @@
+"""
+Schema 名称索引
+元数据加载时一次性构建中文名/同义词到表名、列名的哈希索引，
+使实体到 schema 的解析为 O(1) 查找
+"""
+import json
+import logging
+import re
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r'\s+')
+_SYNONYM_SEPARATORS = re.compile(r'[,，、;；|]')
+
+
+def normalize_name(name: Optional[str]) -> str:
+    """
+    名称规范化：NFKC（全角转半角）、大小写折叠、去除所有空白
+    例如 "ＯＥＥ 记录" 与 "oee记录" 规范化后相同
+    """
+    if not name:
+        return ''
+    return _WHITESPACE.sub('', unicodedata.normalize('NFKC', str(name)).casefold())
+
+
+def _as_list(value: Any) -> List[str]:
+    """同义词字段既可以是列表也可以是逗号/顿号分隔的字符串"""
+    if not value:
+        return []
+    if isinstance(value, str):
+        return [v.strip() for v in _SYNONYM_SEPARATORS.split(value) if v.strip()]
+    return [str(v) for v in value if v]
+
+
+def load_synonyms(path: Optional[str]) -> Dict[str, Any]:
+    """
+    加载同义词配置文件
+
+    格式:
+        {
+            "tables": {"oee_records": ["OEE表", "效率记录"]},
+            "columns": {"oee_records": {"oee": ["效率", "综合效率"]}}
+        }
+    """
+    if not path:
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        logger.warning(f"Schema synonyms file not found: {path}")
+    except Exception as e:
+        logger.warning(f"Failed to load schema synonyms from {path}: {e}")
+    return {}
+
+
+class SchemaNameIndex:
+    """中文名/同义词 -> 表名、列名的哈希索引"""
+
+    def __init__(self, metadata: Dict[str, Any], synonyms: Optional[Dict[str, Any]] = None):
+        """
+        构建索引
+
+        每张表/列的可查找名称包括：英文名、name_cn、元数据中的 synonyms 字段
+        以及同义词配置文件中的条目；均以 normalize_name 规范化后作为键。
+        同一名称对应多个目标时保留先出现的一个
+
+        Args:
+            metadata: 已批准的 schema 元数据
+            synonyms: 同义词配置（见 load_synonyms）
+        """
+        synonyms = synonyms or {}
+        table_synonyms = synonyms.get('tables', {}) or {}
+        column_synonyms = synonyms.get('columns', {}) or {}
+
+        tables = metadata.get('tables', {}) or {}
+        columns = metadata.get('columns', {}) or {}
+
+        self.tables: Dict[str, str] = {}
+        self.columns: Dict[Tuple[str, str], str] = {}
+        # 不指定表时按列名解析：规范化名称 -> [(表名, 列名)]
+        self.columns_by_name: Dict[str, List[Tuple[str, str]]] = {}
+
+        for table_name, info in tables.items():
+            info = info or {}
+            names = [table_name, info.get('name_cn')]
+            names += _as_list(info.get('synonyms')) + _as_list(table_synonyms.get(table_name))
+            self._add(self.tables, names, table_name)
+
+        for table_name, cols in columns.items():
+            extra = column_synonyms.get(table_name, {}) or {}
+            for column_name, info in (cols or {}).items():
+                info = info or {}
+                names = [column_name, info.get('name_cn')]
+                names += _as_list(info.get('synonyms')) + _as_list(extra.get(column_name))
+                for key in {normalize_name(n) for n in names if n}:
+                    self.columns.setdefault((table_name, key), column_name)
+                    self.columns_by_name.setdefault(key, []).append((table_name, column_name))
+
+        # 预先计算摘要统计
+        self.column_count_by_table = {
+            table: len(columns.get(table, {}) or {}) for table in tables
+        }
+        self.summary = {
+            'tables': len(tables),
+            'columns': sum(len(cols or {}) for cols in columns.values()),
+            'table_names': list(tables.keys()),
+            'column_count_by_table': self.column_count_by_table
+        }
+
+    @staticmethod
+    def _add(index: Dict[str, str], names: Iterable[Optional[str]], target: str) -> None:
+        for name in names:
+            key = normalize_name(name)
+            if not key:
+                continue
+            existing = index.setdefault(key, target)
+            if existing != target:
+                logger.debug(f"Schema name '{name}' maps to both {existing} and {target}, keeping {existing}")
+
+    def table(self, name: str) -> Optional[str]:
+        """按中文名、英文名或同义词查找表名"""
+        return self.tables.get(normalize_name(name))
+
+    def column(self, table_name: str, name: str) -> Optional[str]:
+        """在指定表中按中文名、英文名或同义词查找列名"""
+        return self.columns.get((table_name, normalize_name(name)))
+
+    def find_columns(self, name: str) -> List[Tuple[str, str]]:
+        """不指定表时查找所有匹配的 (表名, 列名)"""
+        return list(self.columns_by_name.get(normalize_name(name), []))
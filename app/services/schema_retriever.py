@@ -0,0 +1,231 @@
+"""
+Schema 检索服务
+为每个问题从已批准的元数据中挑选最相关的表和列：
+- 基于 BM25 的词法检索（表名、中文名、描述、业务含义）
+- 沿已标注的外键关系扩展关联表
+- 按 token 预算裁剪，避免大 schema 撑爆提示词
+"""
+import logging
+import math
+import os
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_CJK_RUN = re.compile(r'[一-鿿]+')
+_WORD = re.compile(r'[a-z0-9]+(?:_[a-z0-9]+)*')
+
+# 表名、中文名等“名称”字段在索引中的权重（重复次数）
+NAME_WEIGHT = 3
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """
+    分词：英文按单词（下划线标识符同时保留整体和各部分），
+    中文按二元组（单字词保留单字），无需分词词典
+    """
+    if not text:
+        return []
+    text = str(text).lower()
+    tokens: List[str] = []
+    for run in _CJK_RUN.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    for word in _WORD.findall(text):
+        tokens.append(word)
+        if '_' in word:
+            tokens.extend(part for part in word.split('_') if part)
+    return tokens
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算 token 数：中文约 1 字 1 token，其余约 4 字符 1 token"""
+    cjk = sum(len(run) for run in _CJK_RUN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+class BM25Index:
+    """Okapi BM25 倒排索引"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[Any, int]] = {}
+        self._lengths: Dict[Any, int] = {}
+        self._avg_length = 0.0
+
+    def build(self, documents: Iterable[Tuple[Any, List[str]]]) -> 'BM25Index':
+        """构建索引，documents 为 (文档 id, token 列表)"""
+        self._postings = {}
+        self._lengths = {}
+        for doc_id, tokens in documents:
+            self._lengths[doc_id] = len(tokens)
+            for token, tf in Counter(tokens).items():
+                self._postings.setdefault(token, {})[doc_id] = tf
+        self._avg_length = (sum(self._lengths.values()) / len(self._lengths)) if self._lengths else 0.0
+        return self
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def score(self, query_tokens: Iterable[str]) -> Dict[Any, float]:
+        """计算查询与所有命中文档的 BM25 分数"""
+        n = len(self._lengths)
+        scores: Dict[Any, float] = {}
+        for token in set(query_tokens):
+            postings = self._postings.get(token)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, tf in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[doc_id] / (self._avg_length or 1))
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+
+@dataclass
+class SchemaSelection:
+    """检索结果：按相关度排序的表及每张表选中的列"""
+    tables: List[str] = field(default_factory=list)
+    columns: Dict[str, List[str]] = field(default_factory=dict)
+    scores: Dict[str, float] = field(default_factory=dict)
+    expanded: List[str] = field(default_factory=list)  # 通过外键扩展加入的表
+
+
+class SchemaRetriever:
+    """基于 BM25 + 外键扩展的 schema 检索器"""
+
+    def __init__(self, metadata: Dict[str, Any], top_k_tables: int = 8,
+                 top_k_columns: int = 12, expand_relations: bool = True):
+        """
+        初始化检索器并构建索引
+
+        Args:
+            metadata: get_approved_schema_metadata() 返回的元数据
+            top_k_tables: 检索命中的最大表数（不含外键扩展的表）
+            top_k_columns: 每张表最多保留的列数
+            expand_relations: 是否沿外键关系扩展关联表
+        """
+        self.tables: Dict[str, Dict[str, Any]] = metadata.get('tables', {}) or {}
+        self.columns: Dict[str, Dict[str, Dict[str, Any]]] = metadata.get('columns', {}) or {}
+        self.top_k_tables = top_k_tables
+        self.top_k_columns = top_k_columns
+        self.expand_relations = expand_relations
+
+        # table -> [(关联表, 本表列, 关联表列)]
+        self.relations: Dict[str, List[Tuple[str, str, str]]] = {}
+        for rel in metadata.get('relations', []) or []:
+            source, target = rel.get('source_table'), rel.get('target_table')
+            if not source or not target:
+                continue
+            self.relations.setdefault(source, []).append(
+                (target, rel.get('source_column'), rel.get('target_column'))
+            )
+            self.relations.setdefault(target, []).append(
+                (source, rel.get('target_column'), rel.get('source_column'))
+            )
+
+        self.table_index = BM25Index().build(
+            (name, self._table_tokens(name, info)) for name, info in self.tables.items()
+        )
+        self.column_index = BM25Index().build(
+            ((table, column), self._column_tokens(column, info))
+            for table, cols in self.columns.items()
+            for column, info in cols.items()
+        )
+
+    @staticmethod
+    def _table_tokens(name: str, info: Dict[str, Any]) -> List[str]:
+        tokens = (tokenize(name) + tokenize(info.get('name_cn'))) * NAME_WEIGHT
+        for key in ('description_cn', 'description_en', 'business_meaning', 'use_case'):
+            tokens += tokenize(info.get(key))
+        return tokens
+
+    @staticmethod
+    def _column_tokens(name: str, info: Dict[str, Any]) -> List[str]:
+        tokens = (tokenize(name) + tokenize(info.get('name_cn'))) * NAME_WEIGHT
+        for key in ('description_cn', 'description_en', 'business_meaning'):
+            tokens += tokenize(info.get(key))
+        return tokens
+
+    def retrieve(self, question: str) -> SchemaSelection:
+        """
+        检索与问题相关的表和列
+
+        表得分 = 表文档得分 + 该表最佳列得分的一半（问题只提到列名时也能找到表）
+
+        Args:
+            question: 用户的自然语言问题
+
+        Returns:
+            SchemaSelection；没有任何命中时 tables 为空
+        """
+        query_tokens = tokenize(question)
+        table_scores = self.table_index.score(query_tokens)
+        column_scores = self.column_index.score(query_tokens)
+
+        best_column: Dict[str, float] = {}
+        for (table, _), score in column_scores.items():
+            best_column[table] = max(best_column.get(table, 0.0), score)
+        combined = {
+            table: table_scores.get(table, 0.0) + 0.5 * best_column.get(table, 0.0)
+            for table in set(table_scores) | set(best_column)
+            if table in self.tables
+        }
+
+        ranked = sorted(combined, key=lambda t: (-combined[t], t))[:self.top_k_tables]
+        selection = SchemaSelection(tables=list(ranked), scores={t: combined[t] for t in ranked})
+
+        # 外键扩展：加入一跳关联表，保证 LLM 能写出 JOIN 条件
+        join_columns: Dict[str, List[str]] = {}
+        if self.expand_relations:
+            for table in ranked:
+                for related, own_col, related_col in self.relations.get(table, []):
+                    join_columns.setdefault(table, []).append(own_col)
+                    if related not in self.tables:
+                        continue
+                    join_columns.setdefault(related, []).append(related_col)
+                    if related not in selection.tables:
+                        selection.tables.append(related)
+                        selection.expanded.append(related)
+
+        for table in selection.tables:
+            selection.columns[table] = self._select_columns(
+                table, column_scores, join_columns.get(table, [])
+            )
+        return selection
+
+    def _select_columns(self, table: str, column_scores: Dict[Tuple[str, str], float],
+                        join_columns: List[str]) -> List[str]:
+        """选择表的列：命中列优先，其次是连接列，剩余名额按标注顺序补齐"""
+        all_columns = list(self.columns.get(table, {}).keys())
+        if len(all_columns) <= self.top_k_columns:
+            return all_columns
+
+        matched = sorted(
+            (col for col in all_columns if (table, col) in column_scores),
+            key=lambda col: -column_scores[(table, col)]
+        )
+        chosen: List[str] = []
+        for col in matched + [c for c in join_columns if c] + all_columns:
+            if col in all_columns and col not in chosen:
+                chosen.append(col)
+            if len(chosen) >= self.top_k_columns:
+                break
+        # 保持原始列顺序，便于阅读
+        return [col for col in all_columns if col in chosen]
+
+
+def get_schema_retrieval_config() -> Dict[str, Any]:
+    """读取 schema 检索相关的环境变量配置"""
+    return {
+        'enabled': os.getenv('SCHEMA_RETRIEVAL_ENABLED', 'true').lower() in ('1', 'true', 'yes'),
+        'top_k_tables': int(os.getenv('SCHEMA_RETRIEVAL_TOP_K_TABLES', 8)),
+        'top_k_columns': int(os.getenv('SCHEMA_RETRIEVAL_TOP_K_COLUMNS', 12)),
+        'token_budget': int(os.getenv('SCHEMA_PROMPT_TOKEN_BUDGET', 3000))
+    }
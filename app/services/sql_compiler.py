@@ -0,0 +1,332 @@
+"""
+MES 指标 SQL 编译器
+将高置信度的结构化意图（指标、时间范围、设备、产线、条数）
+基于已审核的 schema 标注直接编译为参数化 SQL，无需调用 LLM
+"""
+import calendar
+import logging
+import os
+import re
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+_NUMERIC_RANGE = re.compile(r'^(\d+)\s*(天|周|月)$')
+
+# 指标 -> (候选列名, 中文标注关键词)
+METRIC_COLUMN_HINTS: Dict[str, Tuple[List[str], List[str]]] = {
+    'oee': (['oee', 'oee_rate', 'oee_value'], ['OEE', '综合效率']),
+    'yield_rate': (['yield_rate', 'pass_rate', 'yield'], ['良率', '良品率', '合格率']),
+    'output_qty': (['output_qty', 'output_quantity', 'quantity', 'produced_qty'], ['产量', '生产数量', '产出']),
+    'utilization_rate': (['utilization_rate', 'availability', 'utilization'], ['稼动率', '利用率']),
+    'efficiency': (['efficiency', 'performance', 'performance_rate'], ['效率']),
+    'downtime': (['downtime', 'downtime_minutes', 'downtime_hours', 'downtime_duration'], ['停机']),
+}
+
+# 过滤/排序用的维度列
+TIME_COLUMN_HINTS = (
+    ['record_date', 'production_date', 'date', 'recorded_at', 'record_time', 'start_date', 'created_at', 'timestamp'],
+    ['日期', '时间']
+)
+EQUIPMENT_COLUMN_HINTS = (
+    ['equipment_id', 'equipment_code', 'machine_id', 'equipment_name'],
+    ['设备']
+)
+PRODUCT_LINE_COLUMN_HINTS = (
+    ['production_line', 'product_line', 'line_id', 'line_code', 'line'],
+    ['产线', '产品线', '生产线']
+)
+
+_TIME_TYPES = ('date', 'timestamp', 'timestamptz', 'datetime', 'time')
+
+
+@dataclass
+class CompiledSQL:
+    """编译结果：带命名占位符的 SQL 及其参数"""
+    sql: str
+    params: Dict[str, Any] = field(default_factory=dict)
+    table: Optional[str] = None
+
+    def render(self) -> str:
+        """
+        将参数内联为 SQL 字面量
+        供只接受 SQL 文本的执行器和前端展示使用
+        """
+        return self.sql % {name: _to_literal(value) for name, value in self.params.items()}
+
+
+def _to_literal(value: Any) -> str:
+    """将参数值转换为安全的 SQL 字面量"""
+    if value is None:
+        return 'NULL'
+    if isinstance(value, bool):
+        return 'TRUE' if value else 'FALSE'
+    if isinstance(value, (int, float)):
+        return str(value)
+    if isinstance(value, date):
+        return f"'{value.isoformat()}'"
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+class MetricSQLCompiler:
+    """基于规则和模板的意图 -> SQL 编译器"""
+
+    def __init__(self, enabled: bool = True, min_confidence: float = 0.8, default_limit: int = 100):
+        """
+        初始化编译器
+
+        Args:
+            enabled: 是否启用编译器（关闭时全部交给 LLM）
+            min_confidence: 意图置信度低于该值时不编译
+            default_limit: 未指定条数时的默认 LIMIT
+        """
+        self.enabled = enabled
+        self.min_confidence = min_confidence
+        self.default_limit = default_limit
+
+    def compile(self, query_intent: Any, metadata: Dict[str, Any],
+                today: Optional[date] = None) -> Optional[CompiledSQL]:
+        """
+        编译查询意图
+
+        Args:
+            query_intent: UnifiedQueryService 的 QueryIntent
+            metadata: 已审核的 schema 元数据（SchemaAnnotator.get_approved_schema_metadata 的结构）
+            today: 计算时间范围的基准日期，默认当天
+
+        Returns:
+            CompiledSQL；无法确定地编译时返回 None，由调用方回退到 LLM
+        """
+        if not self.enabled or not metadata:
+            return None
+        if (query_intent.confidence or 0) < self.min_confidence:
+            return None
+        # 对比分析需要聚合和分组，交给 LLM
+        if query_intent.comparison:
+            return None
+
+        metrics = query_intent.metrics or ([query_intent.metric] if query_intent.metric else [])
+        try:
+            if metrics:
+                return self._compile_metric_query(query_intent, metrics, metadata, today or date.today())
+            if query_intent.table_name:
+                return self._compile_table_query(query_intent, metadata, today or date.today())
+        except Exception as e:
+            logger.warning(f"SQL compiler failed, falling back to LLM: {e}")
+        return None
+
+    def _compile_metric_query(self, query_intent: Any, metrics: List[str],
+                              metadata: Dict[str, Any], today: date) -> Optional[CompiledSQL]:
+        """编译指标查询：所有指标必须能解析到同一张表"""
+        columns = metadata.get('columns', {})
+
+        table = None
+        metric_columns = []
+        for metric in metrics:
+            hints = METRIC_COLUMN_HINTS.get(metric)
+            if hints is None:
+                return None
+            resolved = self._resolve_column(columns, hints, table)
+            if resolved is None:
+                return None
+            table, column = resolved
+            if column not in metric_columns:
+                metric_columns.append(column)
+
+        table_columns = columns.get(table, {})
+        time_column = self._find_column(table_columns, TIME_COLUMN_HINTS, time_only=True)
+        equipment_column = self._find_column(table_columns, EQUIPMENT_COLUMN_HINTS)
+        line_column = self._find_column(table_columns, PRODUCT_LINE_COLUMN_HINTS)
+
+        select_columns = [c for c in (time_column, equipment_column, line_column) if c]
+        select_columns += [c for c in metric_columns if c not in select_columns]
+
+        return self._build(query_intent, table, select_columns, time_column,
+                           equipment_column, line_column, today)
+
+    def _compile_table_query(self, query_intent: Any, metadata: Dict[str, Any],
+                             today: date) -> Optional[CompiledSQL]:
+        """编译直接表查询（表名可以是英文名或中文标注名）"""
+        table = self._resolve_table(query_intent.table_name, metadata)
+        if table is None:
+            return None
+
+        table_columns = metadata.get('columns', {}).get(table, {})
+        time_column = self._find_column(table_columns, TIME_COLUMN_HINTS, time_only=True)
+        equipment_column = self._find_column(table_columns, EQUIPMENT_COLUMN_HINTS)
+        line_column = self._find_column(table_columns, PRODUCT_LINE_COLUMN_HINTS)
+
+        return self._build(query_intent, table, [], time_column,
+                           equipment_column, line_column, today)
+
+    def _build(self, query_intent: Any, table: str, select_columns: List[str],
+               time_column: Optional[str], equipment_column: Optional[str],
+               line_column: Optional[str], today: date) -> Optional[CompiledSQL]:
+        """拼装 SQL；意图中的过滤条件找不到对应列时放弃编译，避免静默丢条件"""
+        identifiers = [table] + select_columns + [c for c in (time_column, equipment_column, line_column) if c]
+        if not all(_IDENTIFIER.match(name) for name in identifiers):
+            return None
+
+        conditions = []
+        params: Dict[str, Any] = {}
+
+        if query_intent.time_range:
+            bounds = self.resolve_time_range(query_intent.time_range, today)
+            if bounds is None or time_column is None:
+                return None
+            params['start_date'], params['end_date'] = bounds
+            conditions.append(f"{time_column} >= %(start_date)s")
+            conditions.append(f"{time_column} < %(end_date)s")
+
+        if query_intent.equipment:
+            if equipment_column is None:
+                return None
+            equipment = list(query_intent.equipment)
+            if len(equipment) == 1:
+                params['equipment'] = equipment[0]
+                conditions.append(f"{equipment_column} = %(equipment)s")
+            else:
+                placeholders = []
+                for i, value in enumerate(equipment):
+                    params[f'equipment_{i}'] = value
+                    placeholders.append(f"%(equipment_{i})s")
+                conditions.append(f"{equipment_column} IN ({', '.join(placeholders)})")
+
+        if query_intent.product_line:
+            if line_column is None:
+                return None
+            params['product_line'] = query_intent.product_line
+            conditions.append(f"{line_column} = %(product_line)s")
+
+        sql = f"SELECT {', '.join(select_columns) if select_columns else '*'} FROM {table}"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        if time_column:
+            sql += f" ORDER BY {time_column} DESC"
+        params['limit'] = int(query_intent.limit or self.default_limit)
+        sql += " LIMIT %(limit)s"
+
+        return CompiledSQL(sql=sql, params=params, table=table)
+
+    @staticmethod
+    def resolve_time_range(time_range: str, today: date) -> Optional[Tuple[date, date]]:
+        """
+        将意图识别的时间范围转换为左闭右开的日期区间
+
+        Args:
+            time_range: today / yesterday / this_week / last_week / this_month / last_month / N天 / N周 / N月
+            today: 基准日期
+
+        Returns:
+            (start, end)；无法识别时返回 None
+        """
+        tomorrow = today + timedelta(days=1)
+        if time_range == 'today':
+            return today, tomorrow
+        if time_range == 'yesterday':
+            return today - timedelta(days=1), today
+        if time_range == 'this_week':
+            return today - timedelta(days=today.weekday()), tomorrow
+        if time_range == 'last_week':
+            monday = today - timedelta(days=today.weekday())
+            return monday - timedelta(days=7), monday
+        if time_range == 'this_month':
+            return today.replace(day=1), tomorrow
+        if time_range == 'last_month':
+            first = today.replace(day=1)
+            return _shift_months(first, -1), first
+
+        match = _NUMERIC_RANGE.match(time_range or '')
+        if match:
+            number, unit = int(match.group(1)), match.group(2)
+            if unit == '天':
+                return tomorrow - timedelta(days=number), tomorrow
+            if unit == '周':
+                return tomorrow - timedelta(weeks=number), tomorrow
+            return _shift_months(tomorrow, -number), tomorrow
+        return None
+
+    def _resolve_column(self, columns: Dict[str, Dict[str, Any]],
+                        hints: Tuple[List[str], List[str]],
+                        table: Optional[str]) -> Optional[Tuple[str, str]]:
+        """在（指定的或全部）表中查找指标列，优先列名精确匹配，其次中文标注匹配"""
+        tables = [table] if table else sorted(columns.keys())
+        for match_label in (False, True):
+            for candidate_table in tables:
+                column = self._find_column(columns.get(candidate_table, {}), hints,
+                                           match_label=match_label)
+                if column:
+                    return candidate_table, column
+        return None
+
+    @staticmethod
+    def _find_column(table_columns: Dict[str, Dict[str, Any]], hints: Tuple[List[str], List[str]],
+                     time_only: bool = False, match_label: Optional[bool] = None) -> Optional[str]:
+        """
+        按候选列名 / 中文标注查找列
+
+        Args:
+            table_columns: 表的列标注
+            hints: (候选列名, 中文关键词)
+            time_only: 只接受日期/时间类型（或类型未知）的列
+            match_label: None 表示两种方式都尝试；False 只按列名；True 只按中文标注
+        """
+        names, labels = hints
+
+        def acceptable(info: Dict[str, Any]) -> bool:
+            if not time_only:
+                return True
+            data_type = (info.get('data_type') or '').lower()
+            return not data_type or any(t in data_type for t in _TIME_TYPES)
+
+        if match_label is not True:
+            for name in names:
+                info = table_columns.get(name)
+                if info is not None and acceptable(info or {}):
+                    return name
+        if match_label is not False:
+            for column, info in table_columns.items():
+                info = info or {}
+                text = ' '.join(str(info.get(k) or '') for k in ('name_cn', 'description_cn'))
+                if any(label.lower() in text.lower() for label in labels) and acceptable(info):
+                    return column
+        return None
+
+    @staticmethod
+    def _resolve_table(name: str, metadata: Dict[str, Any]) -> Optional[str]:
+        """将意图中的表名（英文或中文标注名）解析为真实表名"""
+        tables = metadata.get('tables', {})
+        known = set(tables.keys()) | set(metadata.get('columns', {}).keys())
+        if name in known:
+            return name
+        for table, info in tables.items():
+            if (info or {}).get('name_cn') == name:
+                return table
+        return None
+
+
+def _shift_months(day: date, months: int) -> date:
+    """按自然月平移日期，日超出目标月天数时取月末"""
+    month_index = day.year * 12 + day.month - 1 + months
+    year, month = divmod(month_index, 12)
+    month += 1
+    return day.replace(year=year, month=month, day=min(day.day, calendar.monthrange(year, month)[1]))
+
+
+# 全局实例
+_sql_compiler = None
+
+
+def get_sql_compiler() -> MetricSQLCompiler:
+    """获取 SQL 编译器单例"""
+    global _sql_compiler
+    if _sql_compiler is None:
+        _sql_compiler = MetricSQLCompiler(
+            enabled=os.getenv('SQL_COMPILER_ENABLED', 'true').lower() in ('1', 'true', 'yes'),
+            min_confidence=float(os.getenv('SQL_COMPILER_MIN_CONFIDENCE', 0.8)),
+            default_limit=int(os.getenv('SQL_COMPILER_DEFAULT_LIMIT', 100))
+        )
+    return _sql_compiler
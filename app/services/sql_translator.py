@@ -0,0 +1,629 @@
+"""
+SQL -> PostgREST 翻译器
+将受支持的 SELECT 子集解析并翻译为 PostgREST 调用，
+把列投影、过滤、排序、分页和简单聚合下推到数据库，无法翻译的语句明确拒绝
+
+支持的语法:
+    SELECT * | col [AS alias], ... | COUNT/SUM/AVG/MIN/MAX(col|*) [AS alias], ...
+    FROM [public.]table [[AS] alias]
+    [WHERE 条件 AND 条件 ...]
+        条件: col =|!=|<>|>|>=|<|<= 值, col [NOT] IN (...), col [NOT] LIKE|ILIKE '...',
+              col IS [NOT] NULL, col BETWEEN 值 AND 值
+        值: 数字, '字符串', TRUE/FALSE, CURRENT_DATE, CURRENT_TIMESTAMP, NOW(),
+            DATE '...', 以及 ± INTERVAL 'n day|week|month|hour|minute'
+    [ORDER BY col [ASC|DESC] [NULLS FIRST|LAST], ...]
+    [LIMIT n] [OFFSET n]
+"""
+import calendar
+import logging
+import re
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class SQLTranslationError(ValueError):
+    """SQL 超出可翻译子集"""
+
+
+_TOKEN = re.compile(r"""
+    (?P<ws>\s+)
+  | (?P<string>'(?:[^']|'')*')
+  | (?P<number>\d+(?:\.\d+)?)
+  | (?P<quoted>"[^"]+")
+  | (?P<ident>[A-Za-z_][A-Za-z0-9_]*)
+  | (?P<op><=|>=|<>|!=|::|[=<>(),.*;+-])
+""", re.VERBOSE)
+
+_COMPARISONS = {'=': 'eq', '!=': 'neq', '<>': 'neq', '>': 'gt', '>=': 'gte', '<': 'lt', '<=': 'lte'}
+_AGGREGATES = ('COUNT', 'SUM', 'AVG', 'MIN', 'MAX')
+_UNSUPPORTED = {
+    'JOIN': 'JOIN', 'GROUP': 'GROUP BY', 'HAVING': 'HAVING', 'UNION': 'UNION',
+    'DISTINCT': 'DISTINCT', 'WITH': 'WITH', 'OR': 'OR 条件', 'EXISTS': '子查询',
+    'INTERSECT': 'INTERSECT', 'EXCEPT': 'EXCEPT', 'CASE': 'CASE', 'WINDOW': '窗口函数'
+}
+_KEYWORDS = {'FROM', 'WHERE', 'ORDER', 'LIMIT', 'OFFSET', 'AS', 'AND', 'ASC', 'DESC',
+             'NULLS', 'FIRST', 'LAST', 'BY', 'SELECT'} | set(_UNSUPPORTED)
+
+
+@dataclass
+class Aggregate:
+    """聚合列"""
+    func: str               # count / sum / avg / min / max
+    column: Optional[str]   # None 表示 COUNT(*)
+    alias: str
+
+
+@dataclass
+class Filter:
+    """PostgREST 过滤条件"""
+    op: str                 # eq / neq / gt / gte / lt / lte / in_ / like / ilike / is_
+    column: str
+    value: Any
+    negate: bool = False
+
+
+@dataclass
+class PostgRESTQuery:
+    """翻译后的 PostgREST 查询"""
+    table: str
+    columns: List[str] = field(default_factory=list)
+    filters: List[Filter] = field(default_factory=list)
+    order: List[Tuple[str, bool, bool]] = field(default_factory=list)  # (列, desc, nullsfirst)
+    limit: Optional[int] = None
+    offset: Optional[int] = None
+    aggregates: List[Aggregate] = field(default_factory=list)
+
+    @property
+    def select_clause(self) -> str:
+        return ','.join(self.columns) if self.columns else '*'
+
+    def to_query_string(self) -> str:
+        """PostgREST URL 形式的描述（用于日志和调试）"""
+        parts = []
+        if self.aggregates:
+            parts.append('aggregate=' + ','.join(
+                f"{a.alias}:{a.func}({a.column or '*'})" for a in self.aggregates
+            ))
+        else:
+            parts.append(f"select={self.select_clause}")
+        for f in self.filters:
+            value = f.value
+            if f.op == 'in_':
+                value = '(' + ','.join(str(v) for v in value) + ')'
+            op = f.op.rstrip('_')
+            parts.append(f"{f.column}={'not.' if f.negate else ''}{op}.{value}")
+        if self.order:
+            parts.append('order=' + ','.join(
+                f"{col}{'.desc' if desc else ''}{'.nullsfirst' if nullsfirst else ''}"
+                for col, desc, nullsfirst in self.order
+            ))
+        if self.limit is not None:
+            parts.append(f"limit={self.limit}")
+        if self.offset:
+            parts.append(f"offset={self.offset}")
+        return f"{self.table}?" + '&'.join(parts)
+
+
+class _Parser:
+    """递归下降解析器"""
+
+    def __init__(self, sql: str, now: datetime):
+        self.tokens = self._tokenize(sql)
+        self.pos = 0
+        self.now = now
+        self.table: Optional[str] = None
+        self.alias: Optional[str] = None
+
+    @staticmethod
+    def _tokenize(sql: str) -> List[Tuple[str, str]]:
+        sql = re.sub(r'--[^\n]*', ' ', sql)
+        sql = re.sub(r'/\*.*?\*/', ' ', sql, flags=re.DOTALL)
+        tokens = []
+        pos = 0
+        while pos < len(sql):
+            match = _TOKEN.match(sql, pos)
+            if not match:
+                raise SQLTranslationError(f"无法解析的字符: {sql[pos:pos + 20]!r}")
+            pos = match.end()
+            kind = match.lastgroup
+            if kind == 'ws':
+                continue
+            text = match.group(kind)
+            if kind == 'quoted':
+                kind, text = 'ident', text[1:-1]
+            tokens.append((kind, text))
+        return tokens
+
+    # ---- token 工具 ----
+
+    def peek(self, offset: int = 0) -> Tuple[Optional[str], Optional[str]]:
+        index = self.pos + offset
+        return self.tokens[index] if index < len(self.tokens) else (None, None)
+
+    def peek_keyword(self, offset: int = 0) -> Optional[str]:
+        kind, text = self.peek(offset)
+        return text.upper() if kind == 'ident' else None
+
+    def accept_keyword(self, *keywords: str) -> Optional[str]:
+        keyword = self.peek_keyword()
+        if keyword in keywords:
+            self.pos += 1
+            return keyword
+        return None
+
+    def expect_keyword(self, keyword: str) -> None:
+        if not self.accept_keyword(keyword):
+            raise SQLTranslationError(f"期望 {keyword}，实际为 {self.peek()[1]!r}")
+
+    def accept_op(self, *ops: str) -> Optional[str]:
+        kind, text = self.peek()
+        if kind == 'op' and text in ops:
+            self.pos += 1
+            return text
+        return None
+
+    def expect_op(self, op: str) -> None:
+        if not self.accept_op(op):
+            raise SQLTranslationError(f"期望 {op!r}，实际为 {self.peek()[1]!r}")
+
+    def reject_unsupported(self) -> None:
+        keyword = self.peek_keyword()
+        if keyword in _UNSUPPORTED:
+            raise SQLTranslationError(f"不支持 {_UNSUPPORTED[keyword]}")
+        if keyword in ('LEFT', 'RIGHT', 'INNER', 'FULL', 'CROSS'):
+            raise SQLTranslationError("不支持 JOIN")
+
+    # ---- 语法 ----
+
+    def parse(self) -> PostgRESTQuery:
+        if self.peek_keyword() != 'SELECT':
+            raise SQLTranslationError("仅支持 SELECT 查询")
+        self.pos += 1
+        self.reject_unsupported()
+
+        # 先跳过选择列表定位 FROM，以便选择列表中的 别名.列 能被识别
+        select_start = self.pos
+        depth = 0
+        while self.peek()[0] is not None:
+            kind, text = self.peek()
+            if kind == 'op' and text == '(':
+                depth += 1
+            elif kind == 'op' and text == ')':
+                depth -= 1
+            elif depth == 0 and self.peek_keyword() == 'FROM':
+                break
+            elif depth > 0 and self.peek_keyword() == 'SELECT':
+                raise SQLTranslationError("不支持子查询")
+            self.pos += 1
+        select_end = self.pos
+        self.expect_keyword('FROM')
+        self._parse_from()
+
+        from_end = self.pos
+        self.pos = select_start
+        columns, aggregates = self._parse_select_list(select_end)
+        self.pos = from_end
+
+        query = PostgRESTQuery(table=self.table, columns=columns, aggregates=aggregates)
+
+        self.reject_unsupported()
+        if self.accept_keyword('WHERE'):
+            query.filters = self._parse_conditions()
+        self.reject_unsupported()
+        if self.accept_keyword('ORDER'):
+            self.expect_keyword('BY')
+            query.order = self._parse_order(columns)
+        self.reject_unsupported()
+        while self.peek_keyword() in ('LIMIT', 'OFFSET'):
+            if self.accept_keyword('LIMIT'):
+                query.limit = self._parse_int()
+            elif self.accept_keyword('OFFSET'):
+                query.offset = self._parse_int()
+        self.accept_op(';')
+        if self.peek()[0] is not None:
+            self.reject_unsupported()
+            raise SQLTranslationError(f"无法翻译的语句片段: {self.peek()[1]!r}")
+        return query
+
+    def _parse_from(self) -> None:
+        kind, name = self.peek()
+        if kind == 'op' and name == '(':
+            raise SQLTranslationError("不支持子查询")
+        name = self._parse_identifier()
+        if self.accept_op('.'):
+            if name.lower() != 'public':
+                raise SQLTranslationError(f"不支持 schema: {name}")
+            name = self._parse_identifier()
+        self.table = name
+
+        if self.accept_keyword('AS'):
+            self.alias = self._parse_identifier()
+        elif self.peek()[0] == 'ident' and self.peek_keyword() not in _KEYWORDS \
+                and self.peek_keyword() not in ('LEFT', 'RIGHT', 'INNER', 'FULL', 'CROSS'):
+            self.alias = self._parse_identifier()
+
+        if self.accept_op(','):
+            raise SQLTranslationError("不支持 JOIN")
+        self.reject_unsupported()
+
+    def _parse_identifier(self) -> str:
+        kind, text = self.peek()
+        if kind != 'ident':
+            raise SQLTranslationError(f"期望标识符，实际为 {text!r}")
+        self.pos += 1
+        return text
+
+    def _parse_column(self) -> str:
+        """列名，允许 表名./别名. 前缀"""
+        name = self._parse_identifier()
+        if self.accept_op('.'):
+            if name not in (self.table, self.alias):
+                raise SQLTranslationError(f"未知的表引用: {name}")
+            name = self._parse_identifier()
+        return name
+
+    def _parse_select_list(self, end: int) -> Tuple[List[str], List[Aggregate]]:
+        columns: List[str] = []
+        aggregates: List[Aggregate] = []
+        if self.accept_op('*'):
+            if self.pos != end:
+                raise SQLTranslationError("SELECT * 不能与其他列混用")
+            return columns, aggregates
+
+        while True:
+            keyword = self.peek_keyword()
+            if keyword in _AGGREGATES and self.peek(1) == ('op', '('):
+                self.pos += 2
+                self.reject_unsupported()
+                column = None if self.accept_op('*') else self._parse_column()
+                self.expect_op(')')
+                func = keyword.lower()
+                if column is None and func != 'count':
+                    raise SQLTranslationError(f"{keyword}(*) 无效")
+                alias = self._parse_alias() or (f"{func}_{column}" if column else 'count')
+                aggregates.append(Aggregate(func=func, column=column, alias=alias))
+            elif self.peek(1) == ('op', '(') and self.peek()[0] == 'ident':
+                raise SQLTranslationError(f"不支持的函数: {self.peek()[1]}")
+            else:
+                column = self._parse_column()
+                alias = self._parse_alias()
+                columns.append(f"{alias}:{column}" if alias and alias != column else column)
+            if self.pos == end:
+                break
+            self.expect_op(',')
+
+        if columns and aggregates:
+            raise SQLTranslationError("聚合与普通列混用需要 GROUP BY，不支持")
+        return columns, aggregates
+
+    def _parse_alias(self) -> Optional[str]:
+        if self.accept_keyword('AS'):
+            return self._parse_identifier()
+        if self.peek()[0] == 'ident' and self.peek_keyword() not in _KEYWORDS:
+            return self._parse_identifier()
+        return None
+
+    def _parse_conditions(self) -> List[Filter]:
+        filters = self._parse_condition_term()
+        while self.accept_keyword('AND'):
+            filters += self._parse_condition_term()
+        if self.peek_keyword() == 'OR':
+            raise SQLTranslationError("不支持 OR 条件")
+        return filters
+
+    def _parse_condition_term(self) -> List[Filter]:
+        if self.accept_op('('):
+            filters = self._parse_conditions()
+            self.expect_op(')')
+            return filters
+        if self.peek_keyword() == 'NOT':
+            raise SQLTranslationError("不支持 NOT 前缀条件")
+        if self.peek()[0] != 'ident':
+            raise SQLTranslationError(f"条件左侧必须是列名，实际为 {self.peek()[1]!r}")
+        column = self._parse_column()
+
+        op = self.accept_op(*_COMPARISONS)
+        if op:
+            value = self._parse_value()
+            if value is None:
+                raise SQLTranslationError("与 NULL 比较请使用 IS NULL")
+            return [Filter(_COMPARISONS[op], column, value)]
+
+        if self.accept_keyword('IS'):
+            negate = bool(self.accept_keyword('NOT'))
+            keyword = self.accept_keyword('NULL', 'TRUE', 'FALSE')
+            if not keyword:
+                raise SQLTranslationError("IS 后只支持 NULL / TRUE / FALSE")
+            return [Filter('is_', column, keyword.lower(), negate)]
+
+        if self.accept_keyword('BETWEEN'):
+            low = self._parse_value()
+            self.expect_keyword('AND')
+            high = self._parse_value()
+            return [Filter('gte', column, low), Filter('lte', column, high)]
+
+        negate = bool(self.accept_keyword('NOT'))
+        if self.accept_keyword('IN'):
+            self.expect_op('(')
+            if self.peek_keyword() == 'SELECT':
+                raise SQLTranslationError("不支持子查询")
+            values = [self._parse_value()]
+            while self.accept_op(','):
+                values.append(self._parse_value())
+            self.expect_op(')')
+            return [Filter('in_', column, values, negate)]
+
+        keyword = self.accept_keyword('LIKE', 'ILIKE')
+        if keyword:
+            pattern = self._parse_value()
+            if not isinstance(pattern, str):
+                raise SQLTranslationError(f"{keyword} 需要字符串模式")
+            # PostgREST 中 * 是 % 的别名，避免 URL 编码问题
+            return [Filter(keyword.lower(), column, pattern.replace('%', '*'), negate)]
+
+        raise SQLTranslationError(f"不支持的条件运算: {self.peek()[1]!r}")
+
+    def _parse_value(self) -> Any:
+        value = self._parse_atom()
+        # 日期/时间 ± INTERVAL
+        while isinstance(value, (date, datetime)):
+            sign = self.accept_op('+', '-')
+            if not sign:
+                break
+            self.expect_keyword('INTERVAL')
+            value = _shift(value, self._parse_interval(), -1 if sign == '-' else 1)
+        if self.accept_op('::'):
+            raise SQLTranslationError("不支持类型转换 ::")
+        if isinstance(value, datetime):
+            return value.isoformat(sep=' ', timespec='seconds')
+        if isinstance(value, date):
+            return value.isoformat()
+        return value
+
+    def _parse_atom(self) -> Any:
+        kind, text = self.peek()
+        if kind == 'string':
+            self.pos += 1
+            return text[1:-1].replace("''", "'")
+        if kind == 'number':
+            self.pos += 1
+            return float(text) if '.' in text else int(text)
+        if kind == 'op' and text == '-' and self.peek(1)[0] == 'number':
+            self.pos += 1
+            return -self._parse_atom()
+
+        keyword = self.peek_keyword()
+        if keyword in ('TRUE', 'FALSE'):
+            self.pos += 1
+            return keyword == 'TRUE'
+        if keyword == 'NULL':
+            self.pos += 1
+            return None
+        if keyword == 'CURRENT_DATE':
+            self.pos += 1
+            return self.now.date()
+        if keyword in ('CURRENT_TIMESTAMP', 'LOCALTIMESTAMP'):
+            self.pos += 1
+            return self.now
+        if keyword == 'NOW' and self.peek(1) == ('op', '('):
+            self.pos += 2
+            self.expect_op(')')
+            return self.now
+        if keyword in ('DATE', 'TIMESTAMP') and self.peek(1)[0] == 'string':
+            self.pos += 1
+            literal = self._parse_atom()
+            try:
+                return date.fromisoformat(literal) if keyword == 'DATE' else datetime.fromisoformat(literal)
+            except ValueError:
+                raise SQLTranslationError(f"无效的 {keyword} 字面量: {literal!r}")
+        if kind == 'op' and text == '(':
+            raise SQLTranslationError("不支持子查询或表达式")
+        raise SQLTranslationError(f"不支持的值: {text!r}")
+
+    def _parse_interval(self) -> Tuple[int, str]:
+        kind, text = self.peek()
+        if kind != 'string':
+            raise SQLTranslationError("INTERVAL 需要字符串，例如 INTERVAL '7 days'")
+        self.pos += 1
+        match = re.match(r"^\s*(\d+)\s*(day|week|month|year|hour|minute)s?\s*$", text[1:-1], re.IGNORECASE)
+        if not match:
+            raise SQLTranslationError(f"不支持的 INTERVAL: {text}")
+        return int(match.group(1)), match.group(2).lower()
+
+    def _parse_order(self, columns: List[str]) -> List[Tuple[str, bool, bool]]:
+        order = []
+        while True:
+            kind, text = self.peek()
+            if kind == 'number':
+                self.pos += 1
+                index = int(text) - 1
+                if not 0 <= index < len(columns):
+                    raise SQLTranslationError(f"ORDER BY 序号超出范围: {text}")
+                column = columns[index].split(':')[-1]
+            else:
+                column = self._parse_column()
+                # 按别名排序时换成真实列
+                for item in columns:
+                    if item.startswith(f"{column}:"):
+                        column = item.split(':', 1)[1]
+            desc = self.accept_keyword('ASC', 'DESC') == 'DESC'
+            # PostgreSQL 默认: 升序 NULLS LAST，降序 NULLS FIRST
+            nullsfirst = desc
+            if self.accept_keyword('NULLS'):
+                nullsfirst = self.accept_keyword('FIRST', 'LAST') == 'FIRST'
+            order.append((column, desc, nullsfirst))
+            if not self.accept_op(','):
+                return order
+
+    def _parse_int(self) -> int:
+        kind, text = self.peek()
+        if kind != 'number' or '.' in text:
+            raise SQLTranslationError(f"期望整数，实际为 {text!r}")
+        self.pos += 1
+        return int(text)
+
+
+def _shift(value: Any, interval: Tuple[int, str], sign: int) -> Any:
+    """日期/时间加减 INTERVAL"""
+    amount, unit = interval
+    amount *= sign
+    if unit in ('month', 'year'):
+        months = amount * (12 if unit == 'year' else 1)
+        index = value.year * 12 + value.month - 1 + months
+        year, month = divmod(index, 12)
+        month += 1
+        return value.replace(year=year, month=month,
+                             day=min(value.day, calendar.monthrange(year, month)[1]))
+    delta = {'day': timedelta(days=amount), 'week': timedelta(weeks=amount),
+             'hour': timedelta(hours=amount), 'minute': timedelta(minutes=amount)}[unit]
+    if not isinstance(value, datetime) and unit in ('hour', 'minute'):
+        value = datetime.combine(value, datetime.min.time())
+    return value + delta
+
+
+def translate_sql(sql: str, now: Optional[datetime] = None) -> PostgRESTQuery:
+    """
+    将 SQL 翻译为 PostgREST 查询
+
+    Args:
+        sql: SELECT 语句
+        now: CURRENT_DATE / NOW() 的基准时间，默认当前时间
+
+    Returns:
+        PostgRESTQuery
+
+    Raises:
+        SQLTranslationError: 语句超出支持的子集
+    """
+    if not sql or not sql.strip():
+        raise SQLTranslationError("SQL 不能为空")
+    return _Parser(sql, now or datetime.now()).parse()
+
+
+def _apply_filters(builder: Any, filters: List[Filter]) -> Any:
+    for f in filters:
+        target = builder.not_ if f.negate else builder
+        builder = getattr(target, f.op)(f.column, f.value)
+    return builder
+
+
+def run_postgrest_query(client: Any, query: PostgRESTQuery,
+                        max_rows: int = 10000, page_size: int = 1000) -> List[Dict[str, Any]]:
+    """
+    在 supabase / postgrest 客户端上执行翻译后的查询
+
+    Args:
+        client: 提供 table(name) 的客户端
+        query: translate_sql 的结果
+        max_rows: 未指定 LIMIT 时的最大返回行数
+        page_size: SUM/AVG 分页拉取单列数据时的页大小
+
+    Returns:
+        结果行列表；聚合查询返回单行
+    """
+    if query.aggregates:
+        return [_run_aggregates(client, query, page_size)]
+
+    builder = _apply_filters(client.table(query.table).select(query.select_clause), query.filters)
+    for column, desc, nullsfirst in query.order:
+        builder = builder.order(column, desc=desc, nullsfirst=nullsfirst)
+
+    limit = query.limit if query.limit is not None else max_rows
+    offset = query.offset or 0
+    if offset:
+        builder = builder.range(offset, offset + limit)
+    else:
+        builder = builder.limit(limit)
+    return builder.execute().data or []
+
+
+def iter_postgrest_query(client: Any, query: PostgRESTQuery,
+                         page_size: int = 1000) -> Iterator[List[Dict[str, Any]]]:
+    """
+    按 Range 分页逐批执行翻译后的查询（用于流式导出，不受 max_rows 限制）
+
+    未指定 ORDER BY 时 PostgREST 不保证分页间顺序稳定，
+    导出大结果集时建议在 SQL 中按主键或时间列排序
+
+    Args:
+        client: 提供 table(name) 的客户端
+        query: translate_sql 的结果
+        page_size: 每页行数
+
+    Yields:
+        每页的结果行列表
+    """
+    if query.aggregates:
+        yield [_run_aggregates(client, query, page_size)]
+        return
+
+    start = query.offset or 0
+    remaining = query.limit
+    while remaining is None or remaining > 0:
+        size = page_size if remaining is None else min(page_size, remaining)
+        builder = _apply_filters(client.table(query.table).select(query.select_clause), query.filters)
+        for column, desc, nullsfirst in query.order:
+            builder = builder.order(column, desc=desc, nullsfirst=nullsfirst)
+        page = builder.range(start, start + size).execute().data or []
+        if page:
+            yield page
+        if len(page) < size:
+            return
+        start += size
+        if remaining is not None:
+            remaining -= size
+
+
+def _run_aggregates(client: Any, query: PostgRESTQuery, page_size: int) -> Dict[str, Any]:
+    """
+    聚合下推:
+      COUNT -> count=exact 只取 1 行
+      MIN/MAX -> 按列排序取 1 行
+      SUM/AVG -> 只投影需要的列分页拉取后在本地计算
+    """
+    row: Dict[str, Any] = {}
+    summed: Dict[str, List[Any]] = {}
+
+    for agg in query.aggregates:
+        if agg.func == 'count':
+            builder = client.table(query.table).select(agg.column or '*', count='exact')
+            builder = _apply_filters(builder, query.filters)
+            if agg.column:
+                builder = builder.not_.is_(agg.column, 'null')
+            row[agg.alias] = builder.limit(1).execute().count or 0
+        elif agg.func in ('min', 'max'):
+            builder = _apply_filters(client.table(query.table).select(agg.column), query.filters)
+            builder = builder.not_.is_(agg.column, 'null')
+            data = builder.order(agg.column, desc=agg.func == 'max').limit(1).execute().data
+            row[agg.alias] = data[0][agg.column] if data else None
+        else:
+            summed.setdefault(agg.column, [])
+
+    if summed:
+        columns = list(summed)
+        start = 0
+        while True:
+            builder = _apply_filters(client.table(query.table).select(','.join(columns)), query.filters)
+            page = builder.range(start, start + page_size).execute().data or []
+            for record in page:
+                for column in columns:
+                    if record.get(column) is not None:
+                        summed[column].append(record[column])
+            if len(page) < page_size:
+                break
+            start += page_size
+
+        for agg in query.aggregates:
+            if agg.func in ('sum', 'avg'):
+                values = summed[agg.column]
+                if not values:
+                    row[agg.alias] = None
+                elif agg.func == 'sum':
+                    row[agg.alias] = sum(values)
+                else:
+                    row[agg.alias] = sum(values) / len(values)
+
+    return {agg.alias: row.get(agg.alias) for agg in query.aggregates}
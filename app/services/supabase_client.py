@@ -5,9 +5,14 @@ Supabase 客户端
 """
 import os
 import logging
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Iterator, List, Optional
 from dotenv import load_dotenv
 
+from app.services.result_cache import get_query_result_cache
+from app.services.sql_translator import (
+    SQLTranslationError, translate_sql, run_postgrest_query, iter_postgrest_query
+)
+
 load_dotenv()
 logger = logging.getLogger(__name__)
 
@@ -28,6 +33,8 @@ class SupabaseClient:
         self.key = os.getenv('SUPABASE_ANON_KEY')
         self.client: Optional[Client] = None
         self.init_error: Optional[str] = None  # 保存初始化错误
+        # SQL 未指定 LIMIT 时最多返回的行数，避免整表下载
+        self.max_rows = int(os.getenv('QUERY_MAX_ROWS', 10000))
         self._connect()
     
     def _connect(self):
@@ -88,11 +95,12 @@ class SupabaseClient:
     
     def execute_query(self, sql: str, table_name: str = None) -> Dict[str, Any]:
         """
-        执行查询 - 使用 PostgREST API
+        执行查询 - 将 SQL 翻译为 PostgREST 调用
+        列投影、WHERE 过滤、ORDER BY、LIMIT/OFFSET 和简单聚合都下推到数据库
         
         Args:
-            sql: SQL 查询语句（作为注释/参考）
-            table_name: 表名（必需）
+            sql: SQL 查询语句（仅支持 SELECT 子集，见 sql_translator）
+            table_name: 期望的表名（可选，提供时与 SQL 中的表名校验一致）
             
         Returns:
             查询结果
@@ -105,26 +113,38 @@ class SupabaseClient:
                     'data': []
                 }
             
-            # 对于简单查询，直接从表中读取
-            if table_name:
-                response = self.client.table(table_name).select('*').execute()
-                data = response.data
-                
-                logger.info(f"✅ Query executed: {len(data)} rows returned from {table_name}")
-                
+            try:
+                query = translate_sql(sql)
+            except SQLTranslationError as e:
+                logger.warning(f"SQL not translatable to PostgREST: {e}")
                 return {
-                    'success': True,
-                    'data': data,
-                    'count': len(data),
-                    'message': f'成功返回 {len(data)} 条记录'
+                    'success': False,
+                    'error': f'无法翻译为 PostgREST 查询: {e}',
+                    'data': [],
+                    'sql': sql
                 }
-            else:
+            
+            if table_name and table_name != query.table:
                 return {
                     'success': False,
-                    'error': 'table_name is required for PostgREST queries',
-                    'data': []
+                    'error': f'SQL 中的表 {query.table} 与指定的表 {table_name} 不一致',
+                    'data': [],
+                    'sql': sql
                 }
             
+            logger.info(f"PostgREST query: {query.to_query_string()}")
+            data = run_postgrest_query(self.client, query, max_rows=self.max_rows)
+            
+            logger.info(f"✅ Query executed: {len(data)} rows returned from {query.table}")
+            
+            return {
+                'success': True,
+                'data': data,
+                'count': len(data),
+                'truncated': query.limit is None and not query.aggregates and len(data) >= self.max_rows,
+                'message': f'成功返回 {len(data)} 条记录'
+            }
+            
         except Exception as e:
             error_msg = str(e)
             logger.error(f"❌ Query execution failed: {error_msg}")
@@ -134,6 +154,27 @@ class SupabaseClient:
                 'data': []
             }
     
+    def stream_query(self, sql: str, batch_size: int = 1000) -> Iterator[List[Dict[str, Any]]]:
+        """
+        流式执行查询 - 按 PostgREST Range 分页逐批返回
+        
+        Args:
+            sql: SQL 查询语句（仅支持 SELECT 子集）
+            batch_size: 每页行数
+            
+        Returns:
+            逐批产出结果行的迭代器
+            
+        Raises:
+            RuntimeError: Supabase 未连接
+            SQLTranslationError: SQL 无法翻译（在开始输出前抛出）
+        """
+        if not self.client:
+            raise RuntimeError('Supabase not connected')
+        query = translate_sql(sql)
+        logger.info(f"PostgREST stream: {query.to_query_string()} (page_size={batch_size})")
+        return iter_postgrest_query(self.client, query, page_size=batch_size)
+    
     def execute_write(self, table_name: str, data: Dict[str, Any], operation: str = 'insert') -> Dict[str, Any]:
         """
         执行写操作（INSERT, UPDATE, DELETE）
@@ -169,6 +210,9 @@ class SupabaseClient:
             
             logger.info(f"✅ {operation} operation successful")
             
+            # 写表后失效依赖该表的缓存查询结果
+            get_query_result_cache().invalidate_tables([table_name])
+            
             return {
                 'success': True,
                 'data': response.data,
@@ -3,16 +3,26 @@
 处理前端发送的自然语言查询，返回SQL和数据结果
 """
 
+import asyncio
 import logging
-from typing import Optional, Dict, List, Any, Tuple
+import os
+import threading
+import time
+from typing import Optional, Dict, List, Any, Iterator, Tuple
 from dataclasses import dataclass, asdict
 from datetime import datetime
 from enum import Enum
 
+from app.services.example_store import get_example_store
+from app.services.execution_history import get_execution_history
 from app.services.intent_recognizer import IntentRecognizer
 from app.services.nl2sql_enhanced import get_enhanced_nl2sql_converter
 from app.services.query_executor import QueryExecutor
 from app.services.llm_provider import get_llm_provider
+from app.services.query_recommender import get_query_recommender
+from app.services.query_scheduler import get_query_scheduler
+from app.services.sql_compiler import get_sql_compiler
+from app.services.supabase_client import get_supabase_client
 
 logger = logging.getLogger(__name__)
 
@@ -46,6 +56,9 @@ class QueryIntent:
     equipment: Optional[List[str]] = None
     shift: Optional[List[str]] = None
     table_name: Optional[str] = None
+    metrics: Optional[List[str]] = None
+    product_line: Optional[str] = None
+    limit: Optional[int] = None
     comparison: bool = False
     confidence: float = 0.0
     clarification_needed: bool = False
@@ -64,24 +77,30 @@ class QueryPlan:
     """查询计划数据模型"""
     query_intent: QueryIntent
     generated_sql: Optional[str] = None
+    sql_source: Optional[str] = None  # "compiler"、"example" 或 "llm"
     sql_confidence: float = 0.0
     requires_clarification: bool = False
     clarification_message: Optional[str] = None
     suggested_sql_variants: Optional[List[str]] = None
     schema_context: Optional[Dict[str, Any]] = None
     explanation: Optional[str] = None
+    explanation_deferred: bool = False
+    stage_timings: Optional[Dict[str, float]] = None
 
     def to_dict(self):
         """转换为字典"""
         return {
             "query_intent": self.query_intent.to_dict() if self.query_intent else None,
             "generated_sql": self.generated_sql,
+            "sql_source": self.sql_source,
             "sql_confidence": self.sql_confidence,
             "requires_clarification": self.requires_clarification,
             "clarification_message": self.clarification_message,
             "suggested_sql_variants": self.suggested_sql_variants,
             "schema_context": self.schema_context,
-            "explanation": self.explanation
+            "explanation": self.explanation,
+            "explanation_deferred": self.explanation_deferred,
+            "stage_timings": self.stage_timings
         }
 
 
@@ -98,6 +117,7 @@ class QueryResult:
     error_message: Optional[str] = None
     query_time_ms: float = 0.0
     generated_at: str = None
+    cached: bool = False
 
     def to_dict(self):
         """转换为字典"""
@@ -111,7 +131,8 @@ class QueryResult:
             "actions": self.actions or [],
             "error_message": self.error_message,
             "query_time_ms": self.query_time_ms,
-            "generated_at": self.generated_at or datetime.now().isoformat()
+            "generated_at": self.generated_at or datetime.now().isoformat(),
+            "cached": self.cached
         }
 
 
@@ -126,90 +147,163 @@ class UnifiedQueryService:
         # 初始化意图识别器，并传递 LLM 提供商
         self.intent_recognizer = IntentRecognizer(llm_provider=self.llm_provider)
         self.nl2sql_converter = get_enhanced_nl2sql_converter()
-        self.query_executor = QueryExecutor()
+        self.query_executor = QueryExecutor(get_supabase_client())
+        self.sql_compiler = get_sql_compiler()
         logger.info("UnifiedQueryService initialized")
 
     async def process_natural_language_query(
         self,
         natural_language: str,
         user_context: Optional[Dict[str, Any]] = None,
-        execution_mode: str = "explain"  # "explain" or "execute"
+        execution_mode: str = "explain",  # "explain" or "execute"
+        defer_explanation: bool = False
     ) -> Tuple[QueryPlan, Optional[QueryResult]]:
         """
         处理自然语言查询的完整流程
 
-        流程:
-        1. 识别用户意图
-        2. 生成SQL查询
-        3. 可选: 执行查询并返回结果
+        各阶段按依赖关系并发执行:
+        1. 意图识别 ‖ 加载 schema 元数据摘要
+        2. 生成SQL（主查询 ‖ 对比变体） ‖ 构建 schema 上下文（依赖意图和元数据）
+        3. 生成解释 ‖ 可选: 执行查询（均只依赖主SQL）
         4. 返回查询计划和可选的结果
 
         Args:
             natural_language: 自然语言查询
             user_context: 用户上下文信息
             execution_mode: 执行模式 - "explain" 仅返回SQL，"execute" 执行并返回结果
+            defer_explanation: 为 True 时不在本次请求中生成解释，
+                由调用方稍后通过 generate_explanation 获取
 
         Returns:
             (QueryPlan, Optional[QueryResult])
         """
-        import time
         start_time = time.time()
+        query_plan, query_result = await self._process_natural_language_query(
+            natural_language, user_context, execution_mode, defer_explanation
+        )
+        self._record_history(
+            execution_mode, natural_language, query_plan, query_result,
+            (time.time() - start_time) * 1000
+        )
+        self._observe_usage(natural_language, query_plan, query_result)
+        return query_plan, query_result
+
+    def prewarm_query(self, natural_language: str) -> None:
+        """
+        完整执行一次查询但不记录历史和使用统计，
+        用于预热推荐查询的 LLM 缓存（SQL、解释）和结果缓存；
+        结果总是重新查询并写回缓存，预热间隔小于结果缓存 TTL 时推荐查询始终命中
+
+        Raises:
+            RuntimeError: 没有生成 SQL 或执行失败（流程内部的异常都已转换为失败结果）
+        """
+        query_plan, query_result = asyncio.run(self._process_natural_language_query(
+            natural_language, None, "execute", False, refresh=True
+        ))
+        if query_result is None or not query_result.success:
+            error = (query_result.error_message if query_result else None) \
+                or query_plan.clarification_message or '未生成SQL'
+            raise RuntimeError(error)
+
+    async def _process_natural_language_query(
+        self,
+        natural_language: str,
+        user_context: Optional[Dict[str, Any]],
+        execution_mode: str,
+        defer_explanation: bool,
+        refresh: bool = False
+    ) -> Tuple[QueryPlan, Optional[QueryResult]]:
+        """process_natural_language_query 的实际流程（不含历史记录）
+
+        Args:
+            refresh: 执行时绕过结果缓存（预热时用来重新写入缓存）
+        """
+        start_time = time.time()
+        timings: Dict[str, float] = {}
+
+        async def timed(stage: str, coro):
+            stage_start = time.time()
+            try:
+                return await coro
+            finally:
+                timings[stage] = round((time.time() - stage_start) * 1000, 2)
+
+        metadata_task = asyncio.ensure_future(
+            timed("metadata", asyncio.to_thread(self.nl2sql_converter.get_metadata_summary))
+        )
 
         try:
-            # 1. 意图识别
-            query_intent = await self._recognize_intent(
-                natural_language, 
+            # 1. 意图识别（与元数据加载并发）
+            query_intent = await timed("intent", self._recognize_intent(
+                natural_language,
                 user_context
-            )
+            ))
 
             # 2. 检查是否需要澄清
             if query_intent.clarification_needed:
+                metadata_task.cancel()
                 query_plan = QueryPlan(
                     query_intent=query_intent,
                     requires_clarification=True,
-                    clarification_message=self._build_clarification_message(query_intent)
+                    clarification_message=self._build_clarification_message(query_intent),
+                    stage_timings=timings
                 )
                 return query_plan, None
 
-            # 3. 生成SQL
-            sql_query, sql_variants = await self._generate_sql(
-                query_intent, 
-                user_context
+            # 3. 生成SQL 与 构建schema上下文 并发
+            (sql_query, sql_variants, sql_source), schema_context = await asyncio.gather(
+                timed("sql", self._generate_sql(query_intent, user_context)),
+                timed("schema_context", self._build_schema_context(query_intent, metadata_task))
             )
 
             if not sql_query:
                 query_plan = QueryPlan(
                     query_intent=query_intent,
                     requires_clarification=True,
-                    clarification_message="无法为您的查询生成SQL。请尝试用不同的方式描述您的问题。"
+                    clarification_message="无法为您的查询生成SQL。请尝试用不同的方式描述您的问题。",
+                    stage_timings=timings
                 )
                 return query_plan, None
 
-            # 4. 构建查询计划
-            schema_context = await self._build_schema_context(query_intent)
-            
+            # 4. 解释 与 执行 并发（都只依赖主SQL）
+            explanation_coro = None
+            if not defer_explanation:
+                explanation_coro = timed("explanation", self._generate_explanation(sql_query, query_intent))
+
+            execute_coro = None
+            if execution_mode == "execute":
+                execute_coro = timed("execute", self._execute_query(
+                    sql_query,
+                    query_intent,
+                    start_time,
+                    refresh=refresh,
+                    sql_source=sql_source
+                ))
+
+            explanation, query_result = await asyncio.gather(
+                explanation_coro if explanation_coro else self._none(),
+                execute_coro if execute_coro else self._none()
+            )
+
+            timings["total"] = round((time.time() - start_time) * 1000, 2)
             query_plan = QueryPlan(
                 query_intent=query_intent,
                 generated_sql=sql_query,
+                sql_source=sql_source,
                 suggested_sql_variants=sql_variants,
                 schema_context=schema_context,
-                sql_confidence=0.85,
-                explanation=await self._generate_explanation(sql_query, query_intent)
+                sql_confidence=0.95 if sql_source in ("compiler", "example") else 0.85,
+                explanation=explanation,
+                explanation_deferred=defer_explanation,
+                stage_timings=timings
             )
 
-            # 5. 根据execution_mode决定是否执行
-            query_result = None
-            if execution_mode == "execute":
-                query_result = await self._execute_query(
-                    sql_query,
-                    query_intent,
-                    start_time
-                )
-
             return query_plan, query_result
 
         except Exception as e:
             logger.error(f"Error processing natural language query: {e}", exc_info=True)
+            if not metadata_task.done():
+                metadata_task.cancel()
             query_intent = QueryIntent(
                 query_type=QueryType.UNKNOWN,
                 natural_language=natural_language
@@ -221,10 +315,38 @@ class UnifiedQueryService:
             )
             return query_plan, None
 
+    @staticmethod
+    async def _none() -> None:
+        """占位协程：跳过的阶段"""
+        return None
+
+    async def generate_explanation(
+        self,
+        sql_query: str,
+        natural_language: str = ""
+    ) -> str:
+        """
+        单独生成SQL解释（用于 defer_explanation 之后的补充请求）
+
+        Args:
+            sql_query: SQL查询语句
+            natural_language: 原始自然语言查询
+
+        Returns:
+            SQL 的中文解释
+        """
+        query_intent = QueryIntent(
+            query_type=QueryType.UNKNOWN,
+            natural_language=natural_language
+        )
+        return await self._generate_explanation(sql_query, query_intent)
+
     async def execute_approved_query(
         self,
         sql_query: str,
-        query_intent: Optional[QueryIntent] = None
+        query_intent: Optional[QueryIntent] = None,
+        refresh: bool = False,
+        sql_source: Optional[str] = None
     ) -> QueryResult:
         """
         执行已批准的SQL查询
@@ -232,28 +354,65 @@ class UnifiedQueryService:
         Args:
             sql_query: SQL查询语句
             query_intent: 查询意图（可选，用于优化结果）
+            refresh: 为 True 时绕过结果缓存（对应结果中的 refresh 操作）
+            sql_source: 查询计划中的 sql_source；为 "llm" 时执行成功后记入示例库
 
         Returns:
             QueryResult
         """
-        import time
         start_time = time.time()
 
         try:
-            return await self._execute_query(
+            query_result = await self._execute_query(
                 sql_query,
                 query_intent,
-                start_time
+                start_time,
+                refresh=refresh,
+                sql_source=sql_source
             )
         except Exception as e:
             logger.error(f"Error executing approved query: {e}", exc_info=True)
-            return QueryResult(
+            query_result = QueryResult(
                 success=False,
                 error_message=f"执行查询失败: {str(e)}",
                 query_time_ms=(time.time() - start_time) * 1000,
                 generated_at=datetime.now().isoformat()
             )
 
+        get_execution_history().record({
+            'mode': 'approved',
+            'natural_language': query_intent.natural_language if query_intent else None,
+            'sql': sql_query,
+            'intent': query_intent.query_type.value if query_intent and query_intent.query_type else None,
+            'sql_source': sql_source,
+            'success': query_result.success,
+            'rows_count': query_result.rows_count,
+            'cached': query_result.cached,
+            'query_time_ms': round(query_result.query_time_ms, 2),
+            'error': query_result.error_message
+        })
+        return query_result
+
+    def stream_approved_query(
+        self,
+        sql_query: str,
+        batch_size: Optional[int] = None
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """
+        流式执行已批准的SQL查询，逐批返回结果行（用于大结果集导出）
+
+        Args:
+            sql_query: SQL查询语句
+            batch_size: 每批行数
+
+        Returns:
+            逐批产出结果行的迭代器
+
+        Raises:
+            ValueError: SQL 不受支持
+        """
+        return self.query_executor.stream_query(sql_query, batch_size=batch_size)
+
     async def _recognize_intent(
         self,
         natural_language: str,
@@ -263,17 +422,25 @@ class UnifiedQueryService:
         识别用户意图
         """
         try:
-            # 使用后端的意图识别器
-            intent_data = self.intent_recognizer.recognize(natural_language)
+            # 使用后端的意图识别器（规则匹配为同步计算，LLM 回退会阻塞，放到线程中执行）
+            intent_data = await asyncio.to_thread(self.intent_recognizer.recognize, natural_language)
+
+            # IntentRecognizer 的实体在 entities 下（metrics 列表、timeRange、equipment 等）
+            entities = intent_data.get('entities') or {}
+            metrics = entities.get('metrics') or []
+            equipment = entities.get('equipment') or entities.get('equipmentId') or []
+            if equipment and not isinstance(equipment, list):
+                equipment = [equipment]
+            comparison = intent_data.get('intent') == 'compare_analysis'
 
             # 检查是否需要澄清
             clarification_needed = intent_data.get('confidence', 0) < 0.6
             clarification_questions = []
 
             if clarification_needed:
-                if not intent_data.get('metric'):
+                if not metrics:
                     clarification_questions.append("您想查询哪个指标？(OEE, 良率, 效率, 停机时间等)")
-                if not intent_data.get('time_range'):
+                if not entities.get('timeRange'):
                     clarification_questions.append("您想查询哪个时间段？(今天, 本周, 本月等)")
 
             query_type = self._map_to_query_type(intent_data)
@@ -281,12 +448,15 @@ class UnifiedQueryService:
             return QueryIntent(
                 query_type=query_type,
                 natural_language=natural_language,
-                metric=intent_data.get('metric'),
-                time_range=intent_data.get('time_range'),
-                equipment=intent_data.get('equipment', []),
-                shift=intent_data.get('shift', []),
-                table_name=intent_data.get('table_name'),
-                comparison=intent_data.get('comparison', False),
+                metric=metrics[0] if metrics else None,
+                time_range=entities.get('timeRange'),
+                equipment=equipment,
+                shift=entities.get('shift', []),
+                table_name=entities.get('table'),
+                metrics=metrics or None,
+                product_line=entities.get('productLine'),
+                limit=entities.get('limit'),
+                comparison=comparison,
                 confidence=intent_data.get('confidence', 0),
                 clarification_needed=clarification_needed,
                 clarification_questions=clarification_questions if clarification_needed else None,
@@ -306,47 +476,84 @@ class UnifiedQueryService:
         self,
         query_intent: QueryIntent,
         user_context: Optional[Dict[str, Any]] = None
-    ) -> Tuple[Optional[str], Optional[List[str]]]:
+    ) -> Tuple[Optional[str], Optional[List[str]], Optional[str]]:
         """
         基于查询意图生成SQL
+        高置信度的结构化指标/表查询直接编译；与已执行示例几乎相同的问题复用其 SQL；
+        其余交给 LLM（相近示例作为 few-shot 注入提示词）
+
+        Returns:
+            (sql, sql_variants, sql_source)
         """
         try:
+            compiled = self.sql_compiler.compile(
+                query_intent,
+                getattr(self.nl2sql_converter, 'annotation_metadata', None) or {}
+            )
+            if compiled:
+                sql = compiled.render()
+                logger.info(f"Compiled SQL without LLM: {sql}")
+                return sql, None, "compiler"
+
+            reused = get_example_store().find_reusable(query_intent.natural_language)
+            if reused:
+                logger.info(f"Reused example SQL without LLM: {reused.sql}")
+                return reused.sql, None, "example"
+
             # 构建优化的自然语言查询
             optimized_nl = self._build_optimized_nl_query(query_intent)
 
-            # 使用增强的NL2SQL转换器
-            sql = self.nl2sql_converter.convert(optimized_nl)
+            # 使用增强的NL2SQL转换器；对比查询的替代SQL只依赖意图，与主查询并发生成
+            if query_intent.comparison:
+                alt_nl = self._build_comparison_query(query_intent)
+                sql, alt_sql = await asyncio.gather(
+                    self.nl2sql_converter.aconvert(optimized_nl, question=query_intent.natural_language),
+                    self.nl2sql_converter.aconvert(alt_nl)
+                )
+            else:
+                sql = await self.nl2sql_converter.aconvert(
+                    optimized_nl, question=query_intent.natural_language
+                )
+                alt_sql = None
 
             # 生成可选的SQL变体（用于用户选择）
             sql_variants = []
-            if query_intent.comparison:
-                # 为对比查询生成替代SQL
-                alt_nl = self._build_comparison_query(query_intent)
-                alt_sql = self.nl2sql_converter.convert(alt_nl)
-                if alt_sql and alt_sql != sql:
-                    sql_variants.append(alt_sql)
+            if alt_sql and alt_sql != sql:
+                sql_variants.append(alt_sql)
 
             logger.info(f"Generated SQL: {sql}")
-            return sql, sql_variants if sql_variants else None
+            return sql, sql_variants if sql_variants else None, "llm"
 
         except Exception as e:
             logger.error(f"Error generating SQL: {e}", exc_info=True)
-            return None, None
+            return None, None, None
 
     async def _execute_query(
         self,
         sql_query: str,
         query_intent: Optional[QueryIntent],
-        start_time: float
+        start_time: float,
+        refresh: bool = False,
+        sql_source: Optional[str] = None
     ) -> QueryResult:
         """
         执行SQL查询
         """
-        import time
-
         try:
-            # 执行查询
-            data = self.query_executor.execute_query(sql_query)
+            # 执行查询（同步数据库调用放到线程中，避免阻塞并发的解释生成）
+            result = await asyncio.to_thread(
+                self.query_executor.execute_query, sql_query, refresh=refresh
+            )
+            if not result.get('success'):
+                return QueryResult(
+                    success=False,
+                    sql=sql_query,
+                    error_message=f"查询执行失败: {result.get('error')}",
+                    query_time_ms=(time.time() - start_time) * 1000,
+                    generated_at=datetime.now().isoformat()
+                )
+            data = result.get('data') or []
+            self._record_example(query_intent, sql_query, sql_source)
 
             if not data:
                 return QueryResult(
@@ -356,7 +563,8 @@ class UnifiedQueryService:
                     rows_count=0,
                     summary="查询成功但没有返回数据",
                     query_time_ms=(time.time() - start_time) * 1000,
-                    generated_at=datetime.now().isoformat()
+                    generated_at=datetime.now().isoformat(),
+                    cached=bool(result.get('cached'))
                 )
 
             # 确定可视化类型
@@ -374,7 +582,8 @@ class UnifiedQueryService:
                 visualization_type=viz_type,
                 actions=self._determine_available_actions(query_intent),
                 query_time_ms=(time.time() - start_time) * 1000,
-                generated_at=datetime.now().isoformat()
+                generated_at=datetime.now().isoformat(),
+                cached=bool(result.get('cached'))
             )
 
         except Exception as e:
@@ -387,13 +596,82 @@ class UnifiedQueryService:
                 generated_at=datetime.now().isoformat()
             )
 
+    @staticmethod
+    def _record_history(
+        execution_mode: str,
+        natural_language: str,
+        query_plan: QueryPlan,
+        query_result: Optional[QueryResult],
+        total_ms: float
+    ) -> None:
+        """把一次 process 调用放入执行历史写队列（不阻塞）"""
+        try:
+            intent = query_plan.query_intent if query_plan else None
+            raw_intent = (intent.raw_intent_data or {}) if intent else {}
+            error = query_result.error_message if query_result else None
+            if query_plan and query_plan.requires_clarification:
+                error = error or query_plan.clarification_message
+            get_execution_history().record({
+                'mode': execution_mode,
+                'natural_language': natural_language,
+                'sql': query_plan.generated_sql if query_plan else None,
+                'intent': raw_intent.get('intent') or (intent.query_type.value if intent else None),
+                'sql_source': query_plan.sql_source if query_plan else None,
+                'success': bool(query_plan and query_plan.generated_sql)
+                           and (query_result is None or query_result.success),
+                'rows_count': query_result.rows_count if query_result else 0,
+                'cached': query_result.cached if query_result else False,
+                'query_time_ms': round(total_ms, 2),
+                'stage_timings': query_plan.stage_timings if query_plan else None,
+                'error': error
+            })
+        except Exception as e:
+            logger.warning(f"Failed to record execution history: {e}")
+
+    @staticmethod
+    def _observe_usage(
+        natural_language: str,
+        query_plan: QueryPlan,
+        query_result: Optional[QueryResult]
+    ) -> None:
+        """成功生成 SQL（且执行成功）的问题计入查询推荐的热度统计"""
+        if not query_plan or not query_plan.generated_sql:
+            return
+        if query_result is not None and not query_result.success:
+            return
+        try:
+            intent = query_plan.query_intent
+            raw_intent = (intent.raw_intent_data or {}) if intent else {}
+            get_query_recommender().observe(
+                natural_language, query_plan.generated_sql, raw_intent.get('intent')
+            )
+        except Exception as e:
+            logger.warning(f"Failed to update query recommendations: {e}")
+
+    @staticmethod
+    def _record_example(query_intent: Optional[QueryIntent], sql_query: str,
+                        sql_source: Optional[str]) -> None:
+        """
+        执行成功的 (问题, SQL) 记入示例库，供后续 few-shot 和复用
+
+        只记录 LLM 生成的 SQL：编译器的 SQL 每次都能重新编译，且内联了当天的日期；
+        来自示例库的 SQL 已经在库中
+        """
+        if sql_source != 'llm' or not query_intent or not query_intent.natural_language:
+            return
+        try:
+            get_example_store().add(query_intent.natural_language, sql_query, source='executed')
+        except Exception as e:
+            logger.warning(f"Failed to record SQL example: {e}")
+
     def _map_to_query_type(self, intent_data: Dict[str, Any]) -> QueryType:
         """将意图数据映射到查询类型"""
-        if intent_data.get('table_name'):
+        entities = intent_data.get('entities') or {}
+        if entities.get('table'):
             return QueryType.DIRECT_TABLE_QUERY
-        elif intent_data.get('comparison'):
+        elif intent_data.get('intent') == 'compare_analysis':
             return QueryType.COMPARISON_QUERY
-        elif intent_data.get('metric'):
+        elif entities.get('metrics'):
             return QueryType.METRIC_QUERY
         else:
             return QueryType.UNKNOWN
@@ -427,13 +705,24 @@ class UnifiedQueryService:
         """构建对比查询的自然语言表述"""
         return f"对比{query_intent.metric}在不同设备间的差异 {self._build_optimized_nl_query(query_intent)}"
 
-    async def _build_schema_context(self, query_intent: QueryIntent) -> Dict[str, Any]:
+    async def _build_schema_context(
+        self,
+        query_intent: QueryIntent,
+        metadata_task: Optional["asyncio.Future"] = None
+    ) -> Dict[str, Any]:
         """
         构建schema上下文信息
         包含相关表、列、业务含义等
+
+        Args:
+            query_intent: 查询意图
+            metadata_task: 已提前启动的元数据摘要加载任务（可选）
         """
         try:
-            metadata = self.nl2sql_converter.get_metadata_summary()
+            if metadata_task is not None:
+                metadata = await metadata_task
+            else:
+                metadata = await asyncio.to_thread(self.nl2sql_converter.get_metadata_summary)
             return {
                 "tables": metadata.get("table_names", []),
                 "total_columns": metadata.get("columns", 0),
@@ -480,7 +769,7 @@ class UnifiedQueryService:
             请生成不超过2句话的解释。
             """
             
-            explanation = self.llm_provider.generate_text(prompt)
+            explanation = await self.llm_provider.agenerate(prompt)
             return explanation if explanation else "这个查询将检索符合条件的数据"
 
         except Exception as e:
@@ -561,11 +850,25 @@ class UnifiedQueryService:
 
 # 全局实例
 _unified_query_service = None
+_unified_query_service_lock = threading.Lock()
 
 
 def get_unified_query_service() -> UnifiedQueryService:
     """获取统一查询服务实例"""
     global _unified_query_service
-    if _unified_query_service is None:
-        _unified_query_service = UnifiedQueryService()
+    if _unified_query_service is not None:
+        return _unified_query_service
+    with _unified_query_service_lock:
+        if _unified_query_service is None:
+            service = UnifiedQueryService()
+            # 预热默认关闭：每个进程都会各自预热，多 worker 部署时只应在一个进程中启用
+            if os.getenv('RECOMMENDATION_PREWARM', 'false').lower() in ('1', 'true', 'yes'):
+                get_query_recommender().start_prewarm(
+                    service.prewarm_query,
+                    top=int(os.getenv('RECOMMENDATION_PREWARM_TOP', 5)),
+                    interval=float(os.getenv('RECOMMENDATION_PREWARM_SECONDS', 45))
+                )
+            # 定时查询与服务一同启动，把预计算结果写入 /execute 使用的结果缓存
+            get_query_scheduler()
+            _unified_query_service = service
     return _unified_query_service
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+意图分类器离线训练工具
+从种子样本和线上记录的查询（INTENT_QUERY_LOG 产生的 JSONL）训练
+字符 n-gram TF-IDF + 逻辑回归分类器，输出紧凑的 JSON 模型文件
+
+用法:
+    python app/tools/train_intent_classifier.py \\
+        --data app/resources/intent_seed_queries.jsonl logs/intent_queries.jsonl \\
+        --output app/resources/intent_classifier.json
+"""
+import os
+import sys
+import json
+import random
+import logging
+import argparse
+from typing import List, Tuple
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.services.intent_classifier import (
+    DEFAULT_MODEL_PATH, train_intent_classifier
+)
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+DEFAULT_SEED_PATH = os.path.join(os.path.dirname(DEFAULT_MODEL_PATH), 'intent_seed_queries.jsonl')
+
+
+def load_samples(paths: List[str], min_confidence: float) -> List[Tuple[str, str]]:
+    """
+    读取 JSONL 样本，每行 {"query": ..., "intent": ..., "confidence": ...}
+    线上记录的样本低于 min_confidence 时丢弃（LLM 自己也不确定的标签不可靠）；
+    同一查询出现多次时以最后一次为准
+    """
+    samples = {}
+    for path in paths:
+        if not os.path.exists(path):
+            logger.warning(f"⚠️  Sample file not found: {path}")
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            for line_no, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"⚠️  Skipping invalid JSON at {path}:{line_no}")
+                    continue
+                if float(row.get('confidence', 1.0)) < min_confidence:
+                    continue
+                if row.get('query') and row.get('intent'):
+                    samples[row['query'].strip()] = row['intent']
+    return list(samples.items())
+
+
+def evaluate(samples: List[Tuple[str, str]], threshold: float, seed: int) -> None:
+    """留出 20% 样本评估准确率以及在阈值下仍需调用 LLM 的比例"""
+    rng = random.Random(seed)
+    shuffled = samples[:]
+    rng.shuffle(shuffled)
+    split = max(1, int(len(shuffled) * 0.2))
+    test, train = shuffled[:split], shuffled[split:]
+    model = train_intent_classifier(train, seed=seed)
+
+    correct = confident = confident_correct = 0
+    for text, label in test:
+        predicted, confidence = model.predict(text)
+        correct += predicted == label
+        if confidence >= threshold:
+            confident += 1
+            confident_correct += predicted == label
+
+    logger.info(f"📊 Hold-out accuracy: {correct / len(test):.1%} ({len(test)} samples)")
+    logger.info(f"📊 Threshold {threshold}: LLM fallback {1 - confident / len(test):.1%}, "
+                f"accuracy above threshold {confident_correct / max(confident, 1):.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='训练本地意图分类器')
+    parser.add_argument('--data', nargs='+', default=[DEFAULT_SEED_PATH], help='JSONL 样本文件')
+    parser.add_argument('--output', default=DEFAULT_MODEL_PATH, help='模型输出路径')
+    parser.add_argument('--min-confidence', type=float, default=0.8, help='线上样本的最低标签置信度')
+    parser.add_argument('--threshold', type=float,
+                        default=float(os.getenv('INTENT_CLASSIFIER_THRESHOLD', 0.7)),
+                        help='评估时使用的置信度阈值')
+    parser.add_argument('--epochs', type=int, default=30)
+    parser.add_argument('--seed', type=int, default=13)
+    args = parser.parse_args()
+
+    samples = load_samples(args.data, args.min_confidence)
+    if not samples:
+        logger.error("❌ No training samples")
+        sys.exit(1)
+    logger.info(f"📥 Loaded {len(samples)} samples from {len(args.data)} file(s)")
+
+    evaluate(samples, args.threshold, args.seed)
+
+    model = train_intent_classifier(samples, epochs=args.epochs, seed=args.seed)
+    model.save(args.output)
+    logger.info(f"✅ Model saved to {args.output}: {len(model.features)} features, "
+                f"temperature {model.temperature:.2f}, {os.path.getsize(args.output) // 1024} KB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+实体抽取微基准
+对比旧实现（每次调用 re.search 字符串模式、局部重建字典、逐关键词子串查找）
+与当前实现（关键词自动机单遍扫描 + 模块级预编译正则）在
+test_intent_recognizer.py 样例查询上的单次调用耗时
+
+用法: python bench_entity_extraction.py [--number 20000]
+"""
+
+import argparse
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.intent_recognizer import IntentRecognizer
+from test_intent_recognizer import TEST_CASES
+
+
+def legacy_extract_entities(text):
+    """旧版 _extract_entities（逐字复制，用作基准）"""
+    entities = {}
+
+    time_patterns = {
+        r'今天|今日': 'today',
+        r'昨天|昨日': 'yesterday',
+        r'本周|这周': 'this_week',
+        r'上周|上星期': 'last_week',
+        r'本月|这个月': 'this_month',
+        r'上月|上个月': 'last_month',
+    }
+
+    for pattern, value in time_patterns.items():
+        if re.search(pattern, text):
+            entities['timeRange'] = value
+            break
+
+    num_time_match = re.search(r'(?:最近|过去|最)?\s*(\d+)\s*(?:天|周|月)', text)
+    if num_time_match and 'timeRange' not in entities:
+        number = num_time_match.group(1)
+        unit = re.search(r'天|周|月', num_time_match.group(0)).group(0)
+        entities['timeRange'] = f"{number}{unit}"
+
+    table_match = re.search(r'(?:查询|返回|显示|获取)?\s*(\w+)\s*表', text)
+    if table_match:
+        entities['table'] = table_match.group(1)
+
+    limit_match = re.search(r'(?:前\s*)?(\d+)\s*(?:条|条数|行|rows)', text)
+    if limit_match:
+        entities['limit'] = int(limit_match.group(1))
+
+    metric_mapping = {
+        '产量': 'output_qty',
+        '良品率': 'yield_rate',
+        '良率': 'yield_rate',
+        'oee': 'oee',
+        '稼动率': 'utilization_rate',
+        '效率': 'efficiency',
+        '停机': 'downtime'
+    }
+
+    metrics = []
+    for keyword, metric in metric_mapping.items():
+        if keyword.lower() in text.lower():
+            metrics.append(metric)
+
+    if metrics:
+        entities['metrics'] = list(set(metrics))
+
+    equipment_match = re.search(r'(?:设备|设备号|设备ID)\s*[:：]?\s*(\w+)', text)
+    if equipment_match:
+        entities['equipment'] = equipment_match.group(1)
+
+    product_line_match = re.search(r'(?:产品线|产线)\s*[:：]?\s*(\w+)', text)
+    if product_line_match:
+        entities['productLine'] = product_line_match.group(1)
+
+    return entities
+
+
+def normalized(entities):
+    """metrics 顺序不固定，比较前排序"""
+    return {k: sorted(v) if k == 'metrics' else v for k, v in entities.items()}
+
+
+def run(number):
+    recognizer = IntentRecognizer(llm_provider=None)
+    queries = [case['query'] for case in TEST_CASES]
+
+    # 先确认两种实现输出一致
+    for query in queries:
+        before = normalized(legacy_extract_entities(query))
+        after = normalized(recognizer._extract_entities(query, 'other'))
+        assert before == after, f"输出不一致: {query}: {before} != {after}"
+
+    print('=' * 70)
+    print(f'实体抽取微基准（每条查询 {number} 次，单位: 微秒/次）')
+    print('=' * 70)
+    print(f"{'查询':<24}{'旧实现':>12}{'当前实现':>12}{'加速比':>10}")
+
+    total_before = total_after = 0.0
+    for query in queries:
+        before = timeit.timeit(lambda: legacy_extract_entities(query), number=number) / number * 1e6
+        after = timeit.timeit(lambda: recognizer._extract_entities(query, 'other'), number=number) / number * 1e6
+        total_before += before
+        total_after += after
+        print(f"{query:<24}{before:>12.2f}{after:>12.2f}{before / after:>9.2f}x")
+
+    print('-' * 70)
+    print(f"{'平均':<24}{total_before / len(queries):>12.2f}"
+          f"{total_after / len(queries):>12.2f}{total_before / total_after:>9.2f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='实体抽取微基准')
+    parser.add_argument('--number', type=int, default=20000, help='每条查询的执行次数')
+    run(parser.parse_args().number)
@@ -0,0 +1,58 @@
+"""
+pytest 共享 fixture
+"""
+import pytest
+from app.services.llm_cache import get_llm_cache
+from app.services.result_cache import get_query_result_cache
+import app.services.example_store as example_store
+import app.services.execution_history as execution_history
+import app.services.query_recommender as query_recommender
+import app.services.query_scheduler as query_scheduler
+
+
+@pytest.fixture(autouse=True)
+def clear_llm_cache():
+    """每个测试前后清空 LLM 响应缓存，避免用例之间互相影响"""
+    get_llm_cache().clear()
+    yield
+    get_llm_cache().clear()
+
+
+@pytest.fixture(autouse=True)
+def clear_query_result_cache():
+    """每个测试前后清空查询结果缓存"""
+    get_query_result_cache().clear()
+    yield
+    get_query_result_cache().clear()
+
+
+@pytest.fixture(autouse=True)
+def isolated_example_store(monkeypatch):
+    """示例库只保存在内存中，避免测试写入 data/ 并互相影响"""
+    monkeypatch.setattr(example_store, '_example_store', example_store.ExampleStore(path=None))
+    yield
+
+
+@pytest.fixture(autouse=True)
+def disabled_execution_history(monkeypatch):
+    """默认禁用执行历史，避免测试写入 data/"""
+    monkeypatch.setattr(execution_history, '_execution_history', execution_history.ExecutionHistory(path=None))
+    yield
+
+
+@pytest.fixture(autouse=True)
+def fresh_query_recommender(monkeypatch):
+    """每个测试使用空的查询推荐统计"""
+    monkeypatch.setattr(query_recommender, '_query_recommender', query_recommender.QueryRecommender())
+    yield
+
+
+@pytest.fixture(autouse=True)
+def idle_query_scheduler(monkeypatch):
+    """定时查询只保存在内存中且不启动调度线程，执行时返回空结果"""
+    scheduler = query_scheduler.QueryScheduler(
+        run_query=lambda sql, ttl: {'success': True, 'data': []}, path=None
+    )
+    monkeypatch.setattr(query_scheduler, '_query_scheduler', scheduler)
+    yield
+    scheduler.stop()
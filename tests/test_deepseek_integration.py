@@ -3,9 +3,13 @@ DeepSeek API 集成测试
 测试 LLM 提供商和 NL2SQL 转换功能
 """
 import os
+import json
+import asyncio
+import httpx
 import pytest
 from unittest.mock import Mock, patch, MagicMock
 from app import create_app
+from app.services.async_http import AsyncHTTPClient
 from app.services.llm_provider import DeepSeekProvider, OpenAIProvider, get_llm_provider
 from app.services.nl2sql import NL2SQLConverter
 
@@ -34,7 +38,7 @@ class TestDeepSeekProvider:
         assert hasattr(provider, 'base_url')
         assert hasattr(provider, 'model')
     
-    @patch('app.services.llm_provider.requests.post')
+    @patch('app.services.llm_provider.requests.Session.post')
     def test_successful_conversion(self, mock_post):
         """测试成功的 NL 转 SQL 转换"""
         provider = DeepSeekProvider()
@@ -59,7 +63,7 @@ class TestDeepSeekProvider:
         assert result == 'SELECT * FROM users'
         assert mock_post.called
     
-    @patch('app.services.llm_provider.requests.post')
+    @patch('app.services.llm_provider.requests.Session.post')
     def test_api_error_handling(self, mock_post):
         """测试 API 错误处理"""
         provider = DeepSeekProvider()
@@ -72,7 +76,7 @@ class TestDeepSeekProvider:
         
         assert result is None
     
-    @patch('app.services.llm_provider.requests.post')
+    @patch('app.services.llm_provider.requests.Session.post')
     def test_timeout_handling(self, mock_post):
         """测试超时处理"""
         provider = DeepSeekProvider()
@@ -84,6 +88,84 @@ class TestDeepSeekProvider:
         result = provider.convert_nl_to_sql('查询所有用户')
         
         assert result is None
+    
+    def test_session_reused_across_calls(self):
+        """测试 HTTP 会话在多次调用间复用"""
+        provider = DeepSeekProvider()
+        
+        session = provider._get_session()
+        
+        assert provider._get_session() is session
+        assert session.get_adapter('https://api.deepseek.com')._pool_maxsize == provider.pool_size
+        
+        provider.close()
+        assert provider._get_session() is not session
+
+
+class TestDeepSeekAsync:
+    """DeepSeek 异步接口测试"""
+    
+    def _client(self, handler):
+        return AsyncHTTPClient(transport=httpx.MockTransport(handler))
+    
+    def test_agenerate_uses_shared_async_client(self):
+        """测试 agenerate 通过共享异步客户端调用 API"""
+        requests_seen = []
+        
+        def handler(request):
+            requests_seen.append(request)
+            return httpx.Response(200, json={'choices': [{'message': {'content': ' {"intent": "other"} '}}]})
+        
+        client = self._client(handler)
+        provider = DeepSeekProvider()
+        provider.api_key = 'test_key'
+        
+        with patch('app.services.llm_provider.get_async_http_client', return_value=client):
+            result = asyncio.run(provider.agenerate('识别意图'))
+        client.close()
+        
+        assert result == '{"intent": "other"}'
+        assert len(requests_seen) == 1
+        assert requests_seen[0].headers['Authorization'] == 'Bearer test_key'
+    
+    def test_concurrent_async_calls_overlap_and_coalesce(self):
+        """测试不同 prompt 并发执行，相同 prompt 合并为一次调用"""
+        prompts = []
+        
+        async def handler(request):
+            prompts.append(json.loads(request.content)['messages'][1]['content'])
+            await asyncio.sleep(0.05)
+            return httpx.Response(200, json={'choices': [{'message': {'content': 'SELECT 1'}}]})
+        
+        client = self._client(handler)
+        provider = DeepSeekProvider()
+        provider.api_key = 'test_key'
+        
+        async def run():
+            return await asyncio.gather(
+                provider.aconvert_nl_to_sql('查询A'),
+                provider.aconvert_nl_to_sql('查询A'),
+                provider.aconvert_nl_to_sql('查询B'),
+            )
+        
+        with patch('app.services.llm_provider.get_async_http_client', return_value=client):
+            results = asyncio.run(run())
+        client.close()
+        
+        assert results == ['SELECT 1'] * 3
+        assert sorted(prompts) == ['Convert to SQL: 查询A', 'Convert to SQL: 查询B']
+    
+    def test_async_error_returns_none(self):
+        """测试异步转换出错时返回 None"""
+        client = self._client(lambda request: httpx.Response(500, text='boom'))
+        provider = DeepSeekProvider()
+        provider.api_key = 'test_key'
+        
+        with patch('app.services.llm_provider.get_async_http_client', return_value=client):
+            result = asyncio.run(provider.aconvert_nl_to_sql('查询所有用户'))
+        client.close()
+        
+        assert result is None
 
 
 class TestOpenAIProvider:
@@ -95,6 +177,18 @@ class TestOpenAIProvider:
         assert provider is not None
         assert hasattr(provider, 'api_key')
         assert hasattr(provider, 'model')
+    
+    def test_client_reused_across_calls(self):
+        """测试 OpenAI 客户端在多次调用间复用"""
+        provider = OpenAIProvider()
+        provider.api_key = 'test_key'
+        
+        client = provider._get_client()
+        
+        assert provider._get_client() is client
+        
+        provider.close()
+        assert provider._get_client() is not client
 
 
 class TestNL2SQLConverter:
@@ -0,0 +1,135 @@
+"""
+问题 → SQL 示例库测试
+"""
+import asyncio
+from unittest.mock import MagicMock
+
+from app import create_app
+from app.services.example_store import ExampleStore, get_example_store
+from app.services.nl2sql_enhanced import EnhancedNL2SQLConverter
+from app.services.unified_query_service import QueryIntent, QueryType, UnifiedQueryService
+
+OEE_SQL = "SELECT equipment_code, oee FROM oee_records WHERE record_date = CURRENT_DATE"
+
+
+class TestExampleStore:
+    """相似度检索、复用判定与持久化"""
+
+    def test_search_ranks_by_similarity(self):
+        store = ExampleStore()
+        store.add('查询今天各设备的OEE', OEE_SQL)
+        store.add('本月产品良率趋势', 'SELECT 1')
+        store.add('上周停机时间统计', 'SELECT 2')
+
+        matches = store.search('今天各设备OEE是多少', k=2)
+
+        assert matches[0][0].sql == OEE_SQL
+        assert [score for _, score in matches] == sorted((score for _, score in matches), reverse=True)
+
+    def test_reuse_requires_near_exact_match_and_same_numbers(self):
+        store = ExampleStore(reuse_threshold=0.9)
+        store.add('返回 oee_records 表前10条数据', 'SELECT * FROM oee_records LIMIT 10')
+
+        assert store.find_reusable('返回oee_records表前10条数据？').sql.endswith('LIMIT 10')
+        assert store.find_reusable('返回 oee_records 表前20条数据') is None
+        assert store.find_reusable('返回 production_orders 表前10条数据') is None
+
+    def test_reuse_requires_same_time_expressions(self):
+        store = ExampleStore(reuse_threshold=0.9)
+        long_question = '查询上个月第一车间所有设备每天的OEE、稼动率、良率和停机时长，按设备分组后按OEE从高到低排序显示'
+        store.add(long_question, 'SELECT 1 -- last month')
+        this_month = long_question.replace('上个月', '这个月')
+
+        assert store.search(this_month, k=1)[0][1] >= 0.9
+        assert store.find_reusable(this_month) is None
+        assert store.find_reusable(long_question.replace('上个月', '上月')).sql == 'SELECT 1 -- last month'
+
+        store.reuse_threshold = 0.5
+        store.add('查询今天各设备的OEE', OEE_SQL)
+        assert store.find_reusable('查询昨天各设备的OEE') is None
+        assert store.find_reusable('查询今日各设备的OEE').sql == OEE_SQL
+
+    def test_persistence_and_approved_precedence(self, tmp_path):
+        path = str(tmp_path / 'examples.jsonl')
+        store = ExampleStore(path=path)
+        store.add('查询今天各设备的OEE', OEE_SQL, source='approved')
+        store.add('查询今天各设备的OEE', 'SELECT * FROM oee_records')
+        store.add('查询今天各设备的OEE', OEE_SQL, source='approved')
+
+        reloaded = ExampleStore(path=path)
+        assert reloaded.stats()['examples'] == 1
+        assert reloaded.find_reusable('查询今天各设备的OEE').sql == OEE_SQL
+        assert len(open(path, encoding='utf-8').readlines()) == 1
+
+
+class TestExamplesInPipeline:
+    """示例复用与 few-shot 注入"""
+
+    def test_near_exact_question_reuses_sql_without_llm(self):
+        get_example_store().add('查询今天各设备的OEE数据', OEE_SQL)
+        converter = EnhancedNL2SQLConverter()
+        converter.llm_provider = MagicMock()
+
+        assert converter.convert('查询今天各设备的OEE数据。') == OEE_SQL
+        converter.llm_provider.generate.assert_not_called()
+
+    def test_similar_examples_are_injected_into_prompt(self):
+        get_example_store().add('查询今天各设备的OEE数据', OEE_SQL)
+        converter = EnhancedNL2SQLConverter()
+        converter._loaded.set()
+
+        prompt = converter._build_enhanced_prompt('查询昨天各设备的OEE数据')
+
+        assert '【参考示例】' in prompt
+        assert OEE_SQL in prompt
+        assert '【参考示例】' not in converter._build_enhanced_prompt('你好')
+
+    def test_successful_execution_is_recorded_and_reused(self):
+        service = UnifiedQueryService.__new__(UnifiedQueryService)
+        service.query_executor = MagicMock()
+        service.query_executor.execute_query.return_value = {'success': True, 'data': [{'oee': 0.85}]}
+        service.sql_compiler = MagicMock()
+        service.sql_compiler.compile.return_value = None
+        service.nl2sql_converter = MagicMock()
+        intent = QueryIntent(query_type=QueryType.UNKNOWN, natural_language='各设备今天的OEE')
+
+        asyncio.run(service.execute_approved_query(OEE_SQL, intent, sql_source='llm'))
+        sql, _, source = asyncio.run(service._generate_sql(intent))
+
+        assert (sql, source) == (OEE_SQL, 'example')
+        service.nl2sql_converter.aconvert.assert_not_called()
+
+    def test_sql_with_literal_dates_is_not_reused_on_a_later_day(self):
+        service = UnifiedQueryService.__new__(UnifiedQueryService)
+        service.query_executor = MagicMock()
+        service.query_executor.execute_query.return_value = {'success': True, 'data': [{'oee': 0.85}]}
+        intent = QueryIntent(query_type=QueryType.METRIC_QUERY, natural_language='查询今天各设备的OEE')
+        # 编译器把 "今天" 内联成当天的日期
+        compiled = "SELECT equipment_code, oee FROM oee_records WHERE record_date >= '2026-03-16'"
+
+        asyncio.run(service.execute_approved_query(compiled, intent, sql_source='compiler'))
+        asyncio.run(service.execute_approved_query(compiled, intent, sql_source='llm'))
+        asyncio.run(service.execute_approved_query(OEE_SQL, intent))
+
+        # 第二天编译器无法处理同一个问题时，不能从示例库拿到昨天的日期窗口
+        store = get_example_store()
+        assert store.stats()['examples'] == 0
+        assert store.find_reusable('查询今天各设备的OEE') is None
+        assert store.search('查询今天各设备的OEE') == []
+
+
+class TestExampleRoutes:
+    """示例库接口"""
+
+    def test_add_and_search(self):
+        client = create_app('testing').test_client()
+
+        response = client.post('/api/query/unified/examples',
+                               json={'natural_language': '查询今天各设备的OEE', 'sql': OEE_SQL})
+        assert response.status_code == 200
+        assert response.json['example']['source'] == 'approved'
+
+        body = client.get('/api/query/unified/examples?q=今天各设备OEE').json
+        assert body['stats']['examples'] == 1
+        assert body['examples'][0]['sql'] == OEE_SQL
+        assert client.post('/api/query/unified/examples', json={'sql': OEE_SQL}).status_code == 400
@@ -0,0 +1,130 @@
+"""
+查询执行历史测试
+"""
+import asyncio
+import threading
+from unittest.mock import MagicMock
+
+import pytest
+
+import app.services.execution_history as execution_history
+from app import create_app
+from app.services.execution_history import ExecutionHistory
+from app.services.sql_compiler import MetricSQLCompiler
+from app.services.unified_query_service import UnifiedQueryService
+
+
+@pytest.fixture
+def history(tmp_path, monkeypatch):
+    store = ExecutionHistory(path=str(tmp_path / 'history.db'), batch_size=10, flush_interval=0.05)
+    monkeypatch.setattr(execution_history, '_execution_history', store)
+    yield store
+    store.close()
+
+
+class TestExecutionHistory:
+    """缓冲写入与游标分页"""
+
+    def test_buffered_writes_and_keyset_pages(self, history):
+        for i in range(25):
+            history.record({'mode': 'execute' if i % 2 else 'explain',
+                            'natural_language': f'q{i}', 'success': True,
+                            'stage_timings': {'sql': i}})
+        history.flush()
+
+        first = history.page(limit=10)
+        assert first['total'] == 25
+        assert [row['natural_language'] for row in first['history'][:2]] == ['q24', 'q23']
+        assert first['history'][0]['stage_timings'] == {'sql': 24}
+
+        seen = [row['natural_language'] for row in first['history']]
+        cursor = first['next_cursor']
+        while cursor is not None:
+            page = history.page(limit=10, cursor=cursor)
+            assert page['total'] is None
+            seen += [row['natural_language'] for row in page['history']]
+            cursor = page['next_cursor']
+        assert seen == [f'q{i}' for i in range(24, -1, -1)]
+
+        assert history.page(limit=5, offset=20)['history'][-1]['natural_language'] == 'q0'
+        assert history.page(limit=50, mode='execute')['total'] == 12
+
+    def test_full_queue_drops_without_blocking(self, tmp_path):
+        history = ExecutionHistory(path=str(tmp_path / 'h.db'), max_queue=2, flush_interval=5)
+        history._ensure_writer = lambda: None
+        for i in range(5):
+            history.record({'mode': 'execute', 'success': True})
+        assert history.dropped == 3
+        history.flush()
+        assert history.page()['total'] == 2
+
+    def test_concurrent_records_start_a_single_writer(self, history):
+        barrier = threading.Barrier(16)
+
+        def record(i):
+            barrier.wait()
+            history.record({'mode': 'execute', 'natural_language': f'q{i}', 'success': True})
+
+        threads = [threading.Thread(target=record, args=(i,)) for i in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        history.flush()
+
+        writers = [t for t in threading.enumerate() if t.name == 'execution-history-writer' and t.is_alive()]
+        assert writers == [history._writer]
+        assert history.page(limit=50)['total'] == 16
+
+    def test_disabled_history(self):
+        history = ExecutionHistory(path=None)
+        history.record({'mode': 'execute'})
+        assert history.page() == {'history': [], 'next_cursor': None, 'total': 0}
+
+
+class TestHistoryRecording:
+    """process / execute 调用写入历史"""
+
+    def test_process_and_approved_execution_are_recorded(self, history):
+        service = UnifiedQueryService.__new__(UnifiedQueryService)
+        service.intent_recognizer = MagicMock()
+        service.intent_recognizer.recognize.return_value = {
+            'intent': 'query_equipment', 'confidence': 0.9,
+            'entities': {'metrics': ['oee'], 'timeRange': 'today'}
+        }
+        service.sql_compiler = MetricSQLCompiler()
+        service.nl2sql_converter = MagicMock()
+        service.nl2sql_converter.annotation_metadata = {}
+        service.nl2sql_converter.aconvert = MagicMock(side_effect=lambda *a, **k: _value("SELECT 1"))
+        service.nl2sql_converter.get_metadata_summary.return_value = {}
+        service.query_executor = MagicMock()
+        service.query_executor.execute_query.return_value = {'success': True, 'data': [{'a': 1}], 'cached': True}
+
+        asyncio.run(service.process_natural_language_query(
+            "查询今天的OEE", execution_mode="execute", defer_explanation=True
+        ))
+        asyncio.run(service.execute_approved_query("SELECT 2"))
+        history.flush()
+
+        approved, processed = history.page()['history']
+        assert approved['mode'] == 'approved' and approved['sql'] == "SELECT 2"
+        assert processed['mode'] == 'execute'
+        assert processed['intent'] == 'query_equipment'
+        assert processed['rows_count'] == 1 and processed['cached'] is True
+        assert 'sql' in processed['stage_timings']
+
+    def test_route_paginates(self, history):
+        for i in range(3):
+            history.record({'mode': 'explain', 'natural_language': f'q{i}', 'success': True})
+        history.flush()
+        client = create_app('testing').test_client()
+
+        body = client.get('/api/query/unified/execution-history?limit=2').json
+        assert body['total'] == 3 and len(body['history']) == 2
+        rest = client.get(f"/api/query/unified/execution-history?limit=2&cursor={body['next_cursor']}").json
+        assert [row['natural_language'] for row in rest['history']] == ['q0']
+        assert rest['next_cursor'] is None
+
+
+async def _value(value):
+    return value
@@ -0,0 +1,124 @@
+"""
+Batch intent recognition tests
+"""
+import json
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+from app import create_app
+from app.services.intent_recognizer import IntentRecognizer
+
+
+class NeverConfident:
+    """Classifier stub that always defers to the LLM"""
+
+    def predict(self, text):
+        return 'other', 0.0
+
+
+class ProductionOnly:
+    """Classifier stub that is only confident about production queries"""
+
+    def predict(self, text):
+        return ('query_production', 0.95) if '产量' in text else ('other', 0.0)
+
+
+def packed_llm(intent='query_equipment', skip=()):
+    """LLM stub answering packed prompts with one entry per numbered query"""
+    def generate(prompt):
+        if 'User queries:' not in prompt:
+            return json.dumps({'intent': intent, 'confidence': 0.8, 'reasoning': 'single'})
+        count = sum(1 for line in prompt.split('User queries:')[1].splitlines() if line[:1].isdigit())
+        return json.dumps([
+            {'id': i, 'intent': intent, 'confidence': 0.9, 'reasoning': 'packed'}
+            for i in range(count) if i not in skip
+        ])
+    llm = MagicMock()
+    llm.generate.side_effect = generate
+    return llm
+
+
+class TestRecognizeBatch:
+    """Rule path for every item, packed prompts for the rest"""
+
+    def test_local_hits_skip_llm_and_order_is_kept(self):
+        llm = packed_llm()
+        recognizer = IntentRecognizer(llm_provider=llm, classifier=ProductionOnly())
+
+        results = recognizer.recognize_batch(['查询今天的产量', '机台状态', '本月良品率是多少'])
+
+        assert [r['success'] for r in results] == [True, True, True]
+        assert results[0]['methodsUsed'] == ['rule', 'classifier']
+        assert results[1]['intent'] == 'query_equipment'
+        assert results[1]['reasoning'] == 'packed'
+        assert llm.generate.call_count == 1
+        for result in results:
+            assert set(result['timings']) == {'local_ms', 'llm_ms', 'total_ms'}
+
+    def test_pending_items_are_packed_by_batch_size(self):
+        llm = packed_llm()
+        recognizer = IntentRecognizer(llm_provider=llm, classifier=NeverConfident())
+
+        results = recognizer.recognize_batch([f'机台{i}状态' for i in range(5)], llm_batch_size=2)
+
+        assert llm.generate.call_count == 3
+        assert all(r['intent'] == 'query_equipment' for r in results)
+
+    def test_missing_items_fall_back_to_single_calls(self):
+        llm = packed_llm(skip={1})
+        recognizer = IntentRecognizer(llm_provider=llm, classifier=NeverConfident())
+
+        results = recognizer.recognize_batch(['机台A状态', '机台B状态'])
+
+        assert results[0]['reasoning'] == 'packed'
+        assert results[1]['reasoning'] == 'single'
+        assert llm.generate.call_count == 2
+
+    def test_fallbacks_run_on_the_pool_and_report_only_their_own_time(self):
+        callers = []
+        packed = packed_llm(skip={0, 1}).generate.side_effect
+
+        def generate(prompt):
+            if 'User queries:' in prompt:
+                time.sleep(0.05)
+            else:
+                callers.append(threading.current_thread())
+            return packed(prompt)
+
+        llm = MagicMock()
+        llm.generate.side_effect = generate
+        recognizer = IntentRecognizer(llm_provider=llm, classifier=NeverConfident())
+
+        results = recognizer.recognize_batch(['机台A状态', '机台B状态', '机台C状态'])
+
+        assert [r['reasoning'] for r in results] == ['single', 'single', 'packed']
+        assert len(callers) == 2
+        assert threading.main_thread() not in callers
+        assert results[2]['timings']['llm_ms'] >= 50
+        assert all(r['timings']['llm_ms'] < 50 for r in results[:2])
+
+
+class TestBatchRoute:
+    """POST /api/query/recognize-intent/batch"""
+
+    def test_batch_route(self):
+        client = create_app('testing').test_client()
+        recognizer = IntentRecognizer(llm_provider=None, classifier=ProductionOnly())
+        with patch('app.routes.query_routes.get_intent_recognizer_instance', return_value=recognizer):
+            response = client.post('/api/query/recognize-intent/batch',
+                                   json={'queries': ['查询今天的产量', '  ']})
+
+        assert response.status_code == 200
+        body = response.json
+        assert body['count'] == 2
+        assert body['results'][0]['_backend']['recognizedIntent'] == 'query_production'
+        assert 'timings' in body['results'][0]
+        assert body['results'][1]['success'] is False
+
+    def test_rejects_oversized_batch(self, monkeypatch):
+        monkeypatch.setenv('INTENT_BATCH_MAX_ITEMS', '2')
+        client = create_app('testing').test_client()
+        response = client.post('/api/query/recognize-intent/batch', json={'queries': ['a', 'b', 'c']})
+        assert response.status_code == 400
+        assert client.post('/api/query/recognize-intent/batch', json={}).status_code == 400
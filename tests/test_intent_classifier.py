@@ -0,0 +1,93 @@
+"""
+Local intent classifier tests
+"""
+import json
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.services.intent_classifier import (
+    DEFAULT_MODEL_PATH, IntentClassifier, char_ngrams, train_intent_classifier
+)
+from app.services.intent_recognizer import IntentRecognizer
+from app.tools.train_intent_classifier import load_samples
+
+SAMPLES = [
+    ('今天的产量', 'query_production'), ('本周生产了多少', 'query_production'),
+    ('上月产出多少件', 'query_production'), ('昨天完成的产量', 'query_production'),
+    ('本月良品率', 'query_quality'), ('昨天不良品数量', 'query_quality'),
+    ('本周合格率是多少', 'query_quality'), ('上月缺陷分布', 'query_quality'),
+    ('你好', 'other'), ('谢谢', 'other'), ('你是谁', 'other'), ('再见', 'other'),
+]
+
+
+@pytest.fixture(scope='module')
+def model():
+    return train_intent_classifier(SAMPLES, min_df=1, holdout=0.25, epochs=40)
+
+
+class TestIntentClassifier:
+    """Training, prediction and serialization"""
+
+    def test_char_ngrams_normalize_width_and_case(self):
+        assert char_ngrams('ＯＥＥ') == char_ngrams('oee')
+        assert 'oe' in char_ngrams('OEE', (2, 2))
+
+    def test_predicts_unseen_phrasing(self, model):
+        assert model.predict('上周的产量')[0] == 'query_production'
+        assert model.predict('今天良品率怎么样')[0] == 'query_quality'
+        probs = model.predict_proba('你好呀')
+        assert abs(sum(probs.values()) - 1) < 1e-9
+
+    def test_round_trip(self, model, tmp_path):
+        path = tmp_path / 'model.json'
+        model.save(str(path))
+        loaded = IntentClassifier.load(str(path))
+        label, confidence = model.predict('本月产量')
+        loaded_label, loaded_confidence = loaded.predict('本月产量')
+        assert loaded_label == label
+        assert abs(loaded_confidence - confidence) < 1e-3
+
+    def test_bundled_model_loads(self):
+        bundled = IntentClassifier.load(DEFAULT_MODEL_PATH)
+        assert 'other' in bundled.classes
+        assert bundled.predict('查询本月各产线的良品率')[0] == 'query_quality'
+
+
+class TestRecognizerWithClassifier:
+    """LLM is only consulted when the classifier is not confident"""
+
+    def test_confident_classifier_skips_llm(self, model):
+        llm = MagicMock()
+        recognizer = IntentRecognizer(llm_provider=llm, classifier=model)
+        recognizer.classifier_threshold = 0.3
+
+        result = recognizer.recognize('查询今天的产量')
+
+        assert result['intent'] == 'query_production'
+        assert result['methodsUsed'] == ['rule', 'classifier']
+        assert result['entities']['timeRange'] == 'today'
+        llm.generate.assert_not_called()
+
+    def test_low_confidence_falls_back_to_llm_and_logs(self, model, tmp_path):
+        llm = MagicMock()
+        llm.generate.return_value = '{"intent": "query_equipment", "confidence": 0.9}'
+        recognizer = IntentRecognizer(llm_provider=llm, classifier=model)
+        recognizer.classifier_threshold = 1.01
+        recognizer.query_log_path = str(tmp_path / 'queries.jsonl')
+
+        result = recognizer.recognize('机台状态')
+
+        assert result['methodsUsed'] == ['rule', 'llm']
+        logged = json.loads((tmp_path / 'queries.jsonl').read_text(encoding='utf-8'))
+        assert logged['query'] == '机台状态' and logged['intent'] == 'query_equipment'
+
+    def test_trainer_filters_low_confidence_labels(self, tmp_path):
+        path = tmp_path / 'log.jsonl'
+        path.write_text('\n'.join([
+            json.dumps({'query': 'a', 'intent': 'x', 'confidence': 0.95}),
+            json.dumps({'query': 'b', 'intent': 'y', 'confidence': 0.4}),
+            'not json',
+            json.dumps({'query': 'a', 'intent': 'z'}),
+        ]), encoding='utf-8')
+        assert load_samples([str(path)], min_confidence=0.8) == [('a', 'z')]
@@ -0,0 +1,93 @@
+"""
+Intent latency mode tests: speculative LLM calls and spend tracking
+"""
+import json
+import threading
+import time
+from unittest.mock import MagicMock
+
+from app.services.intent_recognizer import IntentRecognizer
+
+
+class FixedClassifier:
+    """Classifier stub returning a fixed prediction"""
+
+    def __init__(self, intent, confidence):
+        self.intent, self.confidence = intent, confidence
+
+    def predict(self, text):
+        return self.intent, self.confidence
+
+
+def blocking_llm(release):
+    """LLM stub that waits for release before answering"""
+    def generate(prompt):
+        release.wait(5)
+        return json.dumps({'intent': 'query_equipment', 'confidence': 0.9, 'reasoning': 'llm'})
+    llm = MagicMock()
+    llm.generate.side_effect = generate
+    return llm
+
+
+def make_recognizer(monkeypatch, mode, llm, classifier):
+    monkeypatch.setenv('INTENT_LATENCY_MODE', mode)
+    return IntentRecognizer(llm_provider=llm, classifier=classifier)
+
+
+class TestSpeculativeMode:
+    """The LLM call starts with the rules and is dropped when they are confident"""
+
+    def test_confident_local_result_does_not_wait_for_llm(self, monkeypatch):
+        release = threading.Event()
+        recognizer = make_recognizer(monkeypatch, 'speculative', blocking_llm(release),
+                                     FixedClassifier('query_production', 0.95))
+
+        start = time.perf_counter()
+        result = recognizer.recognize('查询今天的产量')
+        elapsed = time.perf_counter() - start
+        release.set()
+
+        assert elapsed < 1
+        assert result['methodsUsed'] == ['rule', 'classifier']
+        stats = recognizer.get_llm_spend_stats()['modes']['speculative']
+        assert stats['requests'] == 1
+        assert stats['llm_results_used'] == 0
+        assert stats['llm_cancelled'] + stats['llm_abandoned'] == 1
+
+    def test_unsure_local_result_merges_llm(self, monkeypatch):
+        release = threading.Event()
+        release.set()
+        llm = blocking_llm(release)
+        recognizer = make_recognizer(monkeypatch, 'speculative', llm, FixedClassifier('other', 0.1))
+
+        result = recognizer.recognize('机台状态')
+
+        assert result['intent'] == 'query_equipment'
+        assert result['methodsUsed'] == ['rule', 'llm']
+        stats = recognizer.get_llm_spend_stats()['modes']['speculative']
+        assert stats['llm_calls'] == 1 and stats['llm_results_used'] == 1
+        assert stats['prompt_tokens'] > 0 and stats['completion_tokens'] > 0
+
+
+class TestSequentialMode:
+    """Default mode only calls the LLM when the local path is unsure"""
+
+    def test_spend_counts(self, monkeypatch):
+        release = threading.Event()
+        release.set()
+        llm = blocking_llm(release)
+        recognizer = make_recognizer(monkeypatch, 'sequential', llm, FixedClassifier('other', 0.1))
+        recognizer.recognize('机台状态')
+        recognizer.classifier = FixedClassifier('query_production', 0.95)
+        recognizer.recognize('查询今天的产量')
+
+        stats = recognizer.get_llm_spend_stats()
+        assert stats['latency_mode'] == 'sequential'
+        assert stats['modes']['sequential']['requests'] == 2
+        assert stats['modes']['sequential']['llm_calls'] == 1
+        assert stats['modes']['sequential']['llm_calls_per_request'] == 0.5
+        assert llm.generate.call_count == 1
+
+    def test_unknown_mode_falls_back(self, monkeypatch):
+        recognizer = make_recognizer(monkeypatch, 'eager', None, FixedClassifier('other', 0.1))
+        assert recognizer.latency_mode == 'sequential'
@@ -0,0 +1,115 @@
+"""
+Rule-based intent matching tests (keyword automaton)
+"""
+import random
+
+from app.services.intent_recognizer import IntentRecognizer, METRIC_KEYWORDS, TIME_EXPRESSIONS
+from app.services.keyword_automaton import KeywordAutomaton
+
+
+def naive_scores(recognizer, text):
+    """Reference implementation: substring search per keyword"""
+    lowered = text.lower()
+    scores = {}
+    for name, config in recognizer.intents.items():
+        hits = sum(1 for k in config['keywords'] if k.lower() in lowered)
+        if hits:
+            scores[name] = hits / len(config['keywords'])
+    return scores
+
+
+class TestKeywordAutomaton:
+    """Aho-Corasick matching"""
+
+    def test_overlapping_and_nested_keywords(self):
+        automaton = KeywordAutomaton()
+        for word in ['he', 'she', 'his', 'hers']:
+            automaton.add(word, word)
+        matches = sorted((start, kw) for start, kw, _ in automaton.iter_matches('ushers'))
+        assert matches == [(1, 'she'), (2, 'he'), (2, 'hers')]
+
+    def test_matches_naive_substring_search(self):
+        rng = random.Random(7)
+        alphabet = '设备产量良率ab'
+        words = {''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 4))) for _ in range(60)}
+        automaton = KeywordAutomaton()
+        for word in words:
+            automaton.add(word, word)
+        for _ in range(200):
+            text = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 30)))
+            assert automaton.find_payloads(text) == {w for w in words if w in text}
+
+    def test_same_keyword_multiple_payloads(self):
+        automaton = KeywordAutomaton()
+        automaton.add('效率', 'intent')
+        automaton.add('效率', 'metric')
+        assert automaton.find_payloads('设备效率') == {'intent', 'metric'}
+
+
+class TestRuleBasedMatch:
+    """IntentRecognizer rule path"""
+
+    QUERIES = [
+        '返回 wafers 表的前300条数据',
+        '查询今天的产量',
+        '本月的良品率是多少',
+        '设备A的OEE和稼动率',
+        '生成本月的生产报表',
+        '比较本月和上月的产量',
+        '昨日 oee 统计与上周对比',
+        'hello',
+    ]
+
+    def test_scores_match_reference(self):
+        recognizer = IntentRecognizer()
+        for query in self.QUERIES:
+            scores = naive_scores(recognizer, query)
+            result = recognizer._rule_based_match(query)
+            if scores:
+                assert result['intent'] == max(scores, key=scores.get)
+                assert result['confidence'] == scores[result['intent']]
+            else:
+                assert result['intent'] == 'other'
+
+    def test_time_expression_priority_not_position(self):
+        recognizer = IntentRecognizer()
+        # 'last_month' appears first in the text, but 'this_month' has higher priority
+        assert recognizer._extract_entities('上个月和本月的产量', 'query_production')['timeRange'] == 'this_month'
+
+    def test_metrics_collected_in_single_pass(self):
+        entities = IntentRecognizer()._extract_entities('设备OEE、良率和停机', 'query_equipment')
+        assert sorted(entities['metrics']) == ['downtime', 'oee', 'yield_rate']
+
+    def test_vocabulary_is_shared_with_module_constants(self):
+        recognizer = IntentRecognizer()
+        hits = recognizer._scan_keywords('今天 ' + ' '.join(METRIC_KEYWORDS))
+        assert ('time', 0, TIME_EXPRESSIONS[0][0]) in hits
+        assert {h[1] for h in hits if h[0] == 'metric'} == set(METRIC_KEYWORDS.values())
+
+    def test_rebuild_after_adding_keywords(self):
+        recognizer = IntentRecognizer()
+        recognizer.intents['query_equipment']['keywords'].append('机台')
+        recognizer.rebuild_keyword_matcher()
+        assert recognizer._rule_based_match('机台')['intent'] == 'query_equipment'
+
+
+class TestEntityPatterns:
+    """Precompiled entity patterns"""
+
+    def test_numeric_time_limit_and_table(self):
+        entities = IntentRecognizer()._extract_entities('返回 wafers 表最近 7 天的前 20 条', 'direct_query')
+        assert entities['timeRange'] == '7天'
+        assert entities['table'] == 'wafers'
+        assert entities['limit'] == 20
+
+    def test_named_time_beats_numeric(self):
+        entities = IntentRecognizer()._extract_entities('本月 3 周', 'query_production')
+        assert entities['timeRange'] == 'this_month'
+
+    def test_equipment_and_product_line(self):
+        entities = IntentRecognizer()._extract_entities('设备：EQ01 在产品线 P2', 'query_equipment')
+        assert entities['equipment'] == 'EQ01'
+        assert entities['productLine'] == 'P2'
+
+    def test_patterns_skipped_without_anchor(self):
+        assert IntentRecognizer()._extract_entities('hello 42', 'other') == {}
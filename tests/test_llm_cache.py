@@ -0,0 +1,142 @@
+"""
+LLM 响应缓存测试
+"""
+import threading
+import time
+import pytest
+from unittest.mock import patch, MagicMock
+from app.services.llm_cache import LLMResponseCache
+from app.services.llm_provider import DeepSeekProvider
+from app.services.single_flight import SingleFlight
+
+
+def _mock_response(content):
+    response = MagicMock()
+    response.status_code = 200
+    response.json.return_value = {'choices': [{'message': {'content': content}}]}
+    return response
+
+
+class TestLLMResponseCache:
+    """缓存本身的行为测试"""
+    
+    def test_key_depends_on_all_parts(self):
+        """测试缓存键区分模型、温度和 prompt"""
+        key = LLMResponseCache.make_key('DeepSeekProvider', 'deepseek-chat', 0.2, 'generate', 'q')
+        
+        assert key == LLMResponseCache.make_key('DeepSeekProvider', 'deepseek-chat', 0.2, 'generate', 'q')
+        assert key != LLMResponseCache.make_key('DeepSeekProvider', 'deepseek-chat', 0.3, 'generate', 'q')
+        assert key != LLMResponseCache.make_key('DeepSeekProvider', 'other-model', 0.2, 'generate', 'q')
+        assert key != LLMResponseCache.make_key('DeepSeekProvider', 'deepseek-chat', 0.2, 'generate', 'q2')
+    
+    def test_lru_eviction(self):
+        """测试超过容量时淘汰最久未使用的条目"""
+        cache = LLMResponseCache(max_entries=2)
+        cache.set('a', '1')
+        cache.set('b', '2')
+        cache.get('a')
+        cache.set('c', '3')
+        
+        assert cache.get('a') == '1'
+        assert cache.get('b') is None
+        assert cache.get('c') == '3'
+        assert cache.get_stats()['evictions'] == 1
+    
+    def test_ttl_expiry(self):
+        """测试条目过期"""
+        cache = LLMResponseCache(ttl_seconds=10)
+        with patch('app.services.llm_cache.time.monotonic', return_value=100.0):
+            cache.set('a', '1')
+        with patch('app.services.llm_cache.time.monotonic', return_value=105.0):
+            assert cache.get('a') == '1'
+        with patch('app.services.llm_cache.time.monotonic', return_value=111.0):
+            assert cache.get('a') is None
+    
+    def test_hit_miss_counters_and_invalidate(self):
+        """测试命中统计和整体失效"""
+        cache = LLMResponseCache()
+        cache.get('a')
+        cache.set('a', '1')
+        cache.get('a')
+        
+        stats = cache.get_stats()
+        assert stats['hits'] == 1
+        assert stats['misses'] == 1
+        
+        assert cache.invalidate() == 1
+        assert cache.get('a') is None
+
+
+class TestProviderCaching:
+    """provider 经过缓存调用 LLM"""
+    
+    @patch('app.services.llm_provider.requests.Session.post')
+    def test_identical_prompt_hits_cache(self, mock_post):
+        """测试相同 prompt 只调用一次上游 API"""
+        mock_post.return_value = _mock_response('SELECT 1')
+        provider = DeepSeekProvider()
+        provider.api_key = 'test_key'
+        
+        assert provider.convert_nl_to_sql('查询今天各设备的OEE数据') == 'SELECT 1'
+        assert provider.convert_nl_to_sql('查询今天各设备的OEE数据') == 'SELECT 1'
+        
+        assert mock_post.call_count == 1
+    
+    @patch('app.services.llm_provider.requests.Session.post')
+    def test_failed_result_not_cached(self, mock_post):
+        """测试失败结果不写入缓存"""
+        mock_post.side_effect = [Exception('API Error'), _mock_response('SELECT 1')]
+        provider = DeepSeekProvider()
+        provider.api_key = 'test_key'
+        
+        assert provider.convert_nl_to_sql('查询所有用户') is None
+        assert provider.convert_nl_to_sql('查询所有用户') == 'SELECT 1'
+
+
+class TestSingleFlight:
+    """并发相同请求合并测试"""
+    
+    def test_concurrent_callers_share_one_call(self):
+        """测试并发调用方等待同一个进行中的请求"""
+        single_flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+        
+        def slow_call():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return 'SELECT 1'
+        
+        results = []
+        leader = threading.Thread(target=lambda: results.append(single_flight.do('k', slow_call)))
+        leader.start()
+        started.wait(5)
+        
+        followers = [
+            threading.Thread(target=lambda: results.append(single_flight.do('k', slow_call)))
+            for _ in range(3)
+        ]
+        for t in followers:
+            t.start()
+        while single_flight.get_stats()['coalesced'] < 3:
+            time.sleep(0.001)
+        release.set()
+        for t in [leader] + followers:
+            t.join(5)
+        
+        assert len(calls) == 1
+        assert results == ['SELECT 1'] * 4
+        assert single_flight.in_flight() == 0
+    
+    def test_error_propagates_to_waiters(self):
+        """测试执行者的异常传递给所有等待者，且不会残留进行中的调用"""
+        single_flight = SingleFlight()
+        
+        def failing():
+            raise RuntimeError('upstream down')
+        
+        with pytest.raises(RuntimeError):
+            single_flight.do('k', failing)
+        assert single_flight.do('k', lambda: 'ok') == 'ok'
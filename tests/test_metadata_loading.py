@@ -0,0 +1,107 @@
+"""
+Schema 元数据后台加载测试
+"""
+import os
+import threading
+import time
+from unittest.mock import patch
+
+from app.services.nl2sql_enhanced import EnhancedNL2SQLConverter
+
+METADATA = {
+    'tables': {'oee_records': {'name_cn': '设备综合效率记录'}},
+    'columns': {'oee_records': {'oee': {'name_cn': '综合效率', 'data_type': 'numeric'}}},
+}
+
+
+class TestMetadataLoading:
+    """启动不阻塞 + read-through + 周期刷新"""
+
+    def test_constructor_does_not_load(self):
+        with patch.object(EnhancedNL2SQLConverter, '_fetch_metadata') as fetch:
+            EnhancedNL2SQLConverter()
+        fetch.assert_not_called()
+
+    def test_first_access_reads_through_in_process(self):
+        converter = EnhancedNL2SQLConverter()
+        with patch('app.services.schema_annotator.schema_annotator.get_approved_schema_metadata',
+                   return_value=METADATA) as loader:
+            assert converter.get_table_name_from_cn('设备综合效率记录') == 'oee_records'
+            converter.get_metadata_summary()
+        loader.assert_called_once()
+
+    def test_failed_load_does_not_block_requests(self):
+        converter = EnhancedNL2SQLConverter()
+        with patch.object(converter, '_fetch_metadata', side_effect=RuntimeError('db down')) as fetch:
+            assert converter.get_metadata_summary()['tables'] == 0
+            converter.get_metadata_summary()
+        assert fetch.call_count == 1
+
+    def test_background_refresh_with_jitter(self):
+        converter = EnhancedNL2SQLConverter()
+        calls = []
+        refreshed = threading.Event()
+
+        def fetch(full=False):
+            calls.append(time.monotonic())
+            if len(calls) >= 2:
+                refreshed.set()
+            return METADATA
+
+        with patch.object(converter, '_fetch_metadata', side_effect=fetch), \
+                patch.object(converter, '_next_refresh_delay', return_value=0.01):
+            converter.start_background_refresh()
+            converter.start_background_refresh()  # 同一进程只启动一个线程
+            assert refreshed.wait(2)
+            converter.stop_background_refresh()
+            converter._refresh_thread.join(1)
+
+        assert converter.metadata_version is not None
+        assert not converter._refresh_thread.is_alive()
+
+    def test_concurrent_restart_after_fork_starts_one_thread(self):
+        converter = EnhancedNL2SQLConverter()
+        converter._loaded.set()
+        converter._refresh_pid = -1  # 模拟 fork：记录的是父进程的 pid
+        started, release = [], threading.Event()
+        barrier = threading.Barrier(16)
+
+        def loop():
+            started.append(threading.current_thread())
+            release.wait(2)
+
+        def request():
+            barrier.wait()
+            converter._ensure_metadata()
+
+        # 拉大检查 pid 与创建线程之间的窗口
+        real_getpid = os.getpid
+
+        def slow_getpid():
+            time.sleep(0.005)
+            return real_getpid()
+
+        class SlowThread(threading.Thread):
+            def __init__(self, *args, **kwargs):
+                time.sleep(0.01)
+                super().__init__(*args, **kwargs)
+
+        requests = [threading.Thread(target=request) for _ in range(16)]
+        with patch.object(converter, '_refresh_loop', side_effect=loop), \
+                patch('app.services.nl2sql_enhanced.os.getpid', side_effect=slow_getpid), \
+                patch('app.services.nl2sql_enhanced.threading.Thread', SlowThread):
+            for thread in requests:
+                thread.start()
+            for thread in requests:
+                thread.join()
+        release.set()
+        converter._refresh_thread.join(1)
+
+        assert len(started) == 1
+
+    def test_refresh_delay_stays_within_jitter(self):
+        converter = EnhancedNL2SQLConverter()
+        converter.refresh_interval, converter.refresh_jitter = 100, 0.1
+        delays = [converter._next_refresh_delay() for _ in range(50)]
+        assert all(90 <= d <= 110 for d in delays)
+        assert len(set(delays)) > 1
@@ -0,0 +1,183 @@
+"""
+PostgreSQL 只读引擎测试（使用假连接池，不需要真实数据库）
+"""
+import threading
+import time
+from unittest.mock import patch
+
+from app.services.postgres_read_engine import PostgreSQLReadEngine
+from app.services.query_executor import QueryExecutor
+
+
+class FakeCursor:
+    def __init__(self, conn, name=None):
+        self.conn = conn
+        self.name = name
+        self.description = None
+        self.rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def execute(self, sql, params=None):
+        self.conn.executed.append((sql, params))
+        if self.conn.fail_health and sql == "SELECT 1":
+            raise RuntimeError("server closed the connection")
+        if sql.startswith("SELECT line"):
+            time.sleep(self.conn.delay)
+            self.description = [('line',), ('avg_oee',)]
+            self.rows = [{'line': 'L1', 'avg_oee': 0.8}, {'line': 'L2', 'avg_oee': 0.7}]
+
+    def fetchmany(self, size):
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        return batch
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, fail_health=False, delay=0.0):
+        self.closed = 0
+        self.fail_health = fail_health
+        self.delay = delay
+        self.executed = []
+        self.cursors = []
+        self.readonly = None
+
+    def cursor(self, name=None, cursor_factory=None):
+        cur = FakeCursor(self, name)
+        self.cursors.append(cur)
+        return cur
+
+    def set_session(self, readonly=None):
+        self.readonly = readonly
+
+    def rollback(self):
+        pass
+
+
+class FakePool:
+    """记录借还的连接池桩"""
+
+    def __init__(self, minconn, maxconn, *args, connections=None, **kwargs):
+        self.idle = list(connections or [])
+        self.returned = []
+        self.closed_conns = []
+        self.checked_out = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def getconn(self):
+        with self.lock:
+            self.checked_out += 1
+            self.peak = max(self.peak, self.checked_out)
+            return self.idle.pop(0) if self.idle else FakeConnection(delay=0.1)
+
+    def putconn(self, conn, close=False):
+        with self.lock:
+            self.checked_out -= 1
+        if close:
+            self.closed_conns.append(conn)
+        else:
+            self.returned.append(conn)
+            self.idle.append(conn)
+
+    def closeall(self):
+        pass
+
+
+def make_engine(connections=None, **kwargs):
+    holder = {}
+
+    def factory(minconn, maxconn, *args, **kw):
+        holder['pool'] = FakePool(minconn, maxconn, connections=connections)
+        return holder['pool']
+
+    engine = PostgreSQLReadEngine(dsn='postgresql://test', pool_factory=factory, **kwargs)
+    return engine, holder
+
+
+class TestPostgreSQLReadEngine:
+    """连接池引擎"""
+
+    def test_runs_sql_verbatim_in_read_only_transaction(self):
+        conn = FakeConnection()
+        engine, holder = make_engine([conn], statement_timeout_ms=5000)
+
+        sql = "SELECT line, AVG(oee) AS avg_oee FROM oee_records o JOIN lines l ON l.id = o.line_id GROUP BY line"
+        result = engine.execute_query(sql + ";")
+
+        assert result['success'] is True
+        assert result['data'] == [{'line': 'L1', 'avg_oee': 0.8}, {'line': 'L2', 'avg_oee': 0.7}]
+        assert result['columns'] == ['line', 'avg_oee']
+        assert conn.readonly is True
+        assert ("SET LOCAL statement_timeout = %s", (5000,)) in conn.executed
+        assert (sql, None) in conn.executed
+        assert holder['pool'].returned == [conn]
+
+    def test_rejects_non_select(self):
+        engine, _ = make_engine()
+        assert engine.execute_query("DELETE FROM oee_records")['success'] is False
+        assert 'Multiple' in engine.execute_query("SELECT 1; DROP TABLE x")['error']
+        assert engine.validate_read_only("SELECT ';' AS semi") is None
+
+    def test_unhealthy_connection_is_replaced(self):
+        stale = FakeConnection(fail_health=True)
+        engine, holder = make_engine([stale])
+
+        result = engine.execute_query("SELECT line FROM oee_records")
+
+        assert result['success'] is True
+        assert holder['pool'].closed_conns == [stale]
+        assert engine.get_stats()['discarded_connections'] == 1
+
+    def test_row_cap_and_truncation(self):
+        engine, _ = make_engine(max_rows=1)
+        result = engine.execute_query("SELECT line FROM oee_records")
+        assert result['count'] == 1 and result['truncated'] is True
+
+    def test_stream_uses_server_side_cursor(self):
+        conn = FakeConnection()
+        engine, holder = make_engine([conn])
+
+        batches = list(engine.stream_query("SELECT line FROM oee_records", batch_size=1))
+
+        assert batches == [[{'line': 'L1', 'avg_oee': 0.8}], [{'line': 'L2', 'avg_oee': 0.7}]]
+        assert conn.cursors[-1].name.startswith('nl2sql_stream_')
+        assert holder['pool'].returned == [conn]
+
+    def test_callers_wait_for_free_slot(self):
+        """超过 max_size 的并发查询排队等待，而不是因连接池耗尽报错"""
+        engine, holder = make_engine(max_size=2)
+        results = []
+
+        def run():
+            results.append(engine.execute_query("SELECT line FROM oee_records")['success'])
+
+        threads = [threading.Thread(target=run) for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert results == [True] * 5
+        assert holder['pool'].peak == 2
+
+
+class TestQueryExecutorEngineSelection:
+    """QUERY_ENGINE 选择执行引擎"""
+
+    def test_postgres_engine_bypasses_translation(self):
+        engine, _ = make_engine()
+        with patch('app.services.query_executor.get_postgres_read_engine', return_value=engine):
+            executor = QueryExecutor(supabase_client=None, engine='postgres')
+            result = executor.execute_query("SELECT line, AVG(oee) FROM oee_records GROUP BY line")
+        assert result['success'] is True
+
+    def test_unknown_engine_falls_back(self, monkeypatch):
+        monkeypatch.setenv('QUERY_ENGINE', 'oracle')
+        assert QueryExecutor().engine == 'postgrest'
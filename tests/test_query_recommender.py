@@ -0,0 +1,176 @@
+"""
+基于流量的查询推荐测试
+"""
+import asyncio
+import threading
+import time
+from datetime import datetime
+from unittest.mock import MagicMock
+
+import app.services.query_recommender as query_recommender
+from app import create_app
+from app.services.query_recommender import QueryRecommender, SpaceSaving
+from app.services.sql_compiler import MetricSQLCompiler
+import app.services.unified_query_service as unified_query_service
+from app.services.unified_query_service import (
+    QueryIntent,
+    QueryPlan,
+    QueryResult,
+    QueryType,
+    UnifiedQueryService
+)
+
+
+class TestSpaceSaving:
+    """固定容量与时间衰减"""
+
+    def test_heavy_hitters_survive_with_fixed_capacity(self):
+        sketch = SpaceSaving(capacity=5, half_life=1e9)
+        now = 1000.0
+        for i in range(200):
+            sketch.add('hot', now)
+            sketch.add(f'cold{i}', now)
+            if i % 2:
+                sketch.add('warm', now)
+
+        top = sketch.top(now)
+        assert len(top) == 5
+        assert [key for key, _, _ in top[:2]] == ['hot', 'warm']
+        assert top[0][1] - top[0][2] <= 200 <= top[0][1]
+
+    def test_recent_queries_outweigh_old_ones(self):
+        sketch = SpaceSaving(capacity=10, half_life=60)
+        for _ in range(4):
+            sketch.add('old', 0.0)
+        for _ in range(2):
+            sketch.add('new', 600.0)
+
+        (first, count, _), (second, old_count, _) = sketch.top(600.0)
+        assert first == 'new' and abs(count - 2) < 1e-9
+        assert second == 'old' and old_count < 0.01
+
+
+class TestQueryRecommender:
+    """推荐列表预计算与预热"""
+
+    def test_recommendations_from_traffic_with_default_padding(self):
+        recommender = QueryRecommender(refresh_interval=0)
+        for _ in range(3):
+            recommender.observe('对比本周各设备的OEE', 'SELECT 1', 'compare_analysis')
+        recommender.observe('对比本周各设备的OEE？', 'SELECT 2')
+        recommender.observe('只查过一次', 'SELECT 3')
+
+        entries = recommender.recommendations('day', limit=3)
+
+        assert entries[0]['source'] == 'traffic'
+        assert entries[0]['natural_language'] == '对比本周各设备的OEE？'
+        assert entries[0]['sql'] == 'SELECT 2' and entries[0]['category'] == 'comparison'
+        assert [e['source'] for e in entries[1:]] == ['default', 'default']
+        assert all(e['natural_language'] != '只查过一次' for e in entries)
+
+    def test_snapshot_is_served_until_refresh_interval(self):
+        recommender = QueryRecommender(refresh_interval=3600)
+        assert recommender.recommendations('hour', 2)[0]['source'] == 'default'
+        for _ in range(3):
+            recommender.observe('今天的产量', 'SELECT 1')
+        assert recommender.recommendations('hour', 2)[0]['source'] == 'default'
+        recommender.refresh()
+        assert recommender.recommendations('hour', 2)[0]['natural_language'] == '今天的产量'
+
+    def test_seed_from_history_rows_and_prewarm(self):
+        recommender = QueryRecommender(refresh_interval=0)
+        now = time.time()
+        rows = [{'natural_language': '本月良品率', 'sql': 'SELECT 1', 'success': True,
+                 'executed_at': datetime.fromtimestamp(now - 3600).isoformat()} for _ in range(3)]
+        rows.append({'natural_language': '失败的查询', 'success': False})
+        assert recommender.seed(rows) == 3
+        for _ in range(3):
+            recommender.observe('今天的产量', 'SELECT 2', timestamp=now)
+
+        warm = MagicMock()
+        assert recommender.prewarm(warm, top=5, window='week') == 2
+        warm.assert_any_call('今天的产量')
+
+    def test_concurrent_start_prewarm_starts_one_thread(self):
+        recommender = QueryRecommender()
+        barrier = threading.Barrier(16)
+
+        def start():
+            barrier.wait()
+            recommender.start_prewarm(MagicMock(), interval=60)
+
+        threads = [threading.Thread(target=start) for _ in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        recommender.stop_prewarm()
+
+        prewarm_threads = [t for t in threading.enumerate() if t.name == 'recommendation-prewarm']
+        assert prewarm_threads == [recommender._prewarm_thread]
+        recommender._prewarm_thread.join(1)
+
+
+class TestRecommendationsInPipeline:
+    """process 调用更新统计，接口返回推荐"""
+
+    def test_processed_queries_become_recommendations(self, monkeypatch):
+        monkeypatch.setattr(query_recommender, '_query_recommender', QueryRecommender(refresh_interval=0))
+        service = UnifiedQueryService.__new__(UnifiedQueryService)
+        service.intent_recognizer = MagicMock()
+        service.intent_recognizer.recognize.return_value = {
+            'intent': 'query_equipment', 'confidence': 0.9, 'entities': {'metrics': ['oee']}
+        }
+        service.sql_compiler = MetricSQLCompiler()
+        service.nl2sql_converter = MagicMock()
+        service.nl2sql_converter.annotation_metadata = {}
+        service.nl2sql_converter.aconvert = MagicMock(side_effect=lambda *a, **k: _value("SELECT 1"))
+        service.nl2sql_converter.get_metadata_summary.return_value = {}
+        for _ in range(3):
+            asyncio.run(service.process_natural_language_query("查询设备OEE", defer_explanation=True))
+
+        client = create_app('testing').test_client()
+        body = client.get('/api/query/unified/query-recommendations?window=hour&limit=2').json
+
+        assert body['recommendations'][0]['natural_language'] == '查询设备OEE'
+        assert body['recommendations'][0]['source'] == 'traffic'
+        assert client.get('/api/query/unified/query-recommendations?window=year').status_code == 400
+
+
+class TestPrewarmQuery:
+    """预热只统计真正成功的执行"""
+
+    def test_prewarm_is_off_by_default(self, monkeypatch):
+        monkeypatch.delenv('RECOMMENDATION_PREWARM', raising=False)
+        monkeypatch.setattr(unified_query_service, '_unified_query_service', None)
+        monkeypatch.setattr(unified_query_service, 'UnifiedQueryService', MagicMock())
+        recommender = query_recommender.get_query_recommender()
+        recommender.start_prewarm = MagicMock()
+
+        unified_query_service.get_unified_query_service()
+
+        recommender.start_prewarm.assert_not_called()
+
+    def test_failed_execution_is_not_counted(self):
+        service = UnifiedQueryService.__new__(UnifiedQueryService)
+        plan = QueryPlan(query_intent=QueryIntent(query_type=QueryType.UNKNOWN, natural_language='今天的产量'))
+        outcomes = iter([
+            (plan, QueryResult(success=False, error_message='查询执行失败: timeout')),
+            (plan, None),
+            (plan, QueryResult(success=True, data=[])),
+        ])
+
+        async def process(*args, **kwargs):
+            return next(outcomes)
+
+        service._process_natural_language_query = process
+        recommender = QueryRecommender(refresh_interval=0, min_count=0)
+        recommender.observe('今天的产量', 'SELECT 1')
+
+        assert recommender.prewarm(service.prewarm_query, top=1) == 0
+        assert recommender.prewarm(service.prewarm_query, top=1) == 0
+        assert recommender.prewarm(service.prewarm_query, top=1) == 1
+
+
+async def _value(value):
+    return value
@@ -0,0 +1,222 @@
+"""
+定时查询调度器测试
+"""
+import os
+import threading
+import time
+from datetime import datetime
+from unittest.mock import MagicMock
+
+import pytest
+
+from app import create_app
+import app.services.query_scheduler as query_scheduler
+from app.services.query_executor import QueryExecutor
+from app.services.query_scheduler import CronSchedule, QueryScheduler
+
+
+class TestCronSchedule:
+    """五段 cron 表达式"""
+
+    def test_step_and_range(self):
+        cron = CronSchedule('*/15 8-9 * * *')
+        assert cron.next_after(datetime(2026, 3, 2, 8, 7)) == datetime(2026, 3, 2, 8, 15)
+        assert cron.next_after(datetime(2026, 3, 2, 9, 45)) == datetime(2026, 3, 3, 8, 0)
+
+    def test_weekday_and_month_rollover(self):
+        # 2026-12-31 是周四，下一个周一是 2027-01-04
+        cron = CronSchedule('0 6 * * 1')
+        assert cron.next_after(datetime(2026, 12, 31, 12, 0)) == datetime(2027, 1, 4, 6, 0)
+        assert CronSchedule('0 0 1 2,6 *').next_after(datetime(2026, 3, 1)) == datetime(2026, 6, 1)
+
+    def test_invalid_expressions(self):
+        for expression in ('* * * *', '61 * * * *', '*/0 * * * *', '5-1 * * * *'):
+            with pytest.raises(ValueError):
+                CronSchedule(expression)
+
+
+class TestQueryScheduler:
+    """任务管理、调度与持久化"""
+
+    def test_add_job_validation(self):
+        scheduler = QueryScheduler(run_query=MagicMock(), min_interval=30)
+        with pytest.raises(ValueError):
+            scheduler.add_job('DELETE FROM oee_data', interval_seconds=60)
+        with pytest.raises(ValueError):
+            scheduler.add_job('SELECT 1', interval_seconds=10)
+        with pytest.raises(ValueError):
+            scheduler.add_job('SELECT 1')
+        with pytest.raises(ValueError):
+            scheduler.add_job('SELECT 1', interval_seconds=60, cron='* * * * *')
+        with pytest.raises(ValueError):
+            scheduler.add_job('SELECT 1', cron='0 0 30 2 *')
+        assert scheduler.list_jobs() == []
+
+    def test_unschedulable_job_is_disabled_without_stopping_others(self):
+        run_query = MagicMock(return_value={'success': True, 'data': []})
+        scheduler = QueryScheduler(run_query=run_query, jitter_seconds=0)
+        # 绕过 add_job 的校验，模拟旧版本保存下来的坏任务
+        bad = scheduler.add_job('SELECT 2', cron='0 0 * * *')
+        scheduler._crons[bad.id] = CronSchedule('0 0 30 2 *')
+        scheduler.start()
+        try:
+            scheduler.add_job('SELECT 1', interval_seconds=60)
+            deadline = time.time() + 5
+            while run_query.call_count == 0 and time.time() < deadline:
+                time.sleep(0.02)
+            assert scheduler._thread.is_alive()
+        finally:
+            scheduler.stop()
+        assert run_query.call_args[0][0] == 'SELECT 1'
+        assert bad.enabled is False
+        assert 'never fires' in bad.last_error
+
+    def test_concurrent_saves_keep_file_valid(self, tmp_path):
+        path = str(tmp_path / 'schedules.json')
+        scheduler = QueryScheduler(run_query=MagicMock(), path=path)
+        for i in range(5):
+            scheduler.add_job(f'SELECT {i}', interval_seconds=60)
+
+        threads = [threading.Thread(target=scheduler._save) for _ in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(QueryScheduler(run_query=MagicMock(), path=path).list_jobs()) == 5
+        assert os.listdir(tmp_path) == ['schedules.json']
+
+    def test_due_jobs_run_and_reschedule(self):
+        run_query = MagicMock(return_value={'success': True, 'data': [{'a': 1}, {'a': 2}]})
+        scheduler = QueryScheduler(run_query=run_query, jitter_seconds=0)
+        job = scheduler.add_job('SELECT * FROM oee_data', interval_seconds=300)
+
+        due, timeout = scheduler._collect_due()
+        assert due == [job]
+        assert job.next_run_at > time.time() + 290
+        # 上一次尚未结束：再次到期时跳过，不重复提交
+        job.next_run_at = 0
+        assert scheduler._collect_due()[0] == []
+
+        scheduler._execute(job)
+        sql, ttl = run_query.call_args[0]
+        assert sql == 'SELECT * FROM oee_data'
+        assert ttl >= 300
+        assert job.last_status == 'success'
+        assert job.last_rows_count == 2
+        assert scheduler.stats()['in_flight'] == 0
+
+    def test_jitter_does_not_accumulate(self):
+        scheduler = QueryScheduler(run_query=MagicMock(), jitter_seconds=10)
+        job = scheduler.add_job('SELECT 1', interval_seconds=60)
+        start = job.planned_at
+
+        for _ in range(100):
+            # 每次都在抖动后的到期时间执行
+            scheduler._schedule_next(job, job.next_run_at)
+
+        assert job.planned_at == pytest.approx(start + 100 * 60)
+        assert start + 100 * 60 <= job.next_run_at <= start + 100 * 60 + 10
+        assert 'planned_at' not in job.to_dict()
+
+    def test_failures_are_recorded(self):
+        scheduler = QueryScheduler(run_query=MagicMock(side_effect=RuntimeError('db down')))
+        job = scheduler.add_job('SELECT 1', interval_seconds=60)
+
+        result = scheduler.run_now(job.id)
+
+        assert result['success'] is False
+        assert job.last_status == 'error'
+        assert job.last_error == 'db down'
+        assert scheduler.run_now('missing') is None
+
+    def test_background_thread_runs_jobs(self):
+        run_query = MagicMock(return_value={'success': True, 'data': []})
+        scheduler = QueryScheduler(run_query=run_query, jitter_seconds=0)
+        scheduler.start()
+        try:
+            scheduler.add_job('SELECT 1', interval_seconds=60)
+            deadline = time.time() + 5
+            while run_query.call_count == 0 and time.time() < deadline:
+                time.sleep(0.02)
+        finally:
+            scheduler.stop()
+        assert run_query.call_count == 1
+
+    def test_jobs_survive_restart(self, tmp_path):
+        path = str(tmp_path / 'schedules.json')
+        scheduler = QueryScheduler(run_query=MagicMock(), path=path)
+        kept = scheduler.add_job('SELECT 1', cron='*/5 * * * *', name='kept')
+        removed = scheduler.add_job('SELECT 2', interval_seconds=60)
+        scheduler.remove_job(removed.id)
+
+        reloaded = QueryScheduler(run_query=MagicMock(), path=path, jitter_seconds=0)
+
+        jobs = reloaded.list_jobs()
+        assert [job['id'] for job in jobs] == [kept.id]
+        assert jobs[0]['cron'] == '*/5 * * * *'
+        # 重启后先执行一次以重新填充缓存
+        assert reloaded._collect_due()[0][0].id == kept.id
+
+
+class TestSchedulerSingleton:
+    """调度线程需要显式启用"""
+
+    def test_not_started_by_default(self, monkeypatch, tmp_path):
+        monkeypatch.delenv('SCHEDULER_ENABLED', raising=False)
+        monkeypatch.setenv('SCHEDULED_QUERIES_PATH', str(tmp_path / 'schedules.json'))
+        monkeypatch.setattr(query_scheduler, '_query_scheduler', None)
+
+        assert query_scheduler.get_query_scheduler().stats()['running'] is False
+
+
+class TestPrecomputedResults:
+    """定时执行的结果供 /execute 直接命中"""
+
+    def test_execute_hits_scheduled_result(self):
+        executor = QueryExecutor(supabase_client=MagicMock(), engine='postgrest')
+        executor._execute_uncached = MagicMock(return_value={'success': True, 'data': [{'oee': 0.8}]})
+        scheduler = QueryScheduler(
+            run_query=lambda sql, ttl: executor.execute_query(sql, refresh=True, cache_ttl=ttl)
+        )
+        job = scheduler.add_job('SELECT * FROM oee_data', interval_seconds=600)
+
+        scheduler.run_now(job.id)
+        result = executor.execute_query('SELECT * FROM oee_data')
+
+        assert result['cached'] is True
+        assert result['data'] == [{'oee': 0.8}]
+        assert executor._execute_uncached.call_count == 1
+
+
+class TestScheduleRoutes:
+    """/api/query/unified/schedules"""
+
+    def test_create_list_run_delete(self):
+        client = create_app('testing').test_client()
+
+        response = client.post('/api/query/unified/schedules',
+                               json={'sql': 'SELECT * FROM oee_data', 'interval_seconds': 300, 'name': 'OEE'})
+        assert response.status_code == 200
+        job_id = response.json['schedule']['id']
+
+        listed = client.get('/api/query/unified/schedules').json
+        assert [job['name'] for job in listed['schedules']] == ['OEE']
+
+        run = client.post(f'/api/query/unified/schedules/{job_id}/run')
+        assert run.status_code == 200
+        assert run.json['schedule']['last_status'] == 'success'
+
+        assert client.delete(f'/api/query/unified/schedules/{job_id}').status_code == 200
+        assert client.delete(f'/api/query/unified/schedules/{job_id}').status_code == 404
+        assert client.post(f'/api/query/unified/schedules/{job_id}/run').status_code == 404
+
+    def test_rejects_invalid_schedule(self):
+        client = create_app('testing').test_client()
+        response = client.post('/api/query/unified/schedules',
+                               json={'sql': 'DROP TABLE oee_data', 'interval_seconds': 300})
+        assert response.status_code == 400
+        assert response.json['success'] is False
+
+        never_fires = client.post('/api/query/unified/schedules', json={'sql': 'SELECT 1', 'cron': '0 0 30 2 *'})
+        assert never_fires.status_code == 400
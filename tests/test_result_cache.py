@@ -0,0 +1,140 @@
+"""
+查询结果缓存测试
+"""
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app import create_app
+from app.services.query_executor import QueryExecutor
+from app.services.result_cache import QueryResultCache, extract_tables, normalize_sql
+from app.services.supabase_client import SupabaseClient
+
+
+class TestNormalization:
+    """SQL 规范化与表提取"""
+
+    def test_formatting_differences_share_key(self):
+        a = "SELECT *  FROM oee_records\n WHERE line = 'L1';"
+        b = "select * from OEE_RECORDS where LINE = 'L1' -- 注释"
+        assert normalize_sql(a) == normalize_sql(b)
+        assert QueryResultCache.make_key(a) == QueryResultCache.make_key(b)
+
+    def test_literals_and_params_keep_keys_distinct(self):
+        assert normalize_sql("SELECT 1 FROM t WHERE a = 'X'") != normalize_sql("SELECT 1 FROM t WHERE a = 'x'")
+        assert QueryResultCache.make_key("SELECT 1", [1]) != QueryResultCache.make_key("SELECT 1", [2])
+        assert QueryResultCache.make_key("SELECT 1", namespace='postgres') != QueryResultCache.make_key("SELECT 1")
+
+    def test_extract_tables(self):
+        sql = 'SELECT * FROM public."OEE_Records" o JOIN equipment e ON e.id = o.eq WHERE note = \'from x\''
+        assert extract_tables(sql) == {'oee_records', 'equipment'}
+
+
+class TestQueryResultCache:
+    """TTL、字节上限与按表失效"""
+
+    def test_table_ttl_takes_minimum(self):
+        cache = QueryResultCache(default_ttl=60, table_ttls={'oee_records': 5, 'equipment': 600})
+        assert cache.ttl_for({'oee_records', 'equipment'}) == 5
+        assert cache.ttl_for({'products'}) == 60
+
+    def test_expired_entry_is_miss(self):
+        cache = QueryResultCache(table_ttls={'t': 10})
+        with patch('app.services.result_cache.time.monotonic', return_value=100.0):
+            cache.set('k', {'data': [1]}, {'t'})
+        with patch('app.services.result_cache.time.monotonic', return_value=111.0):
+            assert cache.get('k') is None
+        assert cache.get_stats()['entries'] == 0
+
+    def test_evicts_least_recently_used_by_bytes(self):
+        value = {'data': ['x' * 100]}
+        cache = QueryResultCache(max_bytes=300)
+        cache.set('a', value, {'t'})
+        cache.set('b', value, {'t'})
+        cache.get('a')
+        cache.set('c', value, {'t'})
+
+        assert cache.get('b') is None
+        assert cache.get('a') == value and cache.get('c') == value
+        assert cache.get_stats()['evictions'] == 1
+        assert cache.get_stats()['bytes'] <= 300
+
+    def test_oversized_entry_not_cached(self):
+        cache = QueryResultCache(max_entry_bytes=10)
+        assert cache.set('k', {'data': ['too large']}, {'t'}) is False
+
+    def test_invalidate_tables_only_drops_dependents(self):
+        cache = QueryResultCache()
+        cache.set('join', {'data': []}, {'oee_records', 'equipment'})
+        cache.set('eq', {'data': []}, {'equipment'})
+        cache.set('prod', {'data': []}, {'products'})
+
+        assert cache.invalidate_tables(['OEE_RECORDS']) == 1
+        assert cache.get('join') is None
+        assert cache.get('eq') is not None
+        assert cache.get_stats()['entries_by_table'] == {'equipment': 1, 'products': 1}
+
+
+class TestExecutorIntegration:
+    """QueryExecutor 缓存读写与 refresh"""
+
+    @pytest.fixture
+    def executor(self):
+        client = MagicMock()
+        client.execute_query.return_value = {'success': True, 'data': [{'id': 1}], 'count': 1}
+        return QueryExecutor(supabase_client=client, engine='postgrest'), client
+
+    def test_second_call_hits_cache(self, executor):
+        executor, client = executor
+        first = executor.execute_query("SELECT id FROM oee_records")
+        second = executor.execute_query("select id from oee_records;")
+
+        assert client.execute_query.call_count == 1
+        assert 'cached' not in first
+        assert second['cached'] is True and second['data'] == [{'id': 1}]
+
+    def test_refresh_bypasses_and_repopulates(self, executor):
+        executor, client = executor
+        executor.execute_query("SELECT id FROM oee_records")
+        executor.execute_query("SELECT id FROM oee_records", refresh=True)
+        executor.execute_query("SELECT id FROM oee_records")
+
+        assert client.execute_query.call_count == 2
+
+    def test_failures_and_truncated_results_not_cached(self, executor):
+        executor, client = executor
+        client.execute_query.return_value = {'success': False, 'error': 'boom', 'data': []}
+        executor.execute_query("SELECT id FROM oee_records")
+        client.execute_query.return_value = {'success': True, 'data': [{'id': 1}], 'truncated': True}
+        executor.execute_query("SELECT id FROM oee_records")
+        executor.execute_query("SELECT id FROM oee_records")
+
+        assert client.execute_query.call_count == 3
+
+    def test_write_invalidates_table(self, executor):
+        executor, client = executor
+        executor.execute_query("SELECT id FROM oee_records")
+
+        writer = SupabaseClient.__new__(SupabaseClient)
+        writer.client = MagicMock()
+        assert writer.execute_write('oee_records', {'id': 2})['success'] is True
+
+        executor.execute_query("SELECT id FROM oee_records")
+        assert client.execute_query.call_count == 2
+
+
+class TestResultCacheRoutes:
+    """缓存管理接口"""
+
+    def test_stats_and_invalidate(self):
+        client = create_app('testing').test_client()
+        with patch('app.services.query_executor.QueryExecutor._execute_uncached',
+                   return_value={'success': True, 'data': [], 'count': 0}):
+            QueryExecutor(engine='postgrest').execute_query("SELECT id FROM oee_records")
+
+        stats = client.get('/api/query/result-cache/stats').json['stats']
+        assert stats['entries_by_table'] == {'oee_records': 1}
+
+        response = client.post('/api/query/result-cache/invalidate', json={'tables': ['oee_records']})
+        assert response.json['removed'] == 1
+        assert client.get('/api/query/result-cache/stats').json['stats']['entries'] == 0
@@ -0,0 +1,125 @@
+"""
+查询结果流式输出测试
+"""
+import json
+from datetime import date
+from decimal import Decimal
+from unittest.mock import patch
+
+import pytest
+
+from app import create_app
+from app.services.result_stream import iter_ndjson, SUMMARY_KEY
+from app.services.sql_translator import iter_postgrest_query, translate_sql
+
+
+class PagedBuilder:
+    """按 range 返回对应切片的 PostgREST 构建器桩"""
+
+    def __init__(self, rows, ranges):
+        self.rows = rows
+        self.ranges = ranges
+        self.window = (0, len(rows))
+
+    def select(self, columns, count=None):
+        return self
+
+    def order(self, column, desc=False, nullsfirst=False):
+        return self
+
+    def range(self, start, end):
+        self.ranges.append((start, end))
+        self.window = (start, end)
+        return self
+
+    def execute(self):
+        class Response:
+            pass
+        response = Response()
+        response.data = self.rows[self.window[0]:self.window[1]]
+        return response
+
+
+class PagedClient:
+    def __init__(self, total):
+        self.rows = [{'id': i} for i in range(total)]
+        self.ranges = []
+
+    def table(self, name):
+        return PagedBuilder(self.rows, self.ranges)
+
+
+def parse_lines(chunks):
+    return [json.loads(line) for line in ''.join(chunks).splitlines()]
+
+
+class TestNDJSON:
+    """NDJSON 编码"""
+
+    def test_rows_then_summary(self):
+        batches = iter([[{'id': 1, 'qty': Decimal('1.5'), 'day': date(2026, 3, 1)}], [], [{'id': 2}]])
+        lines = parse_lines(iter_ndjson(batches, sql='SELECT 1'))
+
+        assert lines[:2] == [{'id': 1, 'qty': 1.5, 'day': '2026-03-01'}, {'id': 2}]
+        summary = lines[-1][SUMMARY_KEY]
+        assert summary['success'] is True
+        assert summary['rows_count'] == 2
+        assert summary['sql'] == 'SELECT 1'
+
+    def test_error_mid_stream_is_reported(self):
+        def batches():
+            yield [{'id': 1}]
+            raise RuntimeError('connection lost')
+
+        lines = parse_lines(iter_ndjson(batches()))
+        assert lines[0] == {'id': 1}
+        assert lines[-1][SUMMARY_KEY]['success'] is False
+        assert lines[-1][SUMMARY_KEY]['error'] == 'connection lost'
+        assert lines[-1][SUMMARY_KEY]['rows_count'] == 1
+
+
+class TestPostgRESTPaging:
+    """Range 分页"""
+
+    def test_pages_until_short_page(self):
+        client = PagedClient(total=25)
+        pages = list(iter_postgrest_query(client, translate_sql("SELECT id FROM t ORDER BY id"), page_size=10))
+
+        assert [len(p) for p in pages] == [10, 10, 5]
+        assert client.ranges == [(0, 10), (10, 20), (20, 30)]
+
+    def test_respects_limit_and_offset(self):
+        client = PagedClient(total=100)
+        pages = list(iter_postgrest_query(
+            client, translate_sql("SELECT id FROM t ORDER BY id LIMIT 15 OFFSET 5"), page_size=10
+        ))
+
+        assert [row['id'] for page in pages for row in page] == list(range(5, 20))
+        assert client.ranges == [(5, 15), (15, 20)]
+
+
+class TestStreamingRoutes:
+    """execute 接口的 stream 模式"""
+
+    @pytest.fixture
+    def client(self):
+        return create_app('testing').test_client()
+
+    def test_query_execute_streams_ndjson(self, client):
+        with patch('app.routes.query_routes.QueryExecutor.stream_query',
+                   return_value=iter([[{'id': 1}, {'id': 2}], [{'id': 3}]])):
+            response = client.post('/api/query/execute', json={'sql': 'SELECT id FROM t', 'stream': True})
+
+        assert response.status_code == 200
+        assert response.mimetype == 'application/x-ndjson'
+        lines = parse_lines([response.get_data(as_text=True)])
+        assert [line.get('id') for line in lines[:3]] == [1, 2, 3]
+        assert lines[-1][SUMMARY_KEY]['rows_count'] == 3
+
+    def test_unsupported_sql_rejected_before_streaming(self, client):
+        with patch('app.routes.query_routes.QueryExecutor.stream_query',
+                   side_effect=ValueError('不支持 JOIN')):
+            response = client.post('/api/query/execute', json={'sql': 'SELECT * FROM a JOIN b', 'stream': True})
+
+        assert response.status_code == 400
+        assert response.json['success'] is False
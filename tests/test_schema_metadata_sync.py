@@ -0,0 +1,115 @@
+"""
+Schema 元数据增量同步与 ETag 测试
+"""
+from unittest.mock import patch
+
+import pytest
+
+from app import create_app
+from app.services.schema_annotator import SchemaAnnotator
+
+
+class FakeQuery:
+    def __init__(self, store, table):
+        self.store = store
+        self.table = table
+        self.filters = []
+
+    def select(self, columns):
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def gte(self, column, value):
+        self.filters.append(lambda row: row.get(column) >= value)
+        return self
+
+    def execute(self):
+        self.store.requests.append((self.table, len(self.filters)))
+        rows = [r for r in self.store.rows[self.table] if all(f(r) for f in self.filters)]
+
+        class Response:
+            data = [dict(r) for r in rows]
+        return Response()
+
+
+class FakeSupabase:
+    """按表保存行、记录每次查询的 Supabase 桩"""
+
+    def __init__(self):
+        self.rows = {
+            'schema_table_annotations': [
+                {'table_name': 'oee_records', 'table_name_cn': 'OEE记录', 'status': 'approved',
+                 'updated_at': '2026-10-01T00:00:00'},
+            ],
+            'schema_column_annotations': [
+                {'table_name': 'oee_records', 'column_name': 'oee', 'column_name_cn': '综合效率',
+                 'status': 'approved', 'updated_at': '2026-10-01T00:00:00'},
+            ],
+            'schema_relation_annotations': [],
+        }
+        self.requests = []
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+
+@pytest.fixture
+def annotator():
+    return SchemaAnnotator(supabase_client=FakeSupabase())
+
+
+class TestIncrementalSync:
+    """updated_at 水位线增量同步"""
+
+    def test_incremental_fetch_only_reads_changed_rows(self, annotator):
+        first = annotator.get_approved_schema_metadata()
+        etag = annotator.get_metadata_etag()
+
+        annotator.supabase.requests.clear()
+        assert annotator.get_approved_schema_metadata() is first
+        assert annotator.get_metadata_etag() == etag
+        # 增量查询使用 updated_at 过滤，而不是 status = approved 全量读取
+        assert ('schema_table_annotations', 1) in annotator.supabase.requests
+
+    def test_merges_new_approvals_and_drops_rejections(self, annotator):
+        annotator.get_approved_schema_metadata()
+        etag = annotator.get_metadata_etag()
+        rows = annotator.supabase.rows
+        rows['schema_table_annotations'].append(
+            {'table_name': 'equipment', 'table_name_cn': '设备', 'status': 'approved',
+             'updated_at': '2026-10-02T00:00:00'}
+        )
+        rows['schema_column_annotations'][0].update(status='rejected', updated_at='2026-10-02T00:00:00')
+
+        metadata = annotator.get_approved_schema_metadata()
+
+        assert set(metadata['tables']) == {'oee_records', 'equipment'}
+        assert metadata['columns'] == {}
+        assert annotator.get_metadata_etag() != etag
+
+    def test_periodic_full_sync_catches_deletes(self, annotator):
+        annotator.get_approved_schema_metadata()
+        annotator.supabase.rows['schema_table_annotations'].clear()
+
+        assert 'oee_records' in annotator.get_approved_schema_metadata()['tables']
+        annotator.full_sync_interval = 0
+        assert annotator.get_approved_schema_metadata()['tables'] == {}
+
+
+class TestMetadataETag:
+    """/api/schema/metadata 的 ETag / 304"""
+
+    def test_if_none_match_returns_304(self, annotator):
+        client = create_app('testing').test_client()
+        with patch('app.routes.schema_routes.schema_annotator', annotator):
+            first = client.get('/api/schema/metadata')
+            etag = first.headers['ETag']
+            second = client.get('/api/schema/metadata', headers={'If-None-Match': etag})
+
+        assert first.status_code == 200
+        assert first.json['metadata']['tables']['oee_records']['name_cn'] == 'OEE记录'
+        assert second.status_code == 304
+        assert second.get_data() == b''
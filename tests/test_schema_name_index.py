@@ -0,0 +1,83 @@
+"""
+Schema 名称索引测试
+"""
+import json
+
+from app.services.nl2sql_enhanced import EnhancedNL2SQLConverter
+from app.services.schema_name_index import SchemaNameIndex, load_synonyms, normalize_name
+
+METADATA = {
+    'tables': {
+        'oee_records': {'name_cn': 'OEE 记录', 'synonyms': '效率记录、稼动记录'},
+        'equipment': {'name_cn': '设备台账'},
+    },
+    'columns': {
+        'oee_records': {
+            'oee': {'name_cn': '综合效率'},
+            'record_date': {'name_cn': '记录日期'},
+        },
+        'equipment': {
+            'equipment_code': {'name_cn': '设备编号'},
+            'record_date': {'name_cn': '记录日期'},
+        },
+    },
+}
+
+
+class TestNormalizeName:
+    """名称规范化"""
+
+    def test_full_width_case_and_whitespace(self):
+        assert normalize_name('ＯＥＥ　记录') == normalize_name('oee记录') == 'oee记录'
+        assert normalize_name(None) == ''
+
+
+class TestSchemaNameIndex:
+    """表/列查找"""
+
+    def test_table_lookup_by_cn_english_and_synonym(self):
+        index = SchemaNameIndex(METADATA)
+        assert index.table('oee记录') == 'oee_records'
+        assert index.table('OEE_RECORDS') == 'oee_records'
+        assert index.table('稼动记录') == 'oee_records'
+        assert index.table('不存在') is None
+
+    def test_column_lookup_is_scoped_by_table(self):
+        index = SchemaNameIndex(METADATA)
+        assert index.column('oee_records', ' 综合效率 ') == 'oee'
+        assert index.column('equipment', '综合效率') is None
+        assert sorted(index.find_columns('记录日期')) == [
+            ('equipment', 'record_date'), ('oee_records', 'record_date')
+        ]
+
+    def test_synonym_file(self, tmp_path):
+        path = tmp_path / 'synonyms.json'
+        path.write_text(json.dumps({
+            'tables': {'equipment': ['机台']},
+            'columns': {'oee_records': {'oee': ['效率']}}
+        }, ensure_ascii=False), encoding='utf-8')
+
+        index = SchemaNameIndex(METADATA, load_synonyms(str(path)))
+        assert index.table('机台') == 'equipment'
+        assert index.column('oee_records', '效率') == 'oee'
+        assert load_synonyms(str(tmp_path / 'missing.json')) == {}
+
+    def test_precomputed_summary(self):
+        summary = SchemaNameIndex(METADATA).summary
+        assert summary['tables'] == 2
+        assert summary['columns'] == 4
+        assert summary['column_count_by_table'] == {'oee_records': 2, 'equipment': 2}
+
+
+class TestConverterLookups:
+    """EnhancedNL2SQLConverter 使用索引"""
+
+    def test_lookups_follow_metadata_version(self):
+        converter = EnhancedNL2SQLConverter()
+        converter._set_metadata(METADATA)
+
+        assert converter.get_table_name_from_cn('设备台账') == 'equipment'
+        assert converter.get_column_name_from_cn('equipment', '设备编号') == 'equipment_code'
+        summary = converter.get_metadata_summary()
+        assert summary['columns'] == 4
+        assert summary['version'] == converter.metadata_version
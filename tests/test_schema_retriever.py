@@ -0,0 +1,153 @@
+"""
+Schema 检索与提示词裁剪测试
+"""
+from unittest.mock import patch
+
+import pytest
+
+from app.services.nl2sql_enhanced import EnhancedNL2SQLConverter
+from app.services.schema_retriever import SchemaRetriever, estimate_tokens, tokenize
+
+
+def mes_metadata(filler_tables=200):
+    """构造一个带大量无关表的 MES schema"""
+    tables = {
+        'oee_records': {'name_cn': '设备综合效率记录', 'description_cn': '每台设备每班次的OEE、可用率、性能率和良品率'},
+        'equipment': {'name_cn': '设备台账', 'description_cn': '设备编号、型号与所属产线'},
+        'production_orders': {'name_cn': '生产订单', 'description_cn': '工单计划数量与完成数量'},
+    }
+    columns = {
+        'oee_records': {
+            'id': {'name_cn': '主键', 'data_type': 'uuid'},
+            'equipment_id': {'name_cn': '设备ID', 'data_type': 'uuid'},
+            'oee': {'name_cn': '综合效率', 'data_type': 'numeric', 'example': '0.85'},
+            'availability': {'name_cn': '可用率', 'data_type': 'numeric'},
+            'record_date': {'name_cn': '记录日期', 'data_type': 'date'},
+        },
+        'equipment': {
+            'id': {'name_cn': '主键', 'data_type': 'uuid'},
+            'equipment_code': {'name_cn': '设备编号', 'data_type': 'text'},
+        },
+        'production_orders': {
+            'order_no': {'name_cn': '工单号', 'data_type': 'text'},
+            'plan_qty': {'name_cn': '计划数量', 'data_type': 'integer'},
+        },
+    }
+    for i in range(filler_tables):
+        name = f'aux_table_{i}'
+        tables[name] = {'name_cn': f'辅助数据{i}', 'description_cn': '仓储物流与质检的辅助记录，包含批次、库位和检验结论'}
+        columns[name] = {
+            f'field_{j}': {'name_cn': f'字段{j}', 'data_type': 'text', 'description_cn': '辅助字段说明'}
+            for j in range(15)
+        }
+    relations = [{
+        'source_table': 'oee_records', 'source_column': 'equipment_id',
+        'target_table': 'equipment', 'target_column': 'id'
+    }]
+    return {'tables': tables, 'columns': columns, 'relations': relations}
+
+
+class TestTokenize:
+    """分词"""
+
+    def test_chinese_bigrams_and_identifiers(self):
+        tokens = tokenize('查询设备OEE oee_records')
+        assert '设备' in tokens and 'oee' in tokens
+        assert 'oee_records' in tokens and 'records' in tokens
+
+    def test_estimate_tokens(self):
+        assert estimate_tokens('设备') == 2
+        assert estimate_tokens('abcdefgh') == 2
+
+
+class TestSchemaRetriever:
+    """BM25 检索与外键扩展"""
+
+    def test_ranks_relevant_table_first(self):
+        retriever = SchemaRetriever(mes_metadata(), top_k_tables=3)
+        selection = retriever.retrieve('上周各设备的综合效率是多少')
+        assert selection.tables[0] == 'oee_records'
+
+    def test_expands_along_foreign_keys(self):
+        retriever = SchemaRetriever(mes_metadata(), top_k_tables=1)
+        selection = retriever.retrieve('综合效率')
+        assert selection.tables == ['oee_records', 'equipment']
+        assert selection.expanded == ['equipment']
+
+    def test_column_pruning_keeps_matches_and_join_columns(self):
+        retriever = SchemaRetriever(mes_metadata(), top_k_tables=1, top_k_columns=2)
+        selection = retriever.retrieve('可用率')
+        assert selection.columns['oee_records'] == ['equipment_id', 'availability']
+
+    def test_no_match_returns_empty(self):
+        assert SchemaRetriever(mes_metadata(5)).retrieve('xyz').tables == []
+
+
+class TestPromptPruning:
+    """EnhancedNL2SQLConverter 的 schema 提示词"""
+
+    @pytest.fixture
+    def converter(self):
+        converter = EnhancedNL2SQLConverter()
+        converter._set_metadata(mes_metadata())
+        return converter
+
+    def test_prompt_shrinks_by_order_of_magnitude(self, converter):
+        converter.retrieval_config['token_budget'] = 0
+        full = converter._build_enhanced_schema_prompt()
+        pruned = converter._build_enhanced_schema_prompt('各设备的综合效率')
+
+        assert 'oee_records' in pruned and '综合效率' in pruned
+        assert '关联: equipment_id -> equipment.id' in pruned
+        assert 'aux_table_' in full
+        assert estimate_tokens(pruned) * 10 < estimate_tokens(full)
+
+    def test_token_budget_is_respected(self, converter):
+        converter.retrieval_config['token_budget'] = 500
+        prompt = converter._build_enhanced_schema_prompt()
+        assert estimate_tokens(prompt) <= 500
+        assert prompt.count('表名:') >= 1
+
+    def test_disabled_retrieval_uses_full_schema(self, converter):
+        converter.retrieval_config.update({'enabled': False, 'token_budget': 0})
+        prompt = converter._build_enhanced_schema_prompt('综合效率')
+        assert prompt.count('表名:') == len(converter.annotation_metadata['tables'])
+
+
+class TestVersionedPromptCache:
+    """按元数据版本预编译的 schema 片段"""
+
+    @pytest.fixture
+    def converter(self):
+        converter = EnhancedNL2SQLConverter()
+        converter._set_metadata(mes_metadata(5))
+        return converter
+
+    def test_fragments_reused_within_version(self, converter):
+        cache = converter._prompt_cache
+        first = converter._build_enhanced_schema_prompt()
+        assert converter._build_enhanced_schema_prompt() is first
+
+        same = dict(mes_metadata(5), last_updated='2026-10-17T00:00:00')
+        assert converter._set_metadata(same) is False
+        assert converter._prompt_cache is cache
+
+    def test_refresh_with_new_hash_rebuilds(self, converter):
+        old_version = converter.metadata_version
+        changed = mes_metadata(5)
+        changed['tables']['oee_records']['name_cn'] = 'OEE明细'
+
+        with patch.object(converter, '_fetch_metadata', return_value=changed), \
+                patch('app.services.nl2sql_enhanced.get_llm_cache') as llm_cache:
+            converter.refresh_metadata()
+
+        assert converter.metadata_version != old_version
+        assert converter._prompt_cache.version == converter.metadata_version
+        assert 'OEE明细' in converter._build_enhanced_schema_prompt()
+        llm_cache.return_value.invalidate.assert_called_once()
+
+    def test_partial_columns_assembled_from_compiled_lines(self, converter):
+        text, _ = converter._prompt_cache.fragment('oee_records', ['oee'])
+        assert '- oee (综合效率): numeric' in text
+        assert 'availability' not in text
+        assert '关联: equipment_id -> equipment.id' in text
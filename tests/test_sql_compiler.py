@@ -0,0 +1,131 @@
+"""
+MES 指标 SQL 编译器测试
+"""
+import asyncio
+from datetime import date
+from unittest.mock import MagicMock
+
+from app.services.sql_compiler import MetricSQLCompiler, CompiledSQL
+from app.services.unified_query_service import QueryIntent, QueryType, UnifiedQueryService
+
+TODAY = date(2026, 3, 18)  # 周三
+
+METADATA = {
+    "tables": {
+        "oee_records": {"name_cn": "OEE记录"},
+        "production_orders": {"name_cn": "生产订单"},
+    },
+    "columns": {
+        "oee_records": {
+            "record_date": {"name_cn": "记录日期", "data_type": "date"},
+            "equipment_code": {"name_cn": "设备编码", "data_type": "varchar"},
+            "line_code": {"name_cn": "产线编码", "data_type": "varchar"},
+            "oee": {"name_cn": "OEE", "data_type": "numeric"},
+            "pass_ratio": {"name_cn": "良品率", "data_type": "numeric"},
+        },
+        "production_orders": {
+            "order_number": {"name_cn": "订单编号", "data_type": "varchar"},
+            "quantity": {"name_cn": "生产数量", "data_type": "integer"},
+            "start_date": {"name_cn": "开始时间", "data_type": "timestamp"},
+        },
+    },
+}
+
+
+def make_intent(**kwargs):
+    defaults = dict(query_type=QueryType.METRIC_QUERY, natural_language="", confidence=0.9)
+    defaults.update(kwargs)
+    return QueryIntent(**defaults)
+
+
+class TestMetricSQLCompiler:
+    """编译规则"""
+
+    def setup_method(self):
+        self.compiler = MetricSQLCompiler()
+
+    def test_metric_with_time_and_equipment(self):
+        """指标 + 时间范围 + 设备 编译为参数化 SQL"""
+        compiled = self.compiler.compile(
+            make_intent(metrics=["oee"], time_range="this_week", equipment=["EQ-01"]),
+            METADATA, today=TODAY
+        )
+
+        assert compiled.sql == (
+            "SELECT record_date, equipment_code, line_code, oee FROM oee_records "
+            "WHERE record_date >= %(start_date)s AND record_date < %(end_date)s "
+            "AND equipment_code = %(equipment)s ORDER BY record_date DESC LIMIT %(limit)s"
+        )
+        assert compiled.params == {
+            "start_date": date(2026, 3, 16), "end_date": date(2026, 3, 19),
+            "equipment": "EQ-01", "limit": 100
+        }
+        assert "record_date >= '2026-03-16'" in compiled.render()
+
+    def test_metric_resolved_by_chinese_label(self):
+        """列名不在候选中时按中文标注匹配"""
+        compiled = self.compiler.compile(
+            make_intent(metrics=["yield_rate", "oee"], limit=5), METADATA, today=TODAY
+        )
+        assert compiled.table == "oee_records"
+        assert "pass_ratio" in compiled.sql and "oee" in compiled.sql
+        assert compiled.params["limit"] == 5
+
+    def test_direct_table_query_by_chinese_name(self):
+        """直接表查询支持中文表名"""
+        compiled = self.compiler.compile(
+            make_intent(query_type=QueryType.DIRECT_TABLE_QUERY, table_name="生产订单", limit=10),
+            METADATA, today=TODAY
+        )
+        assert compiled.render() == "SELECT * FROM production_orders ORDER BY start_date DESC LIMIT 10"
+
+    def test_falls_back_when_not_deterministic(self):
+        """低置信度、对比、未知指标、过滤列缺失时返回 None"""
+        assert self.compiler.compile(make_intent(metrics=["oee"], confidence=0.5), METADATA) is None
+        assert self.compiler.compile(make_intent(metrics=["oee"], comparison=True), METADATA) is None
+        assert self.compiler.compile(make_intent(metrics=["downtime"]), METADATA) is None
+        assert self.compiler.compile(
+            make_intent(metrics=["output_qty"], equipment=["EQ-01"]), METADATA
+        ) is None
+        assert self.compiler.compile(make_intent(metrics=["oee"]), {}) is None
+
+    def test_time_ranges(self):
+        """时间范围解析为左闭右开区间"""
+        resolve = MetricSQLCompiler.resolve_time_range
+        assert resolve("today", TODAY) == (date(2026, 3, 18), date(2026, 3, 19))
+        assert resolve("last_week", TODAY) == (date(2026, 3, 9), date(2026, 3, 16))
+        assert resolve("last_month", TODAY) == (date(2026, 2, 1), date(2026, 3, 1))
+        assert resolve("30天", TODAY) == (date(2026, 2, 17), date(2026, 3, 19))
+        assert resolve("1月", date(2026, 3, 30)) == (date(2026, 2, 28), date(2026, 3, 31))
+        assert resolve("上个季度", TODAY) is None
+
+    def test_render_escapes_quotes(self):
+        """字符串参数内联时转义单引号"""
+        compiled = CompiledSQL(sql="SELECT * FROM t WHERE a = %(a)s", params={"a": "x' OR '1'='1"})
+        assert compiled.render() == "SELECT * FROM t WHERE a = 'x'' OR ''1''=''1'"
+
+
+class TestCompilerInPipeline:
+    """统一查询服务优先使用编译器"""
+
+    def test_compiled_sql_skips_llm(self):
+        service = UnifiedQueryService.__new__(UnifiedQueryService)
+        service.sql_compiler = MetricSQLCompiler()
+        service.nl2sql_converter = MagicMock()
+        service.nl2sql_converter.annotation_metadata = METADATA
+
+        intent = asyncio.run(_recognize(service, {
+            'intent': 'query_equipment', 'confidence': 0.9,
+            'entities': {'metrics': ['oee'], 'timeRange': 'today', 'equipment': 'EQ-01'}
+        }))
+        sql, variants, source = asyncio.run(service._generate_sql(intent))
+
+        assert source == "compiler"
+        assert "equipment_code = 'EQ-01'" in sql
+        service.nl2sql_converter.aconvert.assert_not_called()
+
+
+async def _recognize(service, intent_data):
+    service.intent_recognizer = MagicMock()
+    service.intent_recognizer.recognize.return_value = intent_data
+    return await service._recognize_intent("查询设备EQ-01今天的OEE")
@@ -0,0 +1,153 @@
+"""
+SQL -> PostgREST 翻译测试
+"""
+from datetime import datetime
+
+import pytest
+
+from app.services.sql_translator import (
+    Aggregate, Filter, SQLTranslationError, run_postgrest_query, translate_sql
+)
+
+NOW = datetime(2026, 3, 18, 9, 30, 0)
+
+
+class FakeResponse:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+class FakeBuilder:
+    """记录调用链的 PostgREST 构建器桩"""
+
+    def __init__(self, rows, calls):
+        self.rows = rows
+        self.calls = calls
+        self.negate = False
+        self.count = None
+
+    @property
+    def not_(self):
+        self.negate = True
+        return self
+
+    def select(self, columns, count=None):
+        self.calls.append(('select', columns, count))
+        self.count = count
+        return self
+
+    def __getattr__(self, name):
+        def record(*args, **kwargs):
+            self.calls.append((('not.' if self.negate else '') + name, *args, *kwargs.values()))
+            self.negate = False
+            return self
+        return record
+
+    def execute(self):
+        self.calls.append(('execute',))
+        return FakeResponse(self.rows, count=len(self.rows) if self.count else None)
+
+
+class FakeClient:
+    def __init__(self, rows=None):
+        self.rows = rows or []
+        self.calls = []
+
+    def table(self, name):
+        self.calls.append(('table', name))
+        return FakeBuilder(self.rows, self.calls)
+
+
+class TestTranslateSQL:
+    """解析与翻译"""
+
+    def test_projection_filters_order_limit(self):
+        query = translate_sql(
+            "SELECT r.equipment_code, r.oee AS value FROM public.oee_records r "
+            "WHERE r.oee >= 0.8 AND line_code IN ('L1', 'L2') AND note NOT LIKE '%停机%' "
+            "AND remark IS NOT NULL ORDER BY value DESC LIMIT 20 OFFSET 40;",
+            now=NOW
+        )
+
+        assert query.table == 'oee_records'
+        assert query.columns == ['equipment_code', 'value:oee']
+        assert query.filters == [
+            Filter('gte', 'oee', 0.8),
+            Filter('in_', 'line_code', ['L1', 'L2']),
+            Filter('like', 'note', '*停机*', negate=True),
+            Filter('is_', 'remark', 'null', negate=True),
+        ]
+        assert query.order == [('oee', True, True)]
+        assert (query.limit, query.offset) == (20, 40)
+
+    def test_date_arithmetic_and_between(self):
+        query = translate_sql(
+            "SELECT * FROM oee_records WHERE record_date >= CURRENT_DATE - INTERVAL '7 days' "
+            "AND created_at < NOW() AND qty BETWEEN 1 AND 10 AND name = 'O''Brien'",
+            now=NOW
+        )
+        assert query.filters == [
+            Filter('gte', 'record_date', '2026-03-11'),
+            Filter('lt', 'created_at', '2026-03-18 09:30:00'),
+            Filter('gte', 'qty', 1),
+            Filter('lte', 'qty', 10),
+            Filter('eq', 'name', "O'Brien"),
+        ]
+
+    def test_aggregates(self):
+        query = translate_sql("SELECT COUNT(*) AS total, AVG(oee) FROM oee_records WHERE line_code = 'L1'")
+        assert query.aggregates == [
+            Aggregate('count', None, 'total'),
+            Aggregate('avg', 'oee', 'avg_oee'),
+        ]
+
+    @pytest.mark.parametrize('sql, message', [
+        ("DELETE FROM oee_records", "仅支持 SELECT"),
+        ("SELECT * FROM a JOIN b ON a.id = b.id", "JOIN"),
+        ("SELECT * FROM a, b", "JOIN"),
+        ("SELECT line, AVG(oee) FROM oee_records GROUP BY line", "GROUP BY"),
+        ("SELECT * FROM oee_records WHERE a = 1 OR b = 2", "OR"),
+        ("SELECT * FROM oee_records WHERE id IN (SELECT id FROM x)", "子查询"),
+        ("SELECT DISTINCT line FROM oee_records", "DISTINCT"),
+        ("SELECT UPPER(name) FROM oee_records", "函数"),
+        ("SELECT * FROM oee_records WHERE d > '2026-01-01'::date", "::"),
+    ])
+    def test_rejects_unsupported(self, sql, message):
+        with pytest.raises(SQLTranslationError) as exc:
+            translate_sql(sql)
+        assert message in str(exc.value)
+
+
+class TestRunPostgRESTQuery:
+    """下推到客户端的调用"""
+
+    def test_row_query_pushdown(self):
+        client = FakeClient(rows=[{'oee': 0.9}])
+        query = translate_sql("SELECT oee FROM oee_records WHERE oee > 0.5 ORDER BY oee LIMIT 5 OFFSET 10")
+
+        assert run_postgrest_query(client, query) == [{'oee': 0.9}]
+        assert client.calls == [
+            ('table', 'oee_records'),
+            ('select', 'oee', None),
+            ('gt', 'oee', 0.5),
+            ('order', 'oee', False, False),
+            ('range', 10, 15),
+            ('execute',),
+        ]
+
+    def test_default_row_cap(self):
+        client = FakeClient()
+        run_postgrest_query(client, translate_sql("SELECT * FROM oee_records"), max_rows=500)
+        assert ('limit', 500) in client.calls
+
+    def test_aggregate_pushdown(self):
+        client = FakeClient(rows=[{'oee': 0.5}, {'oee': 0.7}])
+        query = translate_sql("SELECT COUNT(*) AS n, MAX(oee) AS top, SUM(oee) AS total FROM oee_records")
+
+        row = run_postgrest_query(client, query, page_size=1000)
+
+        assert row == [{'n': 2, 'top': 0.5, 'total': pytest.approx(1.2)}]
+        assert ('select', '*', 'exact') in client.calls
+        assert ('order', 'oee', True) in client.calls
+        assert ('not.is_', 'oee', 'null') in client.calls
@@ -0,0 +1,114 @@
+"""
+统一查询流水线并发执行测试
+"""
+import asyncio
+import time
+from unittest.mock import MagicMock
+
+from app.services.sql_compiler import MetricSQLCompiler
+from app.services.unified_query_service import UnifiedQueryService
+
+STAGE_DELAY = 0.2
+
+
+class SlowLLM:
+    """每次调用都耗时 STAGE_DELAY 的 LLM 桩"""
+
+    def __init__(self):
+        self.prompts = []
+
+    async def agenerate(self, prompt):
+        self.prompts.append(prompt)
+        await asyncio.sleep(STAGE_DELAY)
+        return "解释"
+
+
+class SlowConverter:
+    """SQL 生成与元数据加载都耗时 STAGE_DELAY 的转换器桩"""
+
+    async def aconvert(self, natural_language, question=None):
+        await asyncio.sleep(STAGE_DELAY)
+        if natural_language.startswith('对比'):
+            return "SELECT equipment_id, AVG(oee) FROM oee_records GROUP BY equipment_id"
+        return "SELECT * FROM oee_records LIMIT 100"
+
+    def get_metadata_summary(self):
+        time.sleep(STAGE_DELAY)
+        return {"table_names": ["oee_records"], "columns": 5, "last_updated": None}
+
+
+def build_service(intent_data):
+    """绕过 __init__ 构造服务，注入桩依赖"""
+    service = UnifiedQueryService.__new__(UnifiedQueryService)
+    service.llm_provider = SlowLLM()
+    service.nl2sql_converter = SlowConverter()
+    service.intent_recognizer = MagicMock()
+    service.intent_recognizer.recognize.side_effect = lambda nl: (time.sleep(STAGE_DELAY), intent_data)[1]
+    service.query_executor = MagicMock()
+    service.sql_compiler = MetricSQLCompiler()
+
+    def execute(sql, params=None, refresh=False):
+        time.sleep(STAGE_DELAY)
+        return {"success": True, "data": [{"oee": 0.85}]}
+    service.query_executor.execute_query.side_effect = execute
+    return service
+
+
+class TestUnifiedPipelineConcurrency:
+    """阶段并发执行"""
+
+    def test_independent_stages_overlap(self):
+        """意图‖元数据、主SQL‖变体、解释‖执行 各自并发，总耗时约为三个阶段"""
+        service = build_service({
+            'intent': 'compare_analysis', 'confidence': 0.9,
+            'entities': {'metrics': ['oee']}
+        })
+
+        start = time.time()
+        plan, result = asyncio.run(service.process_natural_language_query(
+            "对比各设备的OEE", execution_mode="execute"
+        ))
+        elapsed = time.time() - start
+
+        assert plan.generated_sql == "SELECT * FROM oee_records LIMIT 100"
+        assert plan.suggested_sql_variants == [
+            "SELECT equipment_id, AVG(oee) FROM oee_records GROUP BY equipment_id"
+        ]
+        assert plan.schema_context["tables"] == ["oee_records"]
+        assert plan.explanation == "解释"
+        assert result.success and result.rows_count == 1
+        # 串行需要 7 个 STAGE_DELAY，并发后只需 3 个
+        assert elapsed < STAGE_DELAY * 5
+        for stage in ("intent", "metadata", "sql", "schema_context", "explanation", "execute", "total"):
+            assert stage in plan.stage_timings
+
+    def test_defer_explanation_skips_llm_call(self):
+        """defer_explanation 时不生成解释"""
+        service = build_service({
+            'intent': 'query_equipment', 'confidence': 0.9,
+            'entities': {'metrics': ['oee']}
+        })
+
+        plan, result = asyncio.run(service.process_natural_language_query(
+            "查询OEE", defer_explanation=True
+        ))
+
+        assert plan.generated_sql
+        assert plan.explanation is None
+        assert plan.explanation_deferred is True
+        assert service.llm_provider.prompts == []
+        assert result is None
+
+        explanation = asyncio.run(service.generate_explanation(plan.generated_sql, "查询OEE"))
+        assert explanation == "解释"
+
+    def test_clarification_returns_early(self):
+        """低置信度时直接返回澄清信息"""
+        service = build_service({'confidence': 0.3})
+
+        plan, result = asyncio.run(service.process_natural_language_query("嗯"))
+
+        assert plan.requires_clarification is True
+        assert plan.generated_sql is None
+        assert result is None
+        assert "intent" in plan.stage_timings